@@ -1,12 +1,20 @@
 import datetime as dt
-from typing import Dict, Any
+from typing import Dict, Any, Optional, TextIO, Tuple
 
+import click
 from flask_migrate import Migrate
 
 from portfolio_builder import create_app, db
 from portfolio_builder.auth.models import User
-from portfolio_builder.public.models import Security, Price, Watchlist, WatchlistItem
-from portfolio_builder.public.tasks import load_securities, load_prices
+from portfolio_builder.public.models import (
+    Security, Price, Watchlist, WatchlistItem, Position, PositionLot,
+    PortfolioValue, BackfillJob, JobLease, BootstrapBatch, SecuritySync
+)
+from portfolio_builder.import_profile import (
+    import_time_ms, profile_create_app
+)
+from portfolio_builder.public.positions import rebuild_positions
+from portfolio_builder.public.backfill import plan_backfill
 
 
 app = create_app(settings_name='production')
@@ -21,21 +29,182 @@ def make_shell_context() -> Dict[str, Any]:
         "Security": Security,
         "Price": Price,
         "Watchlist": Watchlist,
-        "WatchlistItem": WatchlistItem
+        "WatchlistItem": WatchlistItem,
+        "Position": Position,
+        "PositionLot": PositionLot,
+        "PortfolioValue": PortfolioValue,
+        "BackfillJob": BackfillJob,
+        "JobLease": JobLease,
+        "BootstrapBatch": BootstrapBatch,
     }
 
 
+COMMON_TECH_STOCKS = [
+    'META',
+    'GOOGL',
+    'AAPL',
+    'AMZN',
+    'MSFT',
+    'NFLX',
+]
+
+
+def _echo_sync(sync: Optional[SecuritySync]) -> None:
+    if sync is None:
+        click.echo("Securities not synced, the download failed or was empty.")
+    else:
+        click.echo(
+            f"Securities: {sync.inserted} inserted, {sync.updated} updated, "
+            f"{sync.delisted} delisted, {sync.unchanged} unchanged."
+        )
+
+
+@app.cli.command('sync-securities')
+@click.option(
+    '--csv', 'from_csv', is_flag=True,
+    help="Sync from data/securities.csv instead of the providers."
+)
+def sync_securities(from_csv: bool) -> None:
+    """Apply the changes of the provider securities lists to the database."""
+    from portfolio_builder.public.tasks import (
+        load_securities, load_securities_csv
+    )
+    _echo_sync(load_securities_csv() if from_csv else load_securities())
+
+
 @app.cli.command()
-def init_db() -> None:
-    common_tech_stocks = [
-        'META', 
-        'GOOGL', 
-        'AAPL', 
-        'AMZN', 
-        'MSFT', 
-        'NFLX',
-    ]
-    end_date = dt.date.today() - dt.timedelta(days=1)
-    start_date = end_date - dt.timedelta(days=100)
-    load_securities()
-    load_prices(common_tech_stocks, start_date, end_date)
+@click.option(
+    '--ticker', 'tickers', multiple=True,
+    help="Load the prices of these tickers, a few tech stocks by default."
+)
+@click.option(
+    '--tickers-file', type=click.File(),
+    help="Load the prices of the tickers in this file, one per line."
+)
+@click.option(
+    '--all-securities', is_flag=True,
+    help="Load the prices of every listed security in the database."
+)
+@click.option('--days', default=100, help="Days of history to load.")
+@click.option(
+    '--end-date', type=click.DateTime(formats=['%Y-%m-%d']),
+    help="Last day to load, yesterday by default."
+)
+@click.option('--batch-size', type=int, help="Tickers per batch.")
+@click.option('--workers', type=int, help="Batches fetched at once.")
+def init_db(
+    tickers: Tuple[str, ...],
+    tickers_file: Optional[TextIO],
+    all_securities: bool,
+    days: int,
+    end_date: Optional[dt.datetime],
+    batch_size: Optional[int],
+    workers: Optional[int],
+) -> None:
+    """
+    Sync the securities, then load the prices of a ticker universe in
+    batches. Finished batches are recorded, so running it again with the
+    same tickers and dates resumes where it stopped.
+    """
+    from portfolio_builder.public.tasks import bootstrap_prices, load_securities
+    _echo_sync(load_securities())
+    if all_securities:
+        ticker_list = [
+            ticker for ticker, in
+            db.session.query(Security.ticker)
+            .filter(Security.delisted_date.is_(None))
+        ]
+    elif tickers_file is not None:
+        ticker_list = [line.strip() for line in tickers_file if line.strip()]
+    else:
+        ticker_list = list(tickers) or COMMON_TECH_STOCKS
+    last_date = (
+        end_date.date() if end_date
+        else dt.date.today() - dt.timedelta(days=1)
+    )
+    start_date = last_date - dt.timedelta(days=days)
+    click.echo(
+        f"Loading {len(ticker_list)} tickers from {start_date} to {last_date}."
+    )
+    progress = bootstrap_prices(
+        ticker_list,
+        start_date,
+        last_date,
+        batch_size=batch_size or app.config['BOOTSTRAP_BATCH_SIZE'],
+        max_workers=workers or app.config['BOOTSTRAP_MAX_WORKERS'],
+        report=lambda x: click.echo(
+            f"{x.done}/{x.batches} batches, {x.failed} failed, "
+            f"{x.rows} rows, {x.rows_per_second:.0f} rows/s"
+        ),
+    )
+    click.echo(f"{progress.done}/{progress.batches} batches loaded.")
+    if progress.failed:
+        click.echo(
+            f"{progress.failed} batches had failed tickers, run the same "
+            f"command with --end-date {last_date} to retry them."
+        )
+
+
+@app.cli.command('rebuild-positions')
+@click.option(
+    '--watchlist-id', 'watchlist_ids', type=int, multiple=True,
+    help="Only rebuild the positions of these watchlists."
+)
+def rebuild_positions_state(watchlist_ids: Tuple[int, ...]) -> None:
+    """Rebuild the stored FIFO positions from the watchlist items."""
+    no_positions = rebuild_positions(list(watchlist_ids))
+    click.echo(f"Rebuilt {no_positions} positions.")
+
+
+@app.cli.command('backfill-prices')
+@click.option(
+    '--ticker', 'tickers', multiple=True,
+    help="Only backfill these tickers."
+)
+@click.option(
+    '--dry-run', is_flag=True,
+    help="Print the planned fetches without running them."
+)
+def backfill_missing_prices(tickers: Tuple[str, ...], dry_run: bool) -> None:
+    """Fetch the prices missing between each ticker's first trade and yesterday."""
+    from portfolio_builder.public.tasks import backfill_prices
+    ticker_list = list(tickers) or None
+    failed_tickers = {}
+    if dry_run:
+        fetch_requests = plan_backfill(ticker_list)
+    else:
+        fetch_requests, failed_tickers = backfill_prices(ticker_list)
+    for request in fetch_requests:
+        click.echo(
+            f"{request.start_date} - {request.end_date}: "
+            f"{', '.join(request.tickers)}"
+        )
+    click.echo(f"{len(fetch_requests)} fetch requests.")
+    for ticker, error in failed_tickers.items():
+        click.echo(f"{ticker}: {error}")
+
+
+@app.cli.command()
+def worker() -> None:
+    """Run the scheduled price loads and the backfill queue."""
+    # Ingestion dependencies are only imported here, not in web processes
+    from portfolio_builder.public.worker import run_worker
+    run_worker(app)
+
+
+@app.cli.command('profile-imports')
+@click.option(
+    '--settings', 'settings_name', default='production',
+    help="Settings the app is created with."
+)
+@click.option('--top', default=25, help="Number of imports to print.")
+def profile_imports(settings_name: str, top: int) -> None:
+    """Print the slowest imports of create_app, as in -X importtime."""
+    rows = profile_create_app(settings_name)
+    click.echo(f"{'self [ms]':>10} | {'cumulative [ms]':>15} | module")
+    for row in sorted(rows, key=lambda x: -x.cumulative_us)[:top]:
+        click.echo(
+            f"{row.self_us / 1000:10.1f} | {row.cumulative_us / 1000:15.1f} | "
+            f"{'  ' * row.depth}{row.module}"
+        )
+    click.echo(f"Total: {import_time_ms(rows):.0f} ms")
@@ -0,0 +1,52 @@
+"""
+Times adding one day to a cached covariance window, against rebuilding
+the window from scratch and against pandas' pairwise cov/corr.
+
+Usage: python -m benchmarks.bench_covariance [--tickers 300] [--window 756]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from portfolio_builder.public.covariance import RollingMoments
+
+
+def main(n_tickers: int, window: int) -> None:
+    rng = np.random.default_rng(0)
+    prices = 100 * np.exp(
+        np.cumsum(rng.normal(0, 0.02, (window + 2, n_tickers)), axis=0)
+    )
+    tickers = tuple(f'T{idx:04d}' for idx in range(n_tickers))
+    dates = pd.bdate_range('2018-01-01', periods=window + 2).date
+    moments = RollingMoments(tickers, window)
+
+    start = time.perf_counter()
+    moments.load(dates[:-1], prices[:-1])
+    moments.result()
+    t_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    moments.push(dates[-1], prices[-1])
+    moments.result()
+    t_push = time.perf_counter() - start
+
+    df_returns = pd.DataFrame(prices[1:] / prices[:-1] - 1)
+    start = time.perf_counter()
+    df_returns.cov()
+    df_returns.corr()
+    t_pandas = time.perf_counter() - start
+
+    print(f"{n_tickers} tickers, {window} day window")
+    print(f"{'pandas':>12} {t_pandas * 1000:>9.1f} ms")
+    print(f"{'full build':>12} {t_build * 1000:>9.1f} ms")
+    print(f"{'new day':>12} {t_push * 1000:>9.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', type=int, default=300)
+    parser.add_argument('--window', type=int, default=756)
+    args = parser.parse_args()
+    main(args.tickers, args.window)
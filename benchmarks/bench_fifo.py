@@ -0,0 +1,66 @@
+"""
+Compares the array-backed FIFO engine against the original iterrows loop.
+
+Usage: python -m benchmarks.bench_fifo [--sizes 1000 100000 1000000]
+"""
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import legacy
+from portfolio_builder.public.portfolio import calc_fifo
+
+
+def make_trades(n_trades: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ticker': 'AAPL',
+        'quantity': rng.integers(1, 50, n_trades),
+        'price': rng.uniform(50, 250, n_trades).round(2),
+        'side': np.where(rng.random(n_trades) < 0.6, 'buy', 'sell'),
+        'date': pd.date_range('1900-01-01', periods=n_trades, freq='H'),
+    })
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(sizes: List[int], repeat: int, legacy_max: int) -> None:
+    print(f"{'trades':>10} {'legacy (s)':>12} {'engine (s)':>12} {'speedup':>9}")
+    for n_trades in sizes:
+        df = make_trades(n_trades)
+        t_engine = best_of(lambda: calc_fifo(df), repeat)
+        if n_trades <= legacy_max:
+            start = time.perf_counter()
+            df_legacy = legacy.calc_fifo(df)
+            t_legacy = time.perf_counter() - start
+            pd.testing.assert_frame_equal(
+                calc_fifo(df), df_legacy, check_exact=True
+            )
+            print(
+                f"{n_trades:>10} {t_legacy:>12.4f} {t_engine:>12.4f} "
+                f"{t_legacy / t_engine:>8.0f}x"
+            )
+        else:
+            print(f"{n_trades:>10} {'skipped':>12} {t_engine:>12.4f} {'-':>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--legacy-max', type=int, default=1_000_000,
+        help="Largest size the legacy loop is timed at.")
+    args = parser.parse_args()
+    main(args.sizes, args.repeat, args.legacy_max)
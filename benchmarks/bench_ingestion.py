@@ -0,0 +1,94 @@
+"""
+Times the ingestion tasks end to end against the local fake provider:
+loading the securities of 10k tickers, then their prices with each
+number of fetch threads. The provider runs in its own process and the
+database is a temporary SQLite file.
+
+Usage: python -m benchmarks.bench_ingestion [--tickers 10000] [--days 5]
+    [--latency 0.02] [--workers 8 32]
+"""
+import argparse
+import datetime as dt
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+
+def main(n_tickers: int, n_days: int, latency: float, workers: List[int]) -> None:
+    provider = subprocess.Popen(
+        [
+            sys.executable, '-m', 'benchmarks.fake_provider',
+            '--tickers', str(n_tickers),
+            '--days', str(n_days),
+            '--latency', str(latency),
+            '--port', '0',
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    for _ in range(3):
+        name, url = provider.stdout.readline().split()[1].split('=', 1)
+        os.environ[f'FLASK_{name}'] = url
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = (
+        'sqlite:///' + os.path.join(tmp_dir, 'bench.sqlite')
+    )
+    os.environ['FLASK_API_KEY_TIINGO'] = 'key'
+    os.environ['FLASK_API_KEY_EODHD'] = 'key'
+    os.environ['FLASK_TIINGO_REQUESTS_PER_HOUR'] = str(10**9)
+
+    from portfolio_builder import create_app, db, scheduler
+    from portfolio_builder.public.models import Price, Security
+    from portfolio_builder.public.tasks import load_prices, load_securities
+
+    app = create_app('testing')
+    end_date = dt.date.today() - dt.timedelta(days=1)
+    start_date = end_date - dt.timedelta(days=2 * n_days)
+    timings = []
+    try:
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            load_securities()
+            timings.append(('securities', time.perf_counter() - start))
+            tickers = [ticker for ticker, in db.session.query(Security.ticker)]
+            for max_workers in workers:
+                app.config['TIINGO_MAX_WORKERS'] = max_workers
+                app.config['PROVIDER_MAX_CONNECTIONS'] = max_workers
+                db.session.query(Price).delete()
+                db.session.commit()
+                start = time.perf_counter()
+                load_prices(tickers, start_date, end_date)
+                timings.append(
+                    (f'prices x{max_workers}', time.perf_counter() - start)
+                )
+            n_prices = db.session.query(Price).count()
+    finally:
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        provider.terminate()
+        shutil.rmtree(tmp_dir)
+
+    print(
+        f"{len(tickers)} tickers, {n_prices} prices, "
+        f"{latency * 1000:.0f} ms per request"
+    )
+    for name, elapsed in timings:
+        print(
+            f"{name:>12} {elapsed:>8.2f} s "
+            f"{len(tickers) / elapsed:>8.0f} tickers/s"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--workers', type=int, nargs='+', default=[8, 32])
+    args = parser.parse_args()
+    main(args.tickers, args.days, args.latency, args.workers)
@@ -0,0 +1,74 @@
+"""
+Compares the per-ticker boolean mask loop of calc_portf_positions against
+the single-sort partitioning, serial and in a process pool.
+
+Usage: python -m benchmarks.bench_positions [--tickers 500] [--workers 4]
+"""
+import argparse
+import os
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from portfolio_builder.public.portfolio import (
+    calc_fifo, calc_portf_positions
+)
+
+
+def make_trades(n_trades: int, n_tickers: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f'T{idx:04d}' for idx in range(n_tickers)])
+    return pd.DataFrame({
+        'ticker': rng.choice(tickers, n_trades),
+        'quantity': rng.integers(1, 50, n_trades),
+        'price': rng.uniform(50, 250, n_trades).round(2),
+        'side': np.where(rng.random(n_trades) < 0.6, 'buy', 'sell'),
+        'date': pd.date_range('1900-01-01', periods=n_trades, freq='H'),
+    })
+
+
+def calc_by_mask(df: pd.DataFrame) -> pd.DataFrame:
+    dfs_by_ticker = []
+    for ticker in df['ticker'].unique():
+        df_temp = calc_fifo(df[lambda x: x['ticker'] == ticker])
+        dfs_by_ticker.append(df_temp)
+    return pd.concat(dfs_by_ticker)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main(sizes: List[int], n_tickers: int, workers: int) -> None:
+    # Start the pool once, as a long running web worker would
+    calc_portf_positions(make_trades(1000, 10), max_workers=workers)
+    print(
+        f"{'trades':>10} {'mask loop (s)':>14} {'serial (s)':>11} "
+        f"{'pool (s)':>9} {'speedup':>8}"
+    )
+    for n_trades in sizes:
+        df = make_trades(n_trades, n_tickers)
+        df_mask, t_mask = timed(calc_by_mask, df)
+        df_serial, t_serial = timed(calc_portf_positions, df)
+        df_pool, t_pool = timed(
+            calc_portf_positions, df, max_workers=workers)
+        pd.testing.assert_frame_equal(df_serial, df_mask, check_exact=True)
+        pd.testing.assert_frame_equal(df_pool, df_serial, check_exact=True)
+        print(
+            f"{n_trades:>10} {t_mask:>14.4f} {t_serial:>11.4f} "
+            f"{t_pool:>9.4f} {t_mask / min(t_serial, t_pool):>7.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    main(args.sizes, args.tickers, args.workers)
@@ -0,0 +1,89 @@
+"""
+Times reading the prices of a portfolio from the columnar price store,
+against the SQL join of the prices and securities tables it replaces.
+The database is a temporary SQLite file.
+
+Usage: python -m benchmarks.bench_price_store [--tickers 200] [--years 5]
+    [--portfolio 50]
+"""
+import argparse
+import datetime as dt
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def _best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(n_tickers: int, n_years: int, n_portfolio: int) -> None:
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = (
+        'sqlite:///' + os.path.join(tmp_dir, 'bench.sqlite')
+    )
+    os.environ['FLASK_PRICE_STORE_DIR'] = os.path.join(tmp_dir, 'price-store')
+
+    from portfolio_builder import create_app, db, scheduler
+    from portfolio_builder.public.models import PriceMgr
+
+    app = create_app('testing')
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range(end=dt.date.today(), periods=252 * n_years)
+    tickers = [f'T{idx:04d}' for idx in range(n_tickers)]
+    with app.app_context():
+        db.create_all()
+        pd.DataFrame({
+            'id': np.arange(1, n_tickers + 1),
+            'name': tickers,
+            'ticker': tickers,
+            'exchange': 'NYSE',
+        }).to_sql('securities', con=db.engine, if_exists='append', index=False)
+        prices = 100 * np.exp(
+            np.cumsum(rng.normal(0, 0.02, (dates.size, n_tickers)), axis=0)
+        )
+        pd.DataFrame({
+            'date': np.tile(dates.date, n_tickers),
+            'close_price': prices.T.reshape(-1).round(6),
+            'ticker_id': np.repeat(np.arange(1, n_tickers + 1), dates.size),
+        }).to_sql('prices', con=db.engine, if_exists='append', index=False)
+
+        portfolio = tickers[:n_portfolio]
+        start_date = dates[0].date()
+        t_sql = _best_of(
+            lambda: PriceMgr._get_sql_prices(
+                portfolio, start_date, dt.date.today())
+        )
+        start = time.perf_counter()
+        PriceMgr.get_prices(portfolio, start_date)
+        t_fill = time.perf_counter() - start
+        t_store = _best_of(lambda: PriceMgr.get_prices(portfolio, start_date))
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    shutil.rmtree(tmp_dir)
+
+    print(
+        f"{n_portfolio} of {n_tickers} tickers, {dates.size} dates "
+        f"({n_portfolio * dates.size} rows)"
+    )
+    print(f"{'sql':>12} {t_sql * 1000:>9.1f} ms")
+    print(f"{'store miss':>12} {t_fill * 1000:>9.1f} ms")
+    print(f"{'store hit':>12} {t_store * 1000:>9.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--portfolio', type=int, default=50)
+    args = parser.parse_args()
+    main(args.tickers, args.years, args.portfolio)
@@ -0,0 +1,83 @@
+"""
+Times loading prices into an empty prices table with the batched upsert,
+then loading the same rows again, which updates every one of them,
+against the DataFrame.to_sql append it replaces. The database is a
+temporary SQLite file.
+
+Usage: python -m benchmarks.bench_price_upsert [--rows 1000000]
+    [--batch-size 1000]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def main(n_rows: int, batch_size: int) -> None:
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = (
+        'sqlite:///' + os.path.join(tmp_dir, 'bench.sqlite')
+    )
+
+    from portfolio_builder import create_app, db, scheduler
+    from portfolio_builder.public.models import Price, PriceMgr
+
+    app = create_app('testing')
+    n_dates = 2520
+    n_tickers = -(-n_rows // n_dates)
+    dates = pd.bdate_range('2014-01-01', periods=n_dates).date
+    rng = np.random.default_rng(0)
+    df_prices = pd.DataFrame({
+        'ticker_id': np.repeat(np.arange(1, n_tickers + 1), n_dates),
+        'date': np.tile(dates, n_tickers),
+        'close_price': rng.uniform(10, 500, n_tickers * n_dates).round(6),
+    }).iloc[:n_rows]
+    with app.app_context():
+        db.create_all()
+        pd.DataFrame({
+            'id': np.arange(1, n_tickers + 1),
+            'name': 'Security',
+            'ticker': [f'T{idx:04d}' for idx in range(n_tickers)],
+            'exchange': 'NYSE',
+        }).to_sql('securities', con=db.engine, if_exists='append', index=False)
+
+        start = time.perf_counter()
+        df_prices.to_sql('prices', con=db.engine, if_exists='append', index=False)
+        t_append = time.perf_counter() - start
+        db.session.query(Price).delete()
+        db.session.commit()
+
+        start = time.perf_counter()
+        PriceMgr.upsert_items(df_prices, batch_size=batch_size)
+        t_insert = time.perf_counter() - start
+
+        start = time.perf_counter()
+        PriceMgr.upsert_items(df_prices, batch_size=batch_size)
+        t_update = time.perf_counter() - start
+        n_stored = db.session.query(Price).count()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    shutil.rmtree(tmp_dir)
+
+    print(f"{n_rows} rows, batches of {batch_size}, {n_stored} rows stored")
+    for name, elapsed in [
+        ('to_sql', t_append),
+        ('upsert new', t_insert),
+        ('upsert again', t_update),
+    ]:
+        print(
+            f"{name:>12} {elapsed:>7.2f} s"
+            f" {n_rows / elapsed / 1000:>8.1f} k rows/s"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    main(args.rows, args.batch_size)
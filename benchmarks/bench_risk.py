@@ -0,0 +1,96 @@
+"""
+Times the risk metrics engine on the valuation matrix of a large
+portfolio, against the equivalent pandas code, and the update of
+cached metrics with one new date (the dashboard after a nightly load).
+
+Usage: python -m benchmarks.bench_risk [--years 10] [--tickers 500]
+"""
+import argparse
+import copy
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_valuations import make_portfolio
+from portfolio_builder.public.risk import (
+    RiskInputs, RunningRisk, calc_risk_metrics
+)
+from portfolio_builder.public.valuation import valuation_matrix
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def pandas_metrics(returns: np.ndarray) -> None:
+    df_returns = pd.DataFrame(returns)
+    _ = df_returns.rolling(21).std() * np.sqrt(252)
+    wealth = (1 + df_returns.fillna(0)).cumprod()
+    _ = (wealth / wealth.cummax() - 1).min()
+    _ = df_returns.mean() / df_returns.std() * np.sqrt(252)
+    downside = df_returns.clip(upper=0)
+    _ = df_returns.mean() / np.sqrt((downside ** 2).mean()) * np.sqrt(252)
+    _ = df_returns.quantile(0.05)
+
+
+def main(n_years: int, n_tickers: int, repeat: int) -> None:
+    df_portf_pos, df_prices = make_portfolio(n_years, n_tickers, 20)
+    valuation = valuation_matrix(df_portf_pos, df_prices)
+    market_val = np.nansum(valuation.market_val, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        portf_returns = np.append(0.0, market_val[1:] / market_val[:-1] - 1)
+    inputs = RiskInputs(
+        valuation.dates, valuation.tickers, valuation.prices, portf_returns
+    )
+    returns = (
+        pd.DataFrame(valuation.prices)
+        .pct_change(fill_method=None)
+        .assign(portfolio=portf_returns)
+        .iloc[1:]
+        .to_numpy()
+    )
+    print(f"{valuation.market_val.shape[0]} dates x {n_tickers} tickers")
+    t_pandas = best_of(lambda: pandas_metrics(returns), repeat)
+    t_numpy = best_of(lambda: calc_risk_metrics(inputs), repeat)
+
+    n_dates = inputs.dates.shape[0]
+    cached = RunningRisk(inputs.tickers)
+    cached.push(RiskInputs(
+        inputs.dates[:-1], inputs.tickers, inputs.prices[:-1], portf_returns[:-1]
+    ))
+    new_date = RiskInputs(
+        inputs.dates[n_dates - 1:],
+        inputs.tickers,
+        inputs.prices[n_dates - 1:],
+        portf_returns[n_dates - 1:],
+    )
+
+    # The copy of the cached state isn't timed
+    timings = []
+    for _ in range(repeat):
+        running = copy.deepcopy(cached)
+        start = time.perf_counter()
+        running.push(new_date)
+        running.result()
+        timings.append(time.perf_counter() - start)
+    t_add = min(timings)
+    print(f"{'pandas':>8} {t_pandas * 1000:>8.1f} ms")
+    print(f"{'numpy':>8} {t_numpy * 1000:>8.1f} ms")
+    print(f"speedup {t_pandas / t_numpy:.1f}x")
+    print(f"{'new date':>8} {t_add * 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    main(args.years, args.tickers, args.repeat)
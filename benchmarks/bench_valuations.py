@@ -0,0 +1,81 @@
+"""
+Compares the outer merge + pivot_table valuation against the dense
+(dates x tickers) as-of valuation matrix, in time and peak memory.
+
+Usage: python -m benchmarks.bench_valuations [--years 5] [--tickers 500]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import legacy
+from portfolio_builder.public.portfolio import calc_portf_valuations
+
+
+def make_portfolio(
+    n_years: int,
+    n_tickers: int,
+    trades_per_ticker: int,
+    seed: int = 0,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2018-01-01', periods=252 * n_years)
+    tickers = np.array([f'T{idx:04d}' for idx in range(n_tickers)])
+    df_prices = pd.DataFrame({
+        'ticker': np.repeat(tickers, dates.size),
+        'date': np.tile(dates, n_tickers),
+        'price': rng.uniform(10, 500, dates.size * n_tickers).round(2),
+    })
+    trade_days = np.sort(
+        rng.integers(1, dates.size, (n_tickers, trades_per_ticker)), axis=1)
+    trade_days[:, 0] = 0
+    df_portf_pos = pd.DataFrame({
+        'ticker': np.repeat(tickers, trades_per_ticker),
+        'date': dates[trade_days.ravel()],
+        'net_quantity': rng.integers(0, 1000, n_tickers * trades_per_ticker),
+        'realized_pnl': 0.0,
+    }).drop_duplicates(subset=['ticker', 'date'])
+    return df_portf_pos, df_prices
+
+
+def measure(func: Callable[[], pd.DataFrame]) -> Tuple[pd.DataFrame, float, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main(n_years: int, n_tickers: int, trades_per_ticker: int) -> None:
+    df_portf_pos, df_prices = make_portfolio(
+        n_years, n_tickers, trades_per_ticker)
+    print(
+        f"{len(df_prices)} price rows, {len(df_portf_pos)} position rows\n"
+        f"{'':>8} {'time (s)':>10} {'peak (MiB)':>11}"
+    )
+    df_legacy, t_legacy, m_legacy = measure(
+        lambda: legacy.calc_portf_valuations(df_portf_pos, df_prices))
+    df_matrix, t_matrix, m_matrix = measure(
+        lambda: calc_portf_valuations(df_portf_pos, df_prices))
+    pd.testing.assert_frame_equal(df_matrix, df_legacy, check_exact=True)
+    print(f"{'legacy':>8} {t_legacy:>10.4f} {m_legacy:>11.1f}")
+    print(f"{'matrix':>8} {t_matrix:>10.4f} {m_matrix:>11.1f}")
+    print(
+        f"speedup {t_legacy / t_matrix:.1f}x, "
+        f"memory {m_legacy / m_matrix:.1f}x lower"
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--trades-per-ticker', type=int, default=20)
+    args = parser.parse_args()
+    main(args.years, args.tickers, args.trades_per_ticker)
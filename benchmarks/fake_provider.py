@@ -0,0 +1,282 @@
+"""
+Local stand-in for the market data APIs used by the ingestion tasks,
+serving deterministic synthetic data for 'n_tickers' stocks over the
+last 'n_days' business days:
+    /api/exchange-symbol-list/<exchange>           EODHD symbol list (CSV)
+    /docs/tiingo/daily/supported_tickers.zip       Tiingo ticker list
+    /tiingo/daily/<ticker>/prices                  Tiingo daily prices
+    /api/eod-bulk-last-day/<exchange>              EODHD bulk EOD (CSV)
+
+Point the app at it with EODHD_BASE_URL, TIINGO_BASE_URL and
+TIINGO_TICKERS_URL, see base_urls(). Every request waits 'latency'
+seconds and fails with a 503 with probability 'error_rate', and so do
+all the price requests of 'failing_tickers'. The requests served are counted per endpoint in 'requests'. The two symbol
+lists carry an ETag and answer a matching If-None-Match with a 304,
+counted in 'not_modified'.
+
+Usage: python -m benchmarks.fake_provider [--tickers 10000]
+    [--days 252] [--latency 0.0] [--error-rate 0.0] [--port 8765]
+"""
+import argparse
+import datetime as dt
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+
+EXCHANGES = ['NYSE', 'NASDAQ']
+
+
+class FakeProvider:
+
+    def __init__(
+        self,
+        n_tickers: int,
+        n_days: int,
+        end_date: Optional[dt.date] = None,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        failing_tickers: Iterable[str] = (),
+    ) -> None:
+        end_date = end_date or dt.date.today() - dt.timedelta(days=1)
+        self.dates = pd.bdate_range(end=end_date, periods=n_days)
+        self.tickers = [f'T{idx:05d}' for idx in range(n_tickers)]
+        self.ticker_idx = {ticker: idx for idx, ticker in enumerate(self.tickers)}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.failing_tickers = set(failing_tickers)
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.not_modified: Counter = Counter()
+
+    def count(self, endpoint: str, not_modified: bool = False) -> None:
+        with self.lock:
+            self.requests[endpoint] += 1
+            if not_modified:
+                self.not_modified[endpoint] += 1
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def exchange(self, idx: int) -> str:
+        return EXCHANGES[idx % len(EXCHANGES)]
+
+    def symbol_list_csv(self, exchange: str) -> str:
+        df = pd.DataFrame({
+            'Code': self.tickers,
+            'Name': [f'{ticker} Corp' for ticker in self.tickers],
+            'Country': 'USA',
+            'Exchange': [self.exchange(idx) for idx in range(len(self.tickers))],
+            'Currency': 'USD',
+            'Type': 'Common Stock',
+            'Isin': [f'US{idx:010d}' for idx in range(len(self.tickers))],
+        })
+        return df.loc[lambda x: x['Exchange'] == exchange].to_csv(index=False)
+
+    def supported_tickers_zip(self) -> bytes:
+        df = pd.DataFrame({
+            'ticker': self.tickers,
+            'exchange': [self.exchange(idx) for idx in range(len(self.tickers))],
+            'assetType': 'Stock',
+            'priceCurrency': 'USD',
+            'startDate': self.dates[0].strftime('%Y-%m-%d'),
+            'endDate': self.dates[-1].strftime('%Y-%m-%d'),
+        })
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            # Fixed entry time, so the same list gives the same bytes
+            info = zipfile.ZipInfo('supported_tickers.csv', (1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zf.writestr(info, df.to_csv(index=False))
+        return buffer.getvalue()
+
+    def closes(self, idx: int) -> np.ndarray:
+        rng = np.random.default_rng((self.seed, idx))
+        return (
+            rng.uniform(10, 500)
+            * np.exp(np.cumsum(rng.normal(0, 0.02, self.dates.size)))
+        ).round(2)
+
+    def bulk_eod_csv(self, exchange: str, date: Optional[str]) -> str:
+        # Like the real file, the last trading day on or before 'date'
+        day_idx = (
+            self.dates.searchsorted(pd.Timestamp(date), side='right') - 1
+            if date else self.dates.size - 1
+        )
+        idxs = [
+            idx for idx in range(len(self.tickers))
+            if self.exchange(idx) == exchange
+        ]
+        if day_idx < 0 or not idxs:
+            return 'Code,Ex,Date,Open,High,Low,Close,Adjusted_close,Volume\n'
+        closes = [self.closes(idx)[day_idx] for idx in idxs]
+        return pd.DataFrame({
+            'Code': [self.tickers[idx] for idx in idxs],
+            'Ex': 'US',
+            'Date': self.dates[day_idx].strftime('%Y-%m-%d'),
+            'Open': closes,
+            'High': closes,
+            'Low': closes,
+            'Close': closes,
+            'Adjusted_close': closes,
+            'Volume': 1000,
+        }).to_csv(index=False)
+
+    def daily_prices(
+        self,
+        ticker: str,
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> Optional[List[Dict[str, object]]]:
+        idx = self.ticker_idx.get(ticker.upper())
+        if idx is None:
+            return None
+        closes = self.closes(idx)
+        is_in_range = np.ones(self.dates.size, dtype=np.bool_)
+        if start_date:
+            is_in_range &= self.dates >= pd.Timestamp(start_date)
+        if end_date:
+            is_in_range &= self.dates <= pd.Timestamp(end_date)
+        return [
+            {'date': date.strftime('%Y-%m-%dT00:00:00.000Z'), 'close': close}
+            for date, close in zip(
+                self.dates[is_in_range], closes[is_in_range].tolist()
+            )
+        ]
+
+
+def _make_handler(provider: FakeProvider) -> type:
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, as the real APIs
+
+        def _send(self, status: int, body: bytes, content_type: str) -> None:
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status: int, data: object) -> None:
+            self._send(status, json.dumps(data).encode(), 'application/json')
+
+        def _send_versioned(
+            self, endpoint: str, body: bytes, content_type: str
+        ) -> None:
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            not_modified = self.headers.get('If-None-Match') == etag
+            provider.count(endpoint, not_modified)
+            self.send_response(304 if not_modified else 200)
+            self.send_header('ETag', etag)
+            if not_modified:
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if provider.latency:
+                time.sleep(provider.latency)
+            if provider.should_fail():
+                self._send_json(503, {'detail': 'Service unavailable.'})
+                return
+            url = urlparse(self.path)
+            parts = url.path.strip('/').split('/')
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if parts[:2] == ['api', 'exchange-symbol-list'] and len(parts) == 3:
+                self._send_versioned(
+                    'symbol_list',
+                    provider.symbol_list_csv(parts[2]).encode(),
+                    'text/csv',
+                )
+            elif parts[:2] == ['api', 'eod-bulk-last-day'] and len(parts) == 3:
+                provider.count('bulk_eod')
+                csv = provider.bulk_eod_csv(parts[2], params.get('date'))
+                self._send(200, csv.encode(), 'text/csv')
+            elif url.path == '/docs/tiingo/daily/supported_tickers.zip':
+                self._send_versioned(
+                    'supported_tickers',
+                    provider.supported_tickers_zip(),
+                    'application/zip',
+                )
+            elif parts[:2] == ['tiingo', 'daily'] and parts[3:] == ['prices']:
+                provider.count('daily_prices')
+                if parts[2].upper() in provider.failing_tickers:
+                    self._send_json(503, {'detail': 'Service unavailable.'})
+                    return
+                prices = provider.daily_prices(
+                    parts[2], params.get('startDate'), params.get('endDate')
+                )
+                if prices is None:
+                    self._send_json(404, {'detail': 'Not found.'})
+                else:
+                    self._send_json(200, prices)
+            else:
+                self._send_json(404, {'detail': 'Not found.'})
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    return Handler
+
+
+def make_server(
+    provider: FakeProvider,
+    host: str = '127.0.0.1',
+    port: int = 0
+) -> ThreadingHTTPServer:
+    """Binds the server, port 0 picks a free port. Call serve_forever() to run it."""
+    server = ThreadingHTTPServer((host, port), _make_handler(provider))
+    server.daemon_threads = True
+    return server
+
+
+def base_urls(server: ThreadingHTTPServer) -> Dict[str, str]:
+    """App settings that point the ingestion tasks at 'server'."""
+    host, port = server.server_address[:2]
+    root = f'http://{host}:{port}'
+    return {
+        'EODHD_BASE_URL': f'{root}/api',
+        'TIINGO_BASE_URL': root,
+        'TIINGO_TICKERS_URL': f'{root}/docs/tiingo/daily/supported_tickers.zip',
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=252)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    server = make_server(
+        FakeProvider(
+            args.tickers,
+            args.days,
+            latency=args.latency,
+            error_rate=args.error_rate,
+        ),
+        port=args.port,
+    )
+    for name, url in base_urls(server).items():
+        print(f"export {name}={url}", flush=True)
+    server.serve_forever()
@@ -0,0 +1,81 @@
+"""
+Reference copies of the original pandas implementations, kept only so the
+benchmarks can measure the new engines against the code they replaced.
+"""
+from collections import deque
+
+import pandas as pd
+
+
+def calc_fifo(df: pd.DataFrame) -> pd.DataFrame:
+    df2 = (
+        df
+        .loc[:, ['ticker', 'date']]
+        .assign(net_quantity=0, realized_pnl=0.0)
+    )
+    net_quantity = 0
+    realized_pnl = 0
+    inventory = deque()  # Queue to track the inventory of stocks
+    for idx, row in df.iterrows():
+        if row['side'] == 'buy':
+            inventory.append({
+                'quantity': row['quantity'],
+                'price': row['price']
+            })
+            net_quantity += row['quantity']
+        else:
+            last_sold_qty = row['quantity']
+            last_sold_price = row['price']
+            remaining_qty = last_sold_qty
+            while remaining_qty > 0 and inventory:
+                first_item = next(iter(inventory))
+                first_purchase_qty = first_item['quantity']
+                first_purchase_price = first_item['price']
+                if first_purchase_qty >= remaining_qty:
+                    # The selling quantity is entirely covered by the earliest buying transaction
+                    realized_pnl += remaining_qty * (
+                        last_sold_price - first_purchase_price
+                    )
+                    first_item['quantity'] = first_purchase_qty - remaining_qty
+                    net_quantity -= remaining_qty
+                    remaining_qty = 0
+                else:
+                    # The selling quantity exceeds the earliest buying transaction
+                    realized_pnl += first_purchase_qty * (
+                        last_sold_price - first_purchase_price
+                    )
+                    remaining_qty -= first_purchase_qty
+                    net_quantity -= first_purchase_qty
+                    inventory.popleft()
+        df2.at[idx, 'net_quantity'] = net_quantity
+        df2.at[idx, 'realized_pnl'] = realized_pnl
+    return df2
+
+def calc_portf_valuations(
+    df_portf_pos: pd.DataFrame,
+    df_prices: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Combines the position breakdown with the daily prices to calculate
+    daily market value. The Daily market value is the positions quantity
+    multiplied by the market price.
+    """
+    df_portf_val = (
+        pd
+        .merge(df_portf_pos, df_prices, on=['ticker', 'date'], how='outer')
+        .astype({
+            'net_quantity': 'float64',
+            'price': 'float64',
+        })
+        .sort_values(by=['ticker', 'date'])
+        .fillna(method='ffill')
+        .assign(market_val=lambda x: x['net_quantity'] * x['price'])
+        .round({'market_val': 3})
+        .loc[:, ['date', 'ticker', 'market_val']]
+        .pivot_table(
+            index='date',
+            columns='ticker',
+            values='market_val',
+        )
+    )
+    return df_portf_val
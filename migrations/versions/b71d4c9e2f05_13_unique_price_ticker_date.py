@@ -0,0 +1,50 @@
+"""13_unique_price_ticker_date
+
+Revision ID: b71d4c9e2f05
+Revises: 8e3f1a6b4d27
+Create Date: 2026-10-17 16:21:08.734112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71d4c9e2f05'
+down_revision = '8e3f1a6b4d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the last loaded price of every (ticker, date) before making
+    # the pair unique. The derived table lets MySQL read the table it
+    # deletes from.
+    op.execute(
+        """
+        DELETE FROM prices
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MAX(id) AS keep_id
+                FROM prices
+                GROUP BY ticker_id, date
+            ) AS last_prices
+        )
+        """
+    )
+    # The unique index is created under a new name before the old one is
+    # dropped, the foreign key on ticker_id always needs an index
+    # starting with it (MySQL error 1553 otherwise).
+    with op.batch_alter_table('prices', schema=None) as batch_op:
+        batch_op.create_index(
+            'idx_tickerid_date_unique', ['ticker_id', 'date'], unique=True
+        )
+        batch_op.drop_index('idx_tickerid_date')
+
+
+def downgrade():
+    with op.batch_alter_table('prices', schema=None) as batch_op:
+        batch_op.create_index(
+            'idx_tickerid_date', ['ticker_id', 'date'], unique=False
+        )
+        batch_op.drop_index('idx_tickerid_date_unique')
@@ -1,4 +1,3 @@
-import datetime as dt
 import logging.config
 
 from flask import Flask
@@ -55,18 +54,6 @@ def create_app(settings_name: str) -> Flask:
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(watchlist_bp)
-
-    from portfolio_builder.public.tasks import load_prices_all_tickers
-    scheduler.add_job(
-        id='update_db_last_prices',
-        func=load_prices_all_tickers, 
-        trigger='interval',
-        start_date=dt.datetime.combine(
-            dt.date.today() + dt.timedelta(days=1), 
-            dt.time(1, 0)
-        ),
-        days=1, 
-    ) # task executes periodically, every day at 1am, starting tomorrow.
-    scheduler.start()
+    # The scheduler only starts in `flask worker`, see public/worker.py
 
     return app
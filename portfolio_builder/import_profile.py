@@ -0,0 +1,52 @@
+"""
+Import time profile of create_app.
+
+The app is created in a fresh interpreter run with -X importtime, so
+modules already imported by the calling process don't hide any cost.
+Used by `flask profile-imports` and by the import time budget test.
+"""
+import subprocess
+import sys
+from typing import List, NamedTuple
+
+
+class ImportTime(NamedTuple):
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+    """Rows of the -X importtime report in 'output', in import order."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append(ImportTime(
+            module=name.strip(),
+            depth=(len(name) - len(name.lstrip()) - 1) // 2,
+            self_us=int(self_us),
+            cumulative_us=int(cumulative_us),
+        ))
+    return rows
+
+
+def import_time_ms(rows: List[ImportTime]) -> float:
+    """Total import time, the sum of the top-level imports."""
+    return sum(row.cumulative_us for row in rows if row.depth == 0) / 1000
+
+
+def profile_create_app(settings_name: str) -> List[ImportTime]:
+    code = (
+        "from portfolio_builder import create_app; "
+        f"create_app({settings_name!r})"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_importtime(result.stderr)
@@ -0,0 +1,29 @@
+"""
+Modules imported on first use.
+
+pandas and numpy make up most of the app's import time, yet processes
+like web workers, migrations or shell sessions often never touch them.
+Modules on the app's import path bind them with lazy_import(), which
+returns a stand-in that imports the real module on its first attribute
+access, e.g. pd.DataFrame. Those modules also use postponed annotations
+so that type hints like pd.DataFrame don't count as an access.
+"""
+import importlib
+from types import ModuleType
+from typing import Any
+
+
+class _LazyModule(ModuleType):
+
+    def __getattr__(self, attr: str) -> Any:
+        # Only called for attributes not copied yet, the import system
+        # locks make concurrent first accesses safe
+        module = importlib.import_module(self.__name__)
+        value = getattr(module, attr)
+        setattr(self, attr, value)
+        return value
+
+
+def lazy_import(name: str) -> Any:
+    """Stand-in for module 'name', imported on its first attribute access."""
+    return _LazyModule(name)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.sql import func
+
+from portfolio_builder import db
+from portfolio_builder.lazy import lazy_import
+from portfolio_builder.public.models import Price, Security, WatchlistItem
+
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    np = lazy_import('numpy')
+
+
+class FetchRequest(NamedTuple):
+    """
+    Prices to fetch from the provider in one call. 'is_tail' is True when
+    the range only extends the stored prices of its tickers forward, so
+    the daily values already stored before it stay valid.
+    """
+    tickers: Tuple[str, ...]
+    start_date: dt.date
+    end_date: dt.date
+    is_tail: bool
+
+    @property
+    def is_single_day(self) -> bool:
+        """Only 'end_date' can have prices, as in the nightly update."""
+        return not _has_business_days(
+            self.start_date, self.end_date - dt.timedelta(days=1))
+
+
+def _has_business_days(start_date: dt.date, end_date: dt.date) -> bool:
+    return bool(np.busday_count(start_date, end_date + dt.timedelta(days=1)))
+
+
+def plan_backfill(
+    tickers: Optional[List[str]] = None,
+    end_date: Optional[dt.date] = None,
+) -> List[FetchRequest]:
+    """
+    Plans the fetches that bring the stored prices of every watchlist
+    ticker, or only of 'tickers', to the range it needs: from its first
+    trade date to 'end_date' (yesterday by default).
+
+    The stored range of each ticker is read with one grouped query, and
+    only what's missing before or after it is fetched. Ranges without
+    business days are skipped, and tickers missing the same range share
+    one request.
+    """
+    end_date = end_date or dt.date.today() - dt.timedelta(days=1)
+    needed_query = (
+        db
+        .session
+        .query(WatchlistItem.ticker, func.min(WatchlistItem.trade_date))
+        .group_by(WatchlistItem.ticker)
+    )
+    if tickers is not None:
+        needed_query = needed_query.filter(WatchlistItem.ticker.in_(tickers))
+    first_dates: Dict[str, dt.date] = dict(needed_query.all())
+    stored_ranges = {
+        ticker: (min_date, max_date)
+        for ticker, min_date, max_date in (
+            db
+            .session
+            .query(Security.ticker, func.min(Price.date), func.max(Price.date))
+            .join(Price, onclause=(Price.ticker_id == Security.id))
+            .filter(Security.ticker.in_(list(first_dates)))
+            .group_by(Security.ticker)
+            .all()
+        )
+    }
+
+    gap_tickers: Dict[Tuple[dt.date, dt.date, bool], List[str]] = {}
+    for ticker, first_date in sorted(first_dates.items()):
+        if ticker not in stored_ranges:
+            gaps = [(first_date, end_date, False)]
+        else:
+            min_date, max_date = stored_ranges[ticker]
+            gaps = [
+                (first_date, min_date - dt.timedelta(days=1), False),
+                (max_date + dt.timedelta(days=1), end_date, True),
+            ]
+        for start_date, gap_end_date, is_tail in gaps:
+            if (
+                start_date <= gap_end_date
+                and _has_business_days(start_date, gap_end_date)
+            ):
+                gap_tickers.setdefault(
+                    (start_date, gap_end_date, is_tail), []
+                ).append(ticker)
+    return [
+        FetchRequest(tuple(gap_tickers[key]), *key)
+        for key in sorted(gap_tickers)
+    ]
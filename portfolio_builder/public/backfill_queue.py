@@ -0,0 +1,104 @@
+"""
+Queue of price backfills for newly added tickers.
+
+Adding a ticker records a pending job, or reuses the pending job of
+that ticker. The worker polls the queue every few seconds and runs all
+the tickers added in between at once, so tickers missing the same
+dates share one provider call. Job states are kept in the backfill_jobs
+table for the status endpoint.
+"""
+import datetime as dt
+import logging
+from typing import Optional
+
+from sqlalchemy.sql import and_, or_
+from sqlalchemy.sql.elements import BooleanClauseList
+
+from portfolio_builder import db, scheduler
+from portfolio_builder.public.leases import run_exclusive
+from portfolio_builder.public.models import BackfillJob
+
+
+JOB_ID = 'process_backfill_queue'
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+# Running jobs not updated for this long are assumed lost and run again
+STALE_AFTER = dt.timedelta(minutes=30)
+
+
+def _is_runnable() -> BooleanClauseList:
+    return or_(
+        BackfillJob.status == PENDING,
+        and_(
+            BackfillJob.status == RUNNING,
+            BackfillJob.updated_timestamp < dt.datetime.utcnow() - STALE_AFTER,
+        ),
+    )
+
+
+def enqueue_backfill(ticker: str) -> BackfillJob:
+    """Returns the pending backfill job of 'ticker', creating it if needed."""
+    job = (
+        db
+        .session
+        .query(BackfillJob)
+        .filter(BackfillJob.ticker == ticker, BackfillJob.status == PENDING)
+        .first()
+    )
+    if job is None:
+        job = BackfillJob(ticker=ticker, status=PENDING)
+        db.session.add(job)
+        db.session.commit()
+    return job
+
+
+def get_backfill_status(ticker: str) -> Optional[BackfillJob]:
+    """Latest backfill job of 'ticker', if it ever had one."""
+    return (
+        db
+        .session
+        .query(BackfillJob)
+        .filter(BackfillJob.ticker == ticker)
+        .order_by(BackfillJob.id.desc())
+        .first()
+    )
+
+
+def process_pending_backfills() -> int:
+    """
+    Runs every pending job, and running ones gone stale, as one backfill.
+    Jobs of tickers that got no prices because of an error (unknown
+    security, failed provider request) fail with that error.
+    Returns the number of tickers backfilled.
+    """
+    # Imports the provider clients, which web processes never need
+    from portfolio_builder.public.tasks import backfill_prices
+    jobs = db.session.query(BackfillJob).filter(_is_runnable()).all()
+    if not jobs:
+        return 0
+    for job in jobs:
+        job.status = RUNNING
+    db.session.commit()
+
+    tickers = sorted({job.ticker for job in jobs})
+    try:
+        errors = backfill_prices(tickers).failed_tickers
+    except Exception as e:
+        logging.error(f"Backfill of {', '.join(tickers)} failed: {e}")
+        db.session.rollback()
+        errors = dict.fromkeys(tickers, str(e))
+    for job in jobs:
+        error = errors.get(job.ticker)
+        job.status = DONE if error is None else FAILED
+        job.error = None if error is None else error[:200]
+    db.session.commit()
+    return len(tickers)
+
+
+def process_backfill_queue() -> None:
+    with scheduler.app.app_context():  # type: ignore
+        # Polled often, so the lease is only taken when there's work
+        if db.session.query(BackfillJob).filter(_is_runnable()).first():
+            run_exclusive(JOB_ID, process_pending_backfills)
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import datetime as dt
+import math
+from collections import OrderedDict, deque
+from typing import (
+    TYPE_CHECKING, Deque, Dict, Iterable, NamedTuple, Optional, Tuple
+)
+
+from portfolio_builder.lazy import lazy_import
+from portfolio_builder.public.models import (
+    PriceMgr, PriceVersion, prices_rewritten
+)
+
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+
+
+COV_WINDOW = 252
+COV_CACHE_SIZE = 32
+# Calendar days fetched per trading day of the window, with some slack
+# for holidays, so a full build gets 'window' returns in one query.
+CALENDAR_DAYS_PER_TRADING_DAY = 1.5
+
+_cache: 'OrderedDict[Tuple[Tuple[str, ...], int], RollingMoments]' = (
+    OrderedDict()
+)
+
+
+class Covariance(NamedTuple):
+    """
+    Pairwise-complete covariance and correlation of the daily returns
+    of 'tickers' over the last 'window' price dates up to 'as_of'.
+    'n_obs' is the number of returns shared by every pair.
+    """
+    tickers: Tuple[str, ...]
+    window: int
+    as_of: Optional[dt.date]
+    n_obs: np.ndarray
+    covariance: np.ndarray
+    correlation: np.ndarray
+
+
+class RollingMoments:
+    """
+    Pairwise sums of the daily returns of a fixed set of tickers over a
+    window of price dates. With X the returns (zero where missing) and
+    M the mask of valid returns, it keeps M'M, X'M, (X*X)'M and X'X,
+    which are all that is needed for the pairwise covariance and
+    correlation. Adding a date is a rank-one update of each sum and
+    dropping the oldest one is the same update subtracted, so a new
+    day costs O(tickers^2) instead of O(window * tickers^2).
+    """
+
+    def __init__(self, tickers: Tuple[str, ...], window: int) -> None:
+        n_tickers = len(tickers)
+        self.tickers = tickers
+        self.window = window
+        self.as_of: Optional[dt.date] = None
+        # Price versions of the tickers the sums were computed from
+        self.versions: Dict[str, PriceVersion] = {}
+        self.last_prices = np.full(n_tickers, np.nan)
+        self.rows: Deque[Tuple[np.ndarray, np.ndarray]] = deque()
+        self.counts = np.zeros((n_tickers, n_tickers))
+        self.sums = np.zeros((n_tickers, n_tickers))
+        self.sums_sq = np.zeros((n_tickers, n_tickers))
+        self.cross = np.zeros((n_tickers, n_tickers))
+        self.n_updates = 0
+
+    def _returns(self, prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = prices / self.last_prices - 1
+        is_valid = np.isfinite(returns)
+        self.last_prices = np.where(np.isnan(prices), self.last_prices, prices)
+        return np.where(is_valid, returns, 0.0), is_valid.astype(np.float64)
+
+    def _update(self, x: np.ndarray, m: np.ndarray, sign: float) -> None:
+        self.counts += sign * np.outer(m, m)
+        self.sums += sign * np.outer(x, m)
+        self.sums_sq += sign * np.outer(x * x, m)
+        self.cross += sign * np.outer(x, x)
+
+    def rebuild(self) -> None:
+        """
+        Recomputes the sums from the returns in the window with matrix
+        products, which also clears the rounding drift of the updates.
+        """
+        if not self.rows:
+            self.counts[:] = self.sums[:] = self.sums_sq[:] = self.cross[:] = 0
+        else:
+            x = np.vstack([row_x for row_x, _ in self.rows])
+            m = np.vstack([row_m for _, row_m in self.rows])
+            self.counts = m.T @ m
+            self.sums = x.T @ m
+            self.sums_sq = (x * x).T @ m
+            self.cross = x.T @ x
+        self.n_updates = 0
+
+    def load(self, dates: Iterable[dt.date], prices: np.ndarray) -> None:
+        """Adds many dates at once, then rebuilds the sums."""
+        for date, row in zip(dates, prices):
+            self.rows.append(self._returns(row))
+            if len(self.rows) > self.window:
+                self.rows.popleft()
+            self.as_of = date
+        self.rebuild()
+
+    def push(self, date: dt.date, prices: np.ndarray) -> None:
+        """Adds the prices of a new date, NaN for tickers without one."""
+        x, m = self._returns(prices)
+        self._update(x, m, 1.0)
+        self.rows.append((x, m))
+        if len(self.rows) > self.window:
+            old_x, old_m = self.rows.popleft()
+            self._update(old_x, old_m, -1.0)
+        self.as_of = date
+        self.n_updates += 1
+        if self.n_updates >= self.window:
+            self.rebuild()
+
+    def result(self) -> Covariance:
+        n_obs = self.counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = (self.cross - self.sums * self.sums.T / n_obs) / (n_obs - 1)
+            variance = (self.sums_sq - self.sums * self.sums / n_obs) / (n_obs - 1)
+            correlation = covariance / np.sqrt(variance * variance.T)
+        covariance[n_obs < 2] = np.nan
+        correlation[n_obs < 2] = np.nan
+        np.clip(correlation, -1.0, 1.0, out=correlation)
+        return Covariance(
+            self.tickers,
+            self.window,
+            self.as_of,
+            n_obs.astype(np.int64),
+            covariance,
+            correlation,
+        )
+
+
+def _get_price_matrix(
+    tickers: Tuple[str, ...],
+    start_date: dt.date,
+    end_date: dt.date
+) -> Tuple[pd.Index, np.ndarray]:
+    """
+    Prices of 'tickers' between two dates included, as a (dates x
+    tickers) matrix that is NaN where a ticker has no price on a date.
+    """
+    df_prices = PriceMgr.get_prices(list(tickers), start_date, end_date)
+    if df_prices.empty:
+        return pd.Index([]), np.zeros((0, len(tickers)))
+    df_matrix = (
+        df_prices
+        .assign(date=lambda x: x['date'].dt.date)
+        .pivot_table(index='date', columns='ticker', values='price', aggfunc='last')
+        .reindex(columns=list(tickers))
+    )
+    return df_matrix.index, df_matrix.to_numpy()
+
+
+def _build(
+    tickers: Tuple[str, ...],
+    window: int,
+    as_of: dt.date
+) -> RollingMoments:
+    start_date = as_of - dt.timedelta(
+        days=math.ceil((window + 1) * CALENDAR_DAYS_PER_TRADING_DAY) + 10
+    )
+    dates, prices = _get_price_matrix(tickers, start_date, as_of)
+    moments = RollingMoments(tickers, window)
+    moments.load(dates, prices)
+    moments.as_of = as_of
+    return moments
+
+
+def _advance(moments: RollingMoments, as_of: dt.date) -> RollingMoments:
+    """
+    Moves the window of 'moments' forward to 'as_of' with one update per
+    new price date, or rebuilds it when more than a window of dates
+    was missed.
+    """
+    dates, prices = _get_price_matrix(
+        moments.tickers, moments.as_of + dt.timedelta(days=1), as_of
+    )
+    if len(dates) > moments.window:
+        return _build(moments.tickers, moments.window, as_of)
+    for date, row in zip(dates, prices):
+        moments.push(date, row)
+    moments.as_of = as_of
+    return moments
+
+
+def get_covariance(
+    tickers: Iterable[str],
+    window: int = COV_WINDOW,
+    as_of: Optional[dt.date] = None,
+) -> Covariance:
+    """
+    Covariance and correlation of the daily returns of a set of tickers
+    over the last 'window' price dates up to 'as_of' (the last stored
+    price date by default).
+
+    Results are cached per (ticker set, window) in each process and
+    checked against the price versions of the tickers on every call. A
+    later 'as_of' moves the cached window forward with the new prices
+    only, prices written within the window rebuild it, and an earlier
+    'as_of' is computed without touching the cache.
+    """
+    key = (tuple(sorted(set(tickers))), window)
+    versions = PriceMgr.get_price_versions(list(key[0]))
+    if as_of is None:
+        last_dates = [
+            version.last_date for version in versions.values()
+            if version.last_date is not None
+        ]
+        as_of = max(last_dates) if last_dates else dt.date.today()
+    moments = _cache.get(key)
+    if moments is not None and moments.as_of is not None:
+        if moments.as_of > as_of:
+            return _build(key[0], window, as_of).result()
+        if prices_rewritten(moments.versions, versions, moments.as_of):
+            moments = _build(key[0], window, as_of)
+        elif moments.as_of < as_of:
+            moments = _advance(moments, as_of)
+        moments.versions = versions
+        _cache[key] = moments
+        _cache.move_to_end(key)
+        return moments.result()
+    moments = _build(key[0], window, as_of)
+    moments.versions = versions
+    _cache[key] = moments
+    if len(_cache) > COV_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return moments.result()
+
+
+def covariance_to_df(covariance: Covariance) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Returns the covariance and correlation matrices as DataFrames."""
+    index = pd.Index(covariance.tickers, name='ticker')
+    return (
+        pd.DataFrame(covariance.covariance, index=index, columns=index),
+        pd.DataFrame(covariance.correlation, index=index, columns=index),
+    )
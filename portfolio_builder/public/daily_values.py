@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.sql import case, func, or_
+
+from portfolio_builder import db, scheduler
+from portfolio_builder.lazy import lazy_import
+from portfolio_builder.public.leases import run_exclusive
+from portfolio_builder.public.models import (
+    PortfolioValue, Watchlist, WatchlistItem,
+    PortfolioValueMgr, PriceMgr, WatchlistItemMgr
+)
+from portfolio_builder.public.portfolio import (
+    calc_daily_values, calc_portf_flows_adjusted,
+    calc_portf_positions, calc_portf_valuations
+)
+
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import('pandas')
+
+
+JOB_ID = 'refresh_stale_daily_values'
+# Prices fetched before the first recomputed date, so every ticker has
+# a price to carry forward even after weekends and holidays.
+PRICE_LOOKBACK = dt.timedelta(days=10)
+
+
+def _delete_daily_values(
+    watchlist_id: int,
+    start_date: Optional[dt.date] = None
+) -> None:
+    _ = (
+        db
+        .session
+        .query(PortfolioValue)
+        .filter(
+            PortfolioValue.watchlist_id == watchlist_id,
+            PortfolioValue.date >= (start_date or dt.date.min),
+        )
+        .delete(synchronize_session=False)
+    )
+
+
+def refresh_daily_values(
+    watchlist_id: int,
+    start_date: Optional[dt.date] = None
+) -> int:
+    """
+    Recomputes the stored daily values of a watchlist on and after
+    'start_date', or all of them if it's not given, and commits them.
+    The rows before 'start_date' are kept, the last one of them seeds
+    the HPR of the first recomputed date.
+
+    Returns the number of rows written.
+    """
+    df_trades = (
+        WatchlistItemMgr
+        .get_items(
+            filters=[WatchlistItem.watchlist_id == watchlist_id],
+            entities=[
+                WatchlistItem.ticker,
+                WatchlistItem.quantity,
+                WatchlistItem.price,
+                WatchlistItem.side,
+                WatchlistItem.trade_date.label("date")
+            ],
+            orderby=[
+                WatchlistItem.ticker,
+                WatchlistItem.trade_date,
+                WatchlistItem.id,
+            ]
+        )
+        .astype({'date': 'datetime64[ns]'})
+    )
+    prev_value = None
+    if not df_trades.empty:
+        first_trade_date = df_trades['date'].dt.date.min()
+        if start_date is not None and start_date > first_trade_date:
+            prev_value = PortfolioValueMgr.get_first_item(
+                filters=[
+                    PortfolioValue.watchlist_id == watchlist_id,
+                    PortfolioValue.date < start_date,
+                ],
+                orderby=[PortfolioValue.date.desc()]
+            )
+        if prev_value is None:
+            start_date = first_trade_date
+    if df_trades.empty:
+        _delete_daily_values(watchlist_id, start_date)
+        db.session.commit()
+        return 0
+
+    if prev_value is None:
+        prices_start_date = start_date
+        prev_total_val = None
+    else:
+        prices_start_date = prev_value.date - PRICE_LOOKBACK
+        prev_total_val = prev_value.market_val + prev_value.cash
+    df_prices = PriceMgr.get_prices(
+        df_trades['ticker'].unique().tolist(), prices_start_date
+    )
+    df_portf_pos = calc_portf_positions(df_trades)
+    df_portf_val = (
+        calc_portf_valuations(df_portf_pos, df_prices)
+        .loc[lambda x: x.index >= pd.Timestamp(start_date)]
+    )
+    df_portf_flows = (
+        WatchlistItemMgr
+        .get_grouped_items(filters=[
+            WatchlistItem.watchlist_id == watchlist_id
+        ])
+        .astype({'date': 'datetime64[ns]'})
+    )
+    df_daily_values = (
+        calc_daily_values(
+            df_portf_val,
+            calc_portf_flows_adjusted(df_portf_flows),
+            prev_total_val=prev_total_val,
+        )
+        .reset_index()
+        .assign(
+            date=lambda x: x['date'].dt.date,
+            watchlist_id=watchlist_id,
+        )
+    )
+    # The stale rows are deleted after the reads above, in the same
+    # transaction as the new ones. Without a previous row, all of them
+    # are, as rows before the first remaining trade are stale too.
+    _delete_daily_values(
+        watchlist_id, None if prev_value is None else start_date
+    )
+    if not df_daily_values.empty:
+        db.session.execute(
+            insert(PortfolioValue),
+            df_daily_values.to_dict(orient='records')
+        )
+    db.session.commit()
+    return df_daily_values.shape[0]
+
+
+def refresh_all_daily_values() -> int:
+    """
+    Appends the dates after the last stored one to the daily values of
+    every watchlist, watchlists without stored values are computed from
+    their first trade. Returns the number of rows written.
+    """
+    last_dates = dict(
+        db
+        .session
+        .query(Watchlist.id, func.max(PortfolioValue.date))
+        .outerjoin(
+            PortfolioValue,
+            onclause=(PortfolioValue.watchlist_id == Watchlist.id)
+        )
+        .group_by(Watchlist.id)
+        .all()
+    )
+    no_rows = 0
+    for watchlist_id, last_date in last_dates.items():
+        start_date = (
+            None if last_date is None
+            else last_date + dt.timedelta(days=1)
+        )
+        no_rows += refresh_daily_values(watchlist_id, start_date)
+    return no_rows
+
+
+def refresh_ticker_daily_values(ticker: str) -> int:
+    """
+    Recomputes the daily values of every watchlist holding 'ticker',
+    from the first trade of that ticker, after its prices are loaded.
+    """
+    first_trade_dates = (
+        db
+        .session
+        .query(WatchlistItem.watchlist_id, func.min(WatchlistItem.trade_date))
+        .filter(WatchlistItem.ticker == ticker)
+        .group_by(WatchlistItem.watchlist_id)
+        .all()
+    )
+    no_rows = 0
+    for watchlist_id, first_trade_date in first_trade_dates:
+        no_rows += refresh_daily_values(watchlist_id, first_trade_date)
+    return no_rows
+
+
+def mark_daily_values_stale(watchlist_id: int, start_date: dt.date) -> None:
+    """
+    Records that the stored daily values of a watchlist are out of date
+    on and after 'start_date', after a trade edit, and commits it. The
+    worker recomputes them, from the earliest date marked since its
+    last run.
+    """
+    _ = (
+        db
+        .session
+        .query(Watchlist)
+        .filter(Watchlist.id == watchlist_id)
+        .update(
+            {
+                Watchlist.values_stale_from: case(
+                    (
+                        or_(
+                            Watchlist.values_stale_from.is_(None),
+                            Watchlist.values_stale_from > start_date,
+                        ),
+                        start_date,
+                    ),
+                    else_=Watchlist.values_stale_from,
+                )
+            },
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+
+
+def refresh_stale_daily_values() -> int:
+    """
+    Recomputes the daily values of every watchlist marked stale, on and
+    after the date it was marked from. The mark is cleared first, unless
+    an earlier date was marked in between, so edits made during the
+    refresh mark the watchlist again for the next run. Returns the
+    number of rows written.
+    """
+    stale_watchlists = (
+        db
+        .session
+        .query(Watchlist.id, Watchlist.values_stale_from)
+        .filter(Watchlist.values_stale_from.isnot(None))
+        .all()
+    )
+    no_rows = 0
+    for watchlist_id, start_date in stale_watchlists:
+        _ = (
+            db
+            .session
+            .query(Watchlist)
+            .filter(
+                Watchlist.id == watchlist_id,
+                Watchlist.values_stale_from == start_date,
+            )
+            .update(
+                {Watchlist.values_stale_from: None},
+                synchronize_session=False,
+            )
+        )
+        db.session.commit()
+        try:
+            no_rows += refresh_daily_values(watchlist_id, start_date)
+        except Exception as e:
+            logging.error(
+                f"Refresh of the daily values of watchlist {watchlist_id} "
+                f"failed: {e}"
+            )
+            db.session.rollback()
+            mark_daily_values_stale(watchlist_id, start_date)
+    return no_rows
+
+
+def process_stale_daily_values() -> None:
+    with scheduler.app.app_context():  # type: ignore
+        # Polled often, so the lease is only taken when there's work
+        is_stale = Watchlist.values_stale_from.isnot(None)
+        if db.session.query(Watchlist.id).filter(is_stale).first():
+            run_exclusive(JOB_ID, refresh_stale_daily_values)
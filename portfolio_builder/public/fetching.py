@@ -0,0 +1,203 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+
+T = TypeVar('T')
+
+# HTTP statuses worth retrying, anything else fails the request at once
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_limiters: Dict[Tuple[float, float], 'TokenBucket'] = {}
+_limiters_lock = threading.Lock()
+_clients: Dict[Tuple[int, Tuple[float, float]], 'ProviderClient'] = {}
+_clients_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: holds up to 'capacity' tokens and refills
+    at 'rate' tokens per second. Each request takes a token, waiting for
+    one when the bucket is empty, so bursts of 'capacity' requests go
+    out at once and the long-run pace stays at 'rate'.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.rate,
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_rate_limiter(rate: float, capacity: float = 1.0) -> TokenBucket:
+    """
+    Returns the bucket of a (rate, capacity) quota, shared by every
+    caller in the process so concurrent jobs don't exceed it together.
+    """
+    with _limiters_lock:
+        return _limiters.setdefault((rate, capacity), TokenBucket(rate, capacity))
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    # Client libraries may wrap the HTTPError of the response
+    http_error = (
+        error.args[0] if error.args and isinstance(error.args[0], HTTPError)
+        else error
+    )
+    if isinstance(http_error, HTTPError) and http_error.response is not None:
+        return http_error.response.status_code in RETRY_STATUSES
+    return False
+
+
+def call_with_retry(
+    func: Callable[[], T],
+    rate_limiter: Optional[TokenBucket] = None,
+    max_retries: int = 0,
+    retry_backoff: float = 1.0,
+) -> T:
+    """
+    Calls 'func', taking a token from 'rate_limiter' before each try.
+    Connection errors, timeouts and HTTP 429/5xx are retried up to
+    'max_retries' times, waiting 'retry_backoff' seconds doubled on each
+    retry, with jitter so parallel callers don't retry in lockstep.
+    """
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            delay = retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logging.warning(f"Request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+class ProviderStats(NamedTuple):
+    requests: int
+    failures: int
+    nbytes: int
+    seconds: float
+    max_seconds: float
+
+
+class ProviderClient:
+    """
+    HTTP client shared by every market data request of the process. A
+    pooled requests.Session keeps connections to each host alive, at
+    most 'max_connections' per host with callers waiting for a free one
+    beyond that. Every request has a (connect, read) 'timeout' and its
+    latency and response size are added to the counters of its host.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 8,
+        timeout: Tuple[float, float] = (10.0, 60.0),
+    ) -> None:
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,  # hosts kept in the pool
+            pool_maxsize=max_connections,
+            pool_block=True,
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        self.stats: Dict[str, ProviderStats] = {}
+
+    def _record(self, host: str, ok: bool, nbytes: int, seconds: float) -> None:
+        with self.lock:
+            stats = self.stats.get(host, ProviderStats(0, 0, 0, 0.0, 0.0))
+            self.stats[host] = ProviderStats(
+                requests=stats.requests + 1,
+                failures=stats.failures + (not ok),
+                nbytes=stats.nbytes + nbytes,
+                seconds=stats.seconds + seconds,
+                max_seconds=max(stats.max_seconds, seconds),
+            )
+
+    def _get(self, url: str, **kwargs: Any) -> requests.Response:
+        host = urlsplit(url).netloc
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=self.timeout, **kwargs)
+        except Exception:
+            self._record(host, False, 0, time.monotonic() - start)
+            raise
+        # Streamed bodies are read by the caller, only their size is known
+        nbytes = (
+            int(response.headers.get('Content-Length') or 0)
+            if kwargs.get('stream') else len(response.content)
+        )
+        self._record(host, response.ok, nbytes, time.monotonic() - start)
+        if not response.ok:
+            # Hands a streamed connection back to the pool
+            response.close()
+        response.raise_for_status()
+        return response
+
+    def get(
+        self,
+        url: str,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = 0,
+        retry_backoff: float = 1.0,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """GET 'url', raising HTTPError on error statuses, see call_with_retry."""
+        return call_with_retry(
+            lambda: self._get(url, **kwargs),
+            rate_limiter=rate_limiter,
+            max_retries=max_retries,
+            retry_backoff=retry_backoff,
+        )
+
+    def get_stats(self) -> Dict[str, ProviderStats]:
+        with self.lock:
+            return dict(self.stats)
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.stats.clear()
+
+
+def get_provider_client(
+    max_connections: int = 8,
+    timeout: Tuple[float, float] = (10.0, 60.0),
+) -> ProviderClient:
+    """Returns the client of these settings, shared by the whole process."""
+    with _clients_lock:
+        key = (max_connections, tuple(timeout))
+        if key not in _clients:
+            _clients[key] = ProviderClient(max_connections, timeout)
+        return _clients[key]
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, Tuple
+
+from portfolio_builder.lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    np = lazy_import('numpy')
+
+
+CHUNKS_PER_WORKER = 4
+
+# Pool processes are started from a clean server process instead of being
+# forked from the caller, which may hold database connections and threads
+START_METHOD = (
+    'forkserver'
+    if 'forkserver' in multiprocessing.get_all_start_methods()
+    else 'spawn'
+)
+
+_executors: Dict[int, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def match_lots(
+    is_buy: np.ndarray,
+    quantities: np.ndarray,
+    prices: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    FIFO lot matching over the trades of a single ticker, in trade order.
+
+    The buy lots are kept in one preallocated buffer (their quantities,
+    prices and cumulative quantity boundaries), and every sell consumes
+    the slice of that buffer that lies between the cumulative quantity
+    consumed before and after it. Sells larger than the open inventory
+    only consume what is available, the rest is ignored.
+
+    Returns the running net quantity and the running realized P&L
+    for every trade.
+    """
+    is_buy = np.asarray(is_buy, dtype=np.bool_)
+    quantities = np.asarray(quantities, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    n_trades = quantities.shape[0]
+    realized_pnl = np.zeros(n_trades, dtype=np.float64)
+    if n_trades == 0:
+        return np.zeros(0, dtype=np.int64), realized_pnl
+
+    bought = np.where(is_buy, quantities, 0).cumsum()
+    sold = np.where(is_buy, 0, quantities).cumsum()
+    # Cumulative quantity consumed from the inventory after each trade:
+    # consumed[k] = min(consumed[k-1] + sold_qty[k], bought[k])
+    consumed = sold + np.minimum.accumulate(np.minimum(bought - sold, 0))
+    net_quantity = bought - consumed
+
+    # Lot buffer: one slot per buy, in FIFO order
+    lot_qty = quantities[is_buy]
+    lot_price = prices[is_buy]
+    lot_end = lot_qty.cumsum()
+    lot_start = lot_end - lot_qty
+
+    consumed_prev = np.concatenate(([0], consumed[:-1]))
+    sell_idx = np.flatnonzero(consumed > consumed_prev)
+    if sell_idx.size == 0:
+        return net_quantity, realized_pnl
+    sell_start = consumed_prev[sell_idx]
+    sell_end = consumed[sell_idx]
+    first_lot = np.searchsorted(lot_end, sell_start, side='right')
+    last_lot = np.searchsorted(lot_end, sell_end, side='left')
+
+    # One event per (sell, lot) pair, ordered as a FIFO queue would visit them
+    n_lots = last_lot - first_lot + 1
+    event_sell = np.repeat(np.arange(sell_idx.size), n_lots)
+    event_offset = (
+        np.arange(event_sell.size)
+        - np.repeat(n_lots.cumsum() - n_lots, n_lots)
+    )
+    event_lot = first_lot[event_sell] + event_offset
+    event_qty = (
+        np.minimum(sell_end[event_sell], lot_end[event_lot])
+        - np.maximum(sell_start[event_sell], lot_start[event_lot])
+    )
+    event_pnl = event_qty * (
+        prices[sell_idx][event_sell] - lot_price[event_lot]
+    )
+    # np.add.accumulate sums left to right, like the running total
+    # of a trade-by-trade loop, so the result is bit-for-bit the same.
+    cum_pnl = np.add.accumulate(event_pnl) + 0.0
+
+    last_event = n_lots.cumsum() - 1
+    realized_pnl[sell_idx] = cum_pnl[last_event]
+    has_pnl = np.zeros(n_trades, dtype=np.bool_)
+    has_pnl[sell_idx] = True
+    carry_idx = np.maximum.accumulate(
+        np.where(has_pnl, np.arange(n_trades), -1)
+    )
+    realized_pnl = np.where(
+        carry_idx >= 0, realized_pnl[np.maximum(carry_idx, 0)], 0.0
+    )
+    return net_quantity, realized_pnl
+
+
+def open_lots(
+    is_buy: np.ndarray,
+    quantities: np.ndarray,
+    prices: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the quantities and prices of the buy lots still open
+    after all the trades of a single ticker, oldest first.
+    """
+    is_buy = np.asarray(is_buy, dtype=np.bool_)
+    quantities = np.asarray(quantities, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    if quantities.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    net_quantity, _ = match_lots(is_buy, quantities, prices)
+    lot_qty = quantities[is_buy]
+    lot_price = prices[is_buy]
+    lot_end = lot_qty.cumsum()
+    consumed = lot_end[-1] - net_quantity[-1] if lot_end.size else 0
+    remaining_qty = lot_end - np.maximum(lot_end - lot_qty, consumed)
+    is_open = remaining_qty > 0
+    return remaining_qty[is_open], lot_price[is_open]
+
+
+def _match_lots_chunk(
+    chunk: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    is_buy, quantities, prices, group_starts = chunk
+    group_ends = np.append(group_starts[1:], quantities.shape[0])
+    results = [
+        match_lots(is_buy[start:end], quantities[start:end], prices[start:end])
+        for start, end in zip(group_starts, group_ends)
+    ]
+    return (
+        np.concatenate([net_quantity for net_quantity, _ in results]),
+        np.concatenate([realized_pnl for _, realized_pnl in results]),
+    )
+
+
+def get_executor(max_workers: int) -> ProcessPoolExecutor:
+    """Returns the process pool of the given size, started on first use."""
+    with _executors_lock:
+        executor = _executors.get(max_workers)
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context(START_METHOD),
+            )
+            _executors[max_workers] = executor
+        return executor
+
+
+@atexit.register
+def shutdown_executors() -> None:
+    """Shuts down the process pools, called when the interpreter exits."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True)
+
+
+def match_lots_grouped(
+    is_buy: np.ndarray,
+    quantities: np.ndarray,
+    prices: np.ndarray,
+    group_starts: np.ndarray,
+    max_workers: int = 1,
+    min_parallel_trades: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    FIFO lot matching over the trades of several tickers, sorted so the
+    trades of each ticker are contiguous and start at 'group_starts'.
+
+    With more than one worker and at least 'min_parallel_trades' trades,
+    the groups are split into chunks of similar size and matched in a
+    process pool. Chunks are collected in order, so the result is the
+    same as the serial one.
+    """
+    is_buy = np.asarray(is_buy, dtype=np.bool_)
+    quantities = np.asarray(quantities, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    group_starts = np.asarray(group_starts, dtype=np.int64)
+    n_trades = quantities.shape[0]
+    if n_trades == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    if max_workers <= 1 or n_trades < min_parallel_trades:
+        return _match_lots_chunk((is_buy, quantities, prices, group_starts))
+
+    n_chunks = min(max_workers * CHUNKS_PER_WORKER, group_starts.shape[0])
+    targets = np.linspace(0, n_trades, n_chunks + 1)[1:-1]
+    cut_groups = np.unique(np.searchsorted(group_starts, targets))
+    cut_groups = cut_groups[
+        (cut_groups > 0) & (cut_groups < group_starts.shape[0])
+    ]
+    chunk_bounds = np.concatenate(([0], group_starts[cut_groups], [n_trades]))
+    chunks = [
+        (
+            is_buy[chunk_start:chunk_end],
+            quantities[chunk_start:chunk_end],
+            prices[chunk_start:chunk_end],
+            starts - chunk_start,
+        )
+        for chunk_start, chunk_end, starts in zip(
+            chunk_bounds[:-1],
+            chunk_bounds[1:],
+            np.split(group_starts, cut_groups),
+        )
+    ]
+    results = list(get_executor(max_workers).map(_match_lots_chunk, chunks))
+    return (
+        np.concatenate([net_quantity for net_quantity, _ in results]),
+        np.concatenate([realized_pnl for _, realized_pnl in results]),
+    )
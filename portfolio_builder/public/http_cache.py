@@ -0,0 +1,125 @@
+"""
+On-disk cache of provider downloads, kept as the DataFrames parsed
+from them.
+
+Each URL has a metadata file with the ETag and Last-Modified headers of
+its last download, and a pickle of the frame parsed from it. Within
+'ttl' seconds of the last download the frame is read back without any
+request. After that the download is revalidated with a conditional
+GET: a 304 reuses the frame, anything else is parsed and stored again.
+Files are replaced atomically with os.replace.
+
+Bodies are streamed to a temporary file and parsed from there, so a
+large download is never held in memory whole.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import IO, TYPE_CHECKING, Any, Callable, Dict, Optional
+
+import requests
+
+from portfolio_builder.lazy import lazy_import
+from portfolio_builder.public.fetching import ProviderClient
+
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import('pandas')
+
+
+# Query parameters left out of the cache keys, so secrets never reach the disk
+SECRET_PARAMS = frozenset({'api_token', 'token'})
+# Bytes read from the network at a time
+CHUNK_BYTES = 2**20
+
+
+def _key(url: str, params: Optional[Dict[str, Any]]) -> str:
+    public_params = sorted(
+        (name, str(value)) for name, value in (params or {}).items()
+        if name not in SECRET_PARAMS
+    )
+    return hashlib.sha256(
+        json.dumps([url, public_params]).encode()
+    ).hexdigest()[:32]
+
+
+def _write(path: str, write: Callable[[str], None]) -> None:
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_meta(path: str, meta: Dict[str, Any]) -> None:
+    def write(tmp_path: str) -> None:
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+    _write(path, write)
+
+
+def _parse_body(
+    response: requests.Response,
+    parse: Callable[[IO[bytes]], pd.DataFrame],
+) -> pd.DataFrame:
+    with response, tempfile.TemporaryFile() as f:
+        for chunk in response.iter_content(CHUNK_BYTES):
+            f.write(chunk)
+        f.seek(0)
+        return parse(f)
+
+
+def get_frame(
+    client: ProviderClient,
+    url: str,
+    parse: Callable[[IO[bytes]], pd.DataFrame],
+    cache_dir: Optional[str] = None,
+    ttl: float = 0.0,
+    params: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> pd.DataFrame:
+    """
+    Frame parsed by 'parse' from a file holding the body of 'url',
+    downloaded again only when the cached one is older than 'ttl'
+    seconds and changed. Without 'cache_dir' every call downloads and
+    parses.
+    """
+    if not cache_dir:
+        return _parse_body(
+            client.get(url, params=params, stream=True, **kwargs), parse)
+    os.makedirs(cache_dir, exist_ok=True)
+    key = _key(url, params)
+    meta_path = os.path.join(cache_dir, f'{key}.json')
+    frame_path = os.path.join(cache_dir, f'{key}.pkl')
+    meta: Dict[str, Any] = {}
+    if os.path.exists(meta_path) and os.path.exists(frame_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if time.time() - meta['fetched_at'] < ttl:
+            return pd.read_pickle(frame_path)
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    response = client.get(
+        url, params=params, headers=headers, stream=True, **kwargs)
+    if response.status_code == 304:
+        response.close()
+        _write_meta(meta_path, {**meta, 'fetched_at': time.time()})
+        return pd.read_pickle(frame_path)
+
+    df = _parse_body(response, parse)
+    _write(frame_path, lambda tmp_path: df.to_pickle(tmp_path))
+    _write_meta(meta_path, {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': time.time(),
+    })
+    return df
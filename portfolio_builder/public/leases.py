@@ -0,0 +1,150 @@
+"""
+Database leases so each scheduled job runs in one worker at a time.
+
+The scheduler only runs in worker processes (see worker.py), and when
+several of them run side by side each one fires the same jobs. Before
+running, a worker takes the lease of the job with a single conditional
+UPDATE of its job_leases row, which succeeds in one worker only. The
+lease expires 'JOB_LEASE_SECONDS' after it was last renewed: the holder
+renews it while the job runs, so if the holder dies the lease lapses
+and the next run of the job in another worker takes over.
+Each row also records who ran the job last, when and how it ended.
+"""
+import datetime as dt
+import logging
+import os
+import socket
+import threading
+from typing import Callable, Optional
+
+from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import and_, or_
+
+from portfolio_builder import db
+from portfolio_builder.public.models import JobLease
+
+
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _owner() -> str:
+    # Read on each call, workers forked from a preloaded app get their own
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def acquire_lease(
+    job_id: str,
+    ttl: dt.timedelta,
+    min_interval: dt.timedelta = dt.timedelta(0)
+) -> bool:
+    """
+    Takes the lease of 'job_id' unless another process holds it, or the
+    job started less than 'min_interval' ago.
+    """
+    now = dt.datetime.utcnow()
+    table = JobLease.__table__
+    values = dict(
+        owner=_owner(),
+        expires_at=now + ttl,
+        status=RUNNING,
+        error=None,
+        started_timestamp=now,
+        finished_timestamp=None,
+    )
+    with db.engine.begin() as conn:
+        acquired = conn.execute(
+            update(table)
+            .where(and_(
+                table.c.job_id == job_id,
+                or_(table.c.expires_at.is_(None), table.c.expires_at < now),
+                or_(
+                    table.c.started_timestamp.is_(None),
+                    table.c.started_timestamp <= now - min_interval,
+                ),
+            ))
+            .values(**values)
+        ).rowcount == 1
+    if acquired:
+        return True
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert(table).values(job_id=job_id, **values))
+    except IntegrityError:
+        return False  # the row exists, so the lease is taken
+    return True
+
+
+def renew_lease(job_id: str, ttl: dt.timedelta, owner: str) -> bool:
+    table = JobLease.__table__
+    with db.engine.begin() as conn:
+        return conn.execute(
+            update(table)
+            .where(and_(table.c.job_id == job_id, table.c.owner == owner))
+            .values(expires_at=dt.datetime.utcnow() + ttl)
+        ).rowcount == 1
+
+
+def release_lease(
+    job_id: str,
+    owner: str,
+    status: str,
+    error: Optional[str] = None
+) -> None:
+    table = JobLease.__table__
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(table)
+            .where(and_(table.c.job_id == job_id, table.c.owner == owner))
+            .values(
+                expires_at=None,
+                status=status,
+                error=error,
+                finished_timestamp=dt.datetime.utcnow(),
+            )
+        )
+
+
+def run_exclusive(
+    job_id: str,
+    func: Callable[[], object],
+    min_interval: dt.timedelta = dt.timedelta(0)
+) -> bool:
+    """
+    Runs 'func' if this process gets the lease of 'job_id', renewing it
+    in the background until 'func' returns. 'min_interval' skips runs
+    fired by other processes for a slot that already ran. Returns False
+    if the run was skipped, errors of 'func' are recorded and re-raised.
+    """
+    ttl = dt.timedelta(seconds=current_app.config['JOB_LEASE_SECONDS'])
+    if not acquire_lease(job_id, ttl, min_interval):
+        logging.info(f"Skipping job '{job_id}', it ran or runs elsewhere.")
+        return False
+    owner = _owner()
+    app = current_app._get_current_object()  # type: ignore
+    stopped = threading.Event()
+
+    def heartbeat() -> None:
+        with app.app_context():
+            while not stopped.wait(ttl.total_seconds() / 3):
+                if not renew_lease(job_id, ttl, owner):
+                    logging.warning(f"Lost the lease of job '{job_id}'.")
+                    return
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    status, error = DONE, None
+    try:
+        func()
+    except Exception as e:
+        status, error = FAILED, str(e)[:200]
+        raise
+    finally:
+        # Stop renewing first, a late renewal would keep the lease taken
+        stopped.set()
+        thread.join()
+        release_lease(job_id, owner, status, error)
+    return True
@@ -1,12 +1,76 @@
+from __future__ import annotations
+
 import datetime as dt
-from typing import Any, List, Optional
+import hashlib
+from functools import partial
+from typing import (
+    TYPE_CHECKING, Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+)
 
-import pandas as pd
+from flask import current_app
 from sqlalchemy.orm import Query
-from sqlalchemy.sql import expression, func, case
+from sqlalchemy.sql import and_, bindparam, expression, func, case, select
 from sqlalchemy.sql.elements import BinaryExpression
 
 from portfolio_builder import db
+from portfolio_builder.lazy import lazy_import
+from portfolio_builder.public import price_cache, price_store
+
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import('pandas')
+
+
+# Columns of a securities list, (ticker, exchange) first as the row key
+SECURITY_COLUMNS = ['ticker', 'exchange', 'name', 'currency', 'country', 'isin']
+
+
+class PriceVersion(NamedTuple):
+    """
+    State of the stored prices of a ticker. 'prices_version' changes on
+    every write of its prices, 'history_version' only on writes of dates
+    up to its last stored date (rewrites and older history), so caches
+    can extend their data on a new last date and drop it otherwise.
+    """
+    prices_version: int
+    history_version: int
+    last_date: Optional[dt.date]
+
+
+def prices_rewritten(
+    old: Mapping[str, PriceVersion],
+    new: Mapping[str, PriceVersion],
+    as_of: dt.date,
+) -> bool:
+    """
+    Whether prices dated up to 'as_of' were written between two reads
+    of the price versions of the same tickers: rewrites and older prices
+    change the history version, and a ticker whose last price was before
+    'as_of' may have got prices for the dates up to it.
+    """
+    for ticker in set(old) | set(new):
+        old_version = old.get(ticker)
+        new_version = new.get(ticker)
+        if old_version is None or new_version is None:
+            if old_version != new_version:
+                return True
+        elif old_version.history_version != new_version.history_version:
+            return True
+        elif (
+            old_version.last_date != new_version.last_date
+            and (old_version.last_date is None or old_version.last_date < as_of)
+        ):
+            return True
+    return False
+
+
+class SecuritySync(NamedTuple):
+    inserted: int
+    updated: int
+    delisted: int
+    unchanged: int
 
 
 def query_to_df(query: Query) -> pd.DataFrame:
@@ -18,6 +82,9 @@ def query_to_df(query: Query) -> pd.DataFrame:
 
 class Security(db.Model):
     __tablename__ = "securities"
+    __table_args__ = (
+        db.Index("idx_ticker_exchange", 'ticker', 'exchange'),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(200), nullable=False)
     ticker = db.Column(db.String(10), nullable=False)
@@ -25,6 +92,13 @@ class Security(db.Model):
     currency = db.Column(db.String(3))
     country = db.Column(db.String(40))
     isin = db.Column(db.String(20))
+    row_hash = db.Column(db.String(32))  # of the columns above, see SecurityMgr
+    delisted_date = db.Column(db.Date)
+    # Bumped by PriceMgr.upsert_items, see PriceVersion
+    prices_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    history_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
     prices = db.relationship(
         "Price",
         backref="securities",
@@ -43,7 +117,7 @@ class Price(db.Model):
     __tablename__ = "prices"
     __table_args__ = (
         db.Index("idx_date_tickerid", 'date', 'ticker_id'),
-        db.Index("idx_tickerid_date", 'ticker_id', 'date'),
+        db.Index("idx_tickerid_date_unique", 'ticker_id', 'date', unique=True),
     )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date = db.Column(db.Date, nullable=False)
@@ -71,11 +145,24 @@ class Watchlist(db.Model):
         db.ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False
     )
+    # First date of the stored daily values made stale by a trade edit,
+    # recomputed by the worker (see daily_values.py), None when current
+    values_stale_from = db.Column(db.Date)
     items = db.relationship(
         "WatchlistItem",
         backref="watchlists",
         passive_deletes=True
     )
+    positions = db.relationship(
+        "Position",
+        backref="watchlists",
+        passive_deletes=True
+    )
+    daily_values = db.relationship(
+        "PortfolioValue",
+        backref="watchlists",
+        passive_deletes=True
+    )
 
     def __repr__(self) -> str:
         return (f"<Watchlist ID: {self.id}, Watchlist Name: {self.name}>")
@@ -106,6 +193,142 @@ class WatchlistItem(db.Model):
         return (f"<Order ID: {self.id}, Ticker: {self.ticker}>")
 
 
+class Position(db.Model):
+    __tablename__ = "positions"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "watchlist_id", "ticker", name="uq_watchlistid_ticker"
+        ),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    ticker = db.Column(db.String(20), nullable=False)
+    net_quantity = db.Column(db.Integer, nullable=False, default=0)
+    realized_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    watchlist_id = db.Column(
+        db.Integer,
+        db.ForeignKey("watchlists.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    lots = db.relationship(
+        "PositionLot",
+        backref="positions",
+        passive_deletes=True
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<Watchlist ID: {self.watchlist_id}, " +
+            f"Ticker: {self.ticker}, " +
+            f"Net Quantity: {self.net_quantity}>"
+        )
+
+
+class PositionLot(db.Model):
+    __tablename__ = "position_lots"
+    __table_args__ = (
+        db.Index("idx_positionid_id", 'position_id', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    position_id = db.Column(
+        db.Integer,
+        db.ForeignKey("positions.id", ondelete="CASCADE"),
+        nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<Position ID: {self.position_id}, " +
+            f"Quantity: {self.quantity}, " +
+            f"Price: {self.price}>"
+        )
+
+
+class PortfolioValue(db.Model):
+    __tablename__ = "portfolio_daily_values"
+    __table_args__ = (
+        db.Index("idx_watchlistid_date", 'watchlist_id', 'date', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    date = db.Column(db.Date, nullable=False)
+    market_val = db.Column(db.Float, nullable=False)
+    cash = db.Column(db.Float, nullable=False)
+    inflows = db.Column(db.Float, nullable=False)
+    hpr = db.Column(db.Float, nullable=False)
+    watchlist_id = db.Column(
+        db.Integer,
+        db.ForeignKey("watchlists.id", ondelete="CASCADE"),
+        nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<Watchlist ID: {self.watchlist_id}, " +
+            f"Date: {self.date}, " +
+            f"Market Value: {self.market_val}>"
+        )
+
+
+class BackfillJob(db.Model):
+    __tablename__ = "backfill_jobs"
+    __table_args__ = (
+        db.Index("idx_ticker_status", 'ticker', 'status'),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    ticker = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    error = db.Column(db.String(200))
+    created_timestamp = db.Column(db.DateTime, default=dt.datetime.utcnow)
+    updated_timestamp = db.Column(
+        db.DateTime,
+        default=dt.datetime.utcnow,
+        onupdate=dt.datetime.utcnow
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<Backfill ID: {self.id}, " +
+            f"Ticker: {self.ticker}, " +
+            f"Status: {self.status}>"
+        )
+
+
+class JobLease(db.Model):
+    __tablename__ = "job_leases"
+    job_id = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100))
+    expires_at = db.Column(db.DateTime)
+    status = db.Column(db.String(10))
+    error = db.Column(db.String(200))
+    started_timestamp = db.Column(db.DateTime)
+    finished_timestamp = db.Column(db.DateTime)
+
+    def __repr__(self) -> str:
+        return (
+            f"<Job: {self.job_id}, " +
+            f"Owner: {self.owner}, " +
+            f"Status: {self.status}>"
+        )
+
+
+class BootstrapBatch(db.Model):
+    __tablename__ = "bootstrap_batches"
+    batch_key = db.Column(db.String(40), primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    no_tickers = db.Column(db.Integer, nullable=False)
+    no_rows = db.Column(db.Integer, nullable=False)
+    finished_timestamp = db.Column(db.DateTime, default=dt.datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return (
+            f"<Batch: {self.batch_key}, " +
+            f"Tickers: {self.no_tickers}, " +
+            f"Rows: {self.no_rows}>"
+        )
+
+
 class SecurityMgr:
     @classmethod
     def get_items(
@@ -135,6 +358,129 @@ class SecurityMgr:
         )
         return query_to_df(query)
 
+    @classmethod
+    def _row_hashes(cls, df_securities: pd.DataFrame) -> pd.Series:
+        values = (
+            df_securities[SECURITY_COLUMNS]
+            .astype(object)
+            .where(lambda x: x.notna(), '')
+            .astype(str)
+        )
+        return pd.Series(
+            [
+                hashlib.md5('\x1f'.join(row).encode()).hexdigest()
+                for row in values.itertuples(index=False)
+            ],
+            index=df_securities.index,
+            dtype=object,
+        )
+
+    @classmethod
+    def sync_items(
+        cls,
+        df_securities: pd.DataFrame,
+        delisted_date: Optional[dt.date] = None,
+        batch_size: int = 1000,
+    ) -> SecuritySync:
+        """
+        Makes the securities table match 'df_securities', a full list of
+        ticker, exchange, name, currency, country and isin. Rows are
+        matched on (ticker, exchange) and compared by a hash of their
+        columns, kept in row_hash, so only changes are written: new rows
+        are inserted, changed or relisted rows updated, and stored rows
+        missing from the list get 'delisted_date', today by default.
+        Delisted rows are kept for their prices. Counts are of
+        (ticker, exchange) keys. Writes are sent in
+        batches of 'batch_size' rows, in a single transaction.
+        """
+        df_new = (
+            df_securities
+            .drop_duplicates(subset=['ticker', 'exchange'])
+            .assign(row_hash=cls._row_hashes)
+        )
+        df_stored = (
+            pd.DataFrame(
+                db.session.query(
+                    Security.ticker,
+                    Security.exchange,
+                    Security.row_hash,
+                    Security.delisted_date,
+                ).order_by(Security.id).all(),
+                columns=['ticker', 'exchange', 'stored_hash', 'delisted_date'],
+            )
+            # Rows appended twice by older loads are compared once
+            .drop_duplicates(subset=['ticker', 'exchange'])
+        )
+        df = pd.merge(
+            df_new[['ticker', 'exchange', 'row_hash']].astype(object),
+            df_stored,
+            on=['ticker', 'exchange'],
+            how='outer',
+            indicator=True,
+        )
+        is_new = df['_merge'] == 'left_only'
+        is_changed = (df['_merge'] == 'both') & (
+            (df['row_hash'] != df['stored_hash']) | df['delisted_date'].notna()
+        )
+        is_delisted = (df['_merge'] == 'right_only') & df['delisted_date'].isna()
+
+        df_rows = (
+            df_new
+            .set_index(['ticker', 'exchange'])
+            [SECURITY_COLUMNS[2:] + ['row_hash']]
+            .astype(object)
+            .where(lambda x: x.notna(), None)
+        )
+        insert_keys = df.loc[is_new, ['ticker', 'exchange']]
+        inserts = [
+            {'ticker': ticker, 'exchange': exchange, **row}
+            for (ticker, exchange), row in zip(
+                insert_keys.itertuples(index=False),
+                df_rows.loc[pd.MultiIndex.from_frame(insert_keys)]
+                .to_dict('records'),
+            )
+        ]
+        update_keys = df.loc[is_changed, ['ticker', 'exchange']]
+        updates = [
+            {'b_ticker': ticker, 'b_exchange': exchange, 'delisted_date': None, **row}
+            for (ticker, exchange), row in zip(
+                update_keys.itertuples(index=False),
+                df_rows.loc[pd.MultiIndex.from_frame(update_keys)]
+                .to_dict('records'),
+            )
+        ]
+        delistings = [
+            {'b_ticker': ticker, 'b_exchange': exchange}
+            for ticker, exchange in
+            df.loc[is_delisted, ['ticker', 'exchange']].itertuples(index=False)
+        ]
+
+        # Matched on the key, not the id, so duplicated rows stay the same
+        table = Security.__table__
+        is_key = and_(
+            table.c.ticker == bindparam('b_ticker'),
+            table.c.exchange == bindparam('b_exchange'),
+        )
+        update_sql = table.update().where(is_key).values({
+            column: bindparam(column)
+            for column in SECURITY_COLUMNS[2:] + ['row_hash', 'delisted_date']
+        })
+        delist_sql = table.update().where(is_key).values(
+            delisted_date=delisted_date or dt.date.today())
+        with db.engine.begin() as conn:
+            for start in range(0, len(inserts), batch_size):
+                conn.execute(table.insert(), inserts[start:start + batch_size])
+            for start in range(0, len(updates), batch_size):
+                conn.execute(update_sql, updates[start:start + batch_size])
+            for start in range(0, len(delistings), batch_size):
+                conn.execute(delist_sql, delistings[start:start + batch_size])
+        return SecuritySync(
+            inserted=len(inserts),
+            updated=len(updates),
+            delisted=len(delistings),
+            unchanged=int((df['_merge'] == 'both').sum()) - len(updates),
+        )
+
 
 class PriceMgr:
     @classmethod
@@ -181,6 +527,278 @@ class PriceMgr:
         )
         return query_to_df(query)
 
+    @classmethod
+    def get_prices(
+        cls,
+        tickers: List[str],
+        start_date: dt.date,
+        end_date: Optional[dt.date] = None,
+    ) -> pd.DataFrame:
+        """
+        Prices of 'tickers' between two dates included (up to today by
+        default), with ticker, date and float64 price columns ordered by
+        ticker and date.
+
+        With PRICE_CACHE_MAX_BYTES set, they're served from the in-process
+        price cache, which only loads the date ranges it doesn't hold.
+        The cache and the price store are both checked against the price
+        versions of the tickers.
+        """
+        end_date = end_date or dt.date.today()
+        max_bytes = current_app.config.get('PRICE_CACHE_MAX_BYTES')
+        if not max_bytes and not current_app.config.get('PRICE_STORE_DIR'):
+            return cls._get_sql_prices(tickers, start_date, end_date)
+        versions = {
+            ticker: (version.history_version, version.last_date)
+            for ticker, version in cls.get_price_versions(tickers).items()
+        }
+        load = partial(cls._load_prices, versions=versions)
+        if max_bytes:
+            return price_cache.get_prices(
+                tickers, start_date, end_date, load, versions, max_bytes,
+            )
+        return load(tickers, start_date, end_date)
+
+    @classmethod
+    def _load_prices(
+        cls,
+        tickers: List[str],
+        start_date: dt.date,
+        end_date: dt.date,
+        versions: Mapping[str, price_store.Version],
+    ) -> pd.DataFrame:
+        """
+        Reads prices from the price store when PRICE_STORE_DIR is set.
+        Tickers it doesn't cover are read from the database in a single
+        query, which also fills the store for the next requests, up to
+        the last stored date of each ticker in 'versions'.
+        """
+        root = current_app.config.get('PRICE_STORE_DIR')
+        if not root:
+            return cls._get_sql_prices(tickers, start_date, end_date)
+        df_stored, missed = price_store.read_prices(
+            root, tickers, start_date, end_date, versions
+        )
+        if not missed:
+            return df_stored
+        coverages = [
+            price_store.get_coverage(root, ticker) or (start_date, end_date)
+            for ticker in missed
+        ]
+        fill_start_date = min(start_date, *[cov[0] for cov in coverages])
+        fill_end_date = max(end_date, *[cov[1] for cov in coverages])
+        df_missed = cls._get_sql_prices(missed, fill_start_date, fill_end_date)
+        df_missed_groups = dict(list(df_missed.groupby('ticker', sort=False)))
+        for ticker in missed:
+            version, last_date = versions[ticker]
+            df_ticker = df_missed_groups.get(ticker, df_missed.iloc[:0])
+            price_store.write_prices(
+                root,
+                ticker,
+                df_ticker['date'].dt.date,
+                df_ticker['price'],
+                fill_start_date,
+                min(fill_end_date, last_date),
+                version,
+                overwrite=False,
+            )
+        df_prices = (
+            pd
+            .concat([
+                df_stored,
+                df_missed.loc[lambda x: x['date'].between(
+                    pd.Timestamp(start_date), pd.Timestamp(end_date)
+                )],
+            ])
+            .sort_values(['ticker', 'date'], kind='stable')
+            .reset_index(drop=True)
+        )
+        return df_prices
+
+    @classmethod
+    def _get_sql_prices(
+        cls,
+        tickers: List[str],
+        start_date: dt.date,
+        end_date: dt.date
+    ) -> pd.DataFrame:
+        df_prices = (
+            cls
+            .get_items(
+                filters=[
+                    Security.ticker.in_(tickers),
+                    Price.date.between(start_date, end_date),
+                ],
+                entities=[
+                    Security.ticker,
+                    Price.date,
+                    Price.close_price.label('price'),
+                ],
+                orderby=[Security.ticker, Price.date]
+            )
+            .reindex(columns=['ticker', 'date', 'price'])
+            .astype({'date': 'datetime64[ns]', 'price': 'float64'})
+        )
+        return df_prices
+
+    @classmethod
+    def _upsert_sql(cls, no_rows: int) -> str:
+        dialect = db.engine.dialect
+        placeholder = '?' if dialect.paramstyle == 'qmark' else '%s'
+        row = '(' + ', '.join([placeholder] * 3) + ')'
+        if dialect.name == 'mysql':
+            on_conflict = (
+                'ON DUPLICATE KEY UPDATE close_price = VALUES(close_price)'
+            )
+        else:
+            on_conflict = (
+                'ON CONFLICT (ticker_id, date) '
+                'DO UPDATE SET close_price = excluded.close_price'
+            )
+        return (
+            f'INSERT INTO {Price.__tablename__} (ticker_id, date, close_price) '
+            f'VALUES {", ".join([row] * no_rows)} {on_conflict}'
+        )
+
+    @classmethod
+    def _bump_versions(cls, conn: Any, first_dates: Dict[int, dt.date]) -> None:
+        last_dates = dict(conn.execute(
+            select(Price.ticker_id, func.max(Price.date))
+            .where(Price.ticker_id.in_(list(first_dates)))
+            .group_by(Price.ticker_id)
+        ).all())
+        rewritten_ids = [
+            ticker_id for ticker_id, first_date in first_dates.items()
+            if ticker_id in last_dates and first_date <= last_dates[ticker_id]
+        ]
+        table = Security.__table__
+        conn.execute(
+            table.update()
+            .where(table.c.id.in_(list(first_dates)))
+            .values(prices_version=table.c.prices_version + 1)
+        )
+        if rewritten_ids:
+            conn.execute(
+                table.update()
+                .where(table.c.id.in_(rewritten_ids))
+                .values(history_version=table.c.history_version + 1)
+            )
+
+    @classmethod
+    def upsert_items(cls, df_prices: pd.DataFrame, batch_size: int = 1000) -> int:
+        """
+        Writes rows of ticker_id, date and close_price, replacing the
+        close price of a (ticker_id, date) already stored, so loading the
+        same prices twice doesn't duplicate them. Rows are sent in
+        multi-row INSERT statements of 'batch_size' rows, with ON
+        DUPLICATE KEY UPDATE on MySQL and ON CONFLICT on SQLite, in a
+        single transaction, along with the price versions of the tickers
+        written (see PriceVersion).
+
+        The statements are written by hand: building them with the ORM
+        costs several times more than running them on large loads.
+
+        Returns the number of rows written.
+        """
+        df_rows = (
+            df_prices
+            .drop_duplicates(subset=['ticker_id', 'date'], keep='last')
+        )
+        params = [
+            value
+            for row in zip(
+                df_rows['ticker_id'].astype('int64').tolist(),
+                pd.to_datetime(df_rows['date']).dt.strftime('%Y-%m-%d').tolist(),
+                df_rows['close_price'].astype('float64').tolist(),
+            )
+            for value in row
+        ]
+        no_rows = df_rows.shape[0]
+        if no_rows == 0:
+            return 0
+        first_dates = (
+            pd.to_datetime(df_rows['date']).dt.date
+            .groupby(df_rows['ticker_id'].astype('int64')).min()
+        )
+        with db.engine.begin() as conn:
+            cls._bump_versions(conn, first_dates.to_dict())
+            batch_sql = cls._upsert_sql(min(batch_size, no_rows))
+            for start in range(0, no_rows, batch_size):
+                batch = params[3 * start:3 * (start + batch_size)]
+                sql = (
+                    batch_sql if len(batch) == 3 * batch_size
+                    else cls._upsert_sql(len(batch) // 3)
+                )
+                conn.exec_driver_sql(sql, tuple(batch))
+        return no_rows
+
+    @classmethod
+    def get_price_versions(cls, tickers: List[str]) -> Dict[str, PriceVersion]:
+        """
+        Price versions and last price date of 'tickers', summed over the
+        exchanges a ticker is listed on. Unknown tickers are left out.
+        """
+        last_dates = (
+            db
+            .session
+            .query(
+                Price.ticker_id.label('ticker_id'),
+                func.max(Price.date).label('date'),
+            )
+            .join(Security, onclause=(Price.ticker_id == Security.id))
+            .filter(Security.ticker.in_(tickers))
+            .group_by(Price.ticker_id)
+            .subquery()
+        )
+        rows = (
+            db
+            .session
+            .query(
+                Security.ticker,
+                func.sum(Security.prices_version),
+                func.sum(Security.history_version),
+                func.max(last_dates.c.date),
+            )
+            .outerjoin(last_dates, onclause=(Security.id == last_dates.c.ticker_id))
+            .filter(Security.ticker.in_(tickers))
+            .group_by(Security.ticker)
+        )
+        return {
+            ticker: PriceVersion(int(prices_version), int(history_version), last_date)
+            for ticker, prices_version, history_version, last_date in rows
+        }
+
+    @classmethod
+    def get_last_items(cls, filters: List[BinaryExpression]) -> pd.DataFrame:
+        last_dates = (
+            cls
+            ._base_query(filters)
+            .with_entities(
+                Price.ticker_id.label('ticker_id'),
+                func.max(Price.date).label('date')
+            )
+            .group_by(Price.ticker_id)
+            .subquery()
+        )
+        query = (
+            cls
+            ._base_query(filters)
+            .join(
+                last_dates,
+                onclause=and_(
+                    Price.ticker_id == last_dates.c.ticker_id,
+                    Price.date == last_dates.c.date,
+                )
+            )
+            .with_entities(
+                Security.ticker,
+                Price.date,
+                Price.close_price.label('price'),
+            )
+            .order_by(Security.ticker)
+        )
+        return query_to_df(query)
+
 
 class WatchlistMgr:
     @classmethod
@@ -303,3 +921,123 @@ class WatchlistItemMgr:
             .order_by(func.date(WatchlistItem.trade_date))
         )
         return query_to_df(query)
+
+    @classmethod
+    def get_data_version(
+        cls,
+        filters: List[BinaryExpression]
+    ) -> Tuple[Any, ...]:
+        """
+        A key that changes whenever a trade is added or deleted. Writes of
+        the prices of the traded tickers are followed per ticker by
+        PriceMgr.get_price_versions.
+        """
+        no_trades, last_trade_id = (
+            cls
+            ._base_query(filters)
+            .with_entities(func.count(WatchlistItem.id), func.max(WatchlistItem.id))
+            .one()
+        )
+        return no_trades, last_trade_id
+
+
+class PositionMgr:
+    @classmethod
+    def _base_query(cls, filters: List[BinaryExpression]) -> Query[Position]:
+        query = (
+            db
+            .session
+            .query(Position)
+            .join(Watchlist, onclause=(Position.watchlist_id == Watchlist.id))
+            .filter(*filters)
+        )
+        return query
+
+    @classmethod
+    def get_first_item(
+        cls, filters: List[BinaryExpression]
+    ) -> Optional[Position]:
+        item = cls._base_query(filters).first()
+        return item
+
+    @classmethod
+    def get_items(
+        cls,
+        filters: List[BinaryExpression],
+        entities: Optional[List[Any]] = None,
+        orderby: Optional[List[Any]] = None,
+    ) -> pd.DataFrame:
+        if not entities:
+            entities = [
+                Position.ticker,
+                Position.net_quantity,
+                Position.realized_pnl,
+            ]
+        if not orderby:
+            orderby = [Position.ticker]
+        query = (
+            cls
+            ._base_query(filters)
+            .with_entities(*entities)
+            .order_by(*orderby)
+        )
+        return query_to_df(query)
+
+
+class PortfolioValueMgr:
+    @classmethod
+    def _base_query(
+        cls, filters: List[BinaryExpression]
+    ) -> Query[PortfolioValue]:
+        query = (
+            db
+            .session
+            .query(PortfolioValue)
+            .join(
+                Watchlist,
+                onclause=(PortfolioValue.watchlist_id == Watchlist.id)
+            )
+            .filter(*filters)
+        )
+        return query
+
+    @classmethod
+    def get_first_item(
+        cls,
+        filters: List[BinaryExpression],
+        orderby: Optional[List[Any]] = None,
+    ) -> Optional[PortfolioValue]:
+        if not orderby:
+            orderby = [PortfolioValue.date]
+        item = (
+            cls
+            ._base_query(filters)
+            .order_by(*orderby)
+            .first()
+        )
+        return item
+
+    @classmethod
+    def get_items(
+        cls,
+        filters: List[BinaryExpression],
+        entities: Optional[List[Any]] = None,
+        orderby: Optional[List[Any]] = None,
+    ) -> pd.DataFrame:
+        if not entities:
+            entities = [
+                PortfolioValue.date,
+                PortfolioValue.market_val,
+                PortfolioValue.cash,
+                PortfolioValue.inflows,
+                PortfolioValue.hpr,
+            ]
+        if not orderby:
+            orderby = [PortfolioValue.date]
+        query = (
+            cls
+            ._base_query(filters)
+            .with_entities(*entities)
+            .order_by(*orderby)
+        )
+        return query_to_df(query)
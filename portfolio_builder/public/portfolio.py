@@ -0,0 +1,472 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, List, Optional
+
+from portfolio_builder.lazy import lazy_import
+from portfolio_builder.public.fifo import match_lots, match_lots_grouped
+from portfolio_builder.public.valuation import valuation_matrix, valuation_to_df
+
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+
+
+# Return series of calc_portf_returns, all in %
+RETURN_SERIES = (
+    'pct_change',
+    'cum_return',
+    'annualized_return',
+    'wtd_return',
+    'mtd_return',
+    'ytd_return',
+)
+PERIOD_FREQS = {'wtd_return': 'W', 'mtd_return': 'M', 'ytd_return': 'Y'}
+DAYS_PER_YEAR = 365.25
+
+
+def calc_fifo(df: pd.DataFrame) -> pd.DataFrame:
+    net_quantity, realized_pnl = match_lots(
+        is_buy=(df['side'] == 'buy').to_numpy(),
+        quantities=df['quantity'].to_numpy(),
+        prices=df['price'].to_numpy(dtype='float64'),
+    )
+    df2 = (
+        df
+        .loc[:, ['ticker', 'date']]
+        .assign(net_quantity=net_quantity, realized_pnl=realized_pnl)
+    )
+    return df2
+
+
+def calc_portf_positions(
+    df: pd.DataFrame,
+    max_workers: int = 1,
+    min_parallel_trades: int = 0,
+    group_col: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Applies FIFO accounting to the trades of every ticker. The trades
+    are partitioned by ticker with a single stable sort, tickers keep
+    their order of appearance and trades keep their order within each
+    ticker. Large portfolios are matched in a process pool.
+
+    With 'group_col', the trades of several portfolios are matched in
+    the same pass, partitioned by (group, ticker) pair instead.
+    """
+    keys = ['ticker'] if group_col is None else [group_col, 'ticker']
+    if group_col is None:
+        codes, _ = pd.factorize(df['ticker'])
+    else:
+        codes = df.groupby(keys, sort=False).ngroup().to_numpy()
+    order = np.argsort(codes, kind='stable')
+    group_starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+    df_sorted = df.iloc[order]
+    net_quantity, realized_pnl = match_lots_grouped(
+        is_buy=(df_sorted['side'] == 'buy').to_numpy(),
+        quantities=df_sorted['quantity'].to_numpy(),
+        prices=df_sorted['price'].to_numpy(dtype='float64'),
+        group_starts=group_starts,
+        max_workers=max_workers,
+        min_parallel_trades=min_parallel_trades,
+    )
+    df_positions = (
+        df_sorted
+        .loc[:, [*keys, 'date']]
+        .assign(net_quantity=net_quantity, realized_pnl=realized_pnl)
+    )
+    return df_positions
+
+
+def calc_trade_flows(df: pd.DataFrame, group_col: str) -> pd.DataFrame:
+    """
+    Daily net cash flows of the trades of every group, in the shape of
+    WatchlistItemMgr.get_grouped_items: buys are positive, sells negative.
+    """
+    df_flows = (
+        df
+        .assign(flows=lambda x: (
+            x['quantity'] * x['price'] * np.where(x['side'] == 'buy', 1, -1)
+        ))
+        .groupby([group_col, 'date'], as_index=False)['flows']
+        .sum()
+    )
+    return df_flows
+
+
+def calc_portf_valuations(
+    df_portf_pos: pd.DataFrame,
+    df_prices: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Combines the position breakdown with the daily prices to calculate
+    daily market value. The Daily market value is the positions quantity
+    multiplied by the market price.
+    """
+    return valuation_to_df(valuation_matrix(df_portf_pos, df_prices))
+
+
+def calc_portf_flows_adjusted(df_flows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Using the Holding Period Return (HPR) methodology. Purchases of
+    securities are accounted as fund inflows and the sale of securities are
+    accounted as increases in cash.
+
+    By creating the cumulative sum of these values we can maintain an
+    accurate calculation of the HPR which can be distorted as purchases and
+    sells are added to the trades.
+    """
+    df_flows_adj = (
+        df_flows
+        .assign(
+            inflows=lambda x: x.loc[x['flows'] > 0, 'flows'].cumsum(),
+            cash=lambda x: x.loc[x['flows'] <= 0, 'flows'].abs().cumsum(),
+        )
+        .set_index("date")
+        .assign(cash=lambda x: x['cash'].ffill())
+        .fillna(0)
+        .drop(columns=['flows'])
+    )
+    return df_flows_adj
+
+
+def calc_daily_values(
+    df_portf_val: pd.DataFrame,
+    df_portf_flows: pd.DataFrame,
+    prev_total_val: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    Daily portfolio value, cash, inflows and unrounded HPR % change for
+    every valuation date. Cash is carried as of each date from the
+    adjusted flows, inflows only count on the dates they happen.
+
+    'prev_total_val' is the total value of the day before the first
+    valuation date, when the series continues a stored one.
+    """
+    dates = df_portf_val.index
+    df_daily_values = (
+        df_portf_val
+        .sum(axis=1)
+        .to_frame('market_val')
+        .assign(
+            cash=(
+                df_portf_flows['cash']
+                .reindex(dates.union(df_portf_flows.index))
+                .ffill()
+                .reindex(dates)
+                .fillna(0)
+            ),
+            inflows=df_portf_flows['inflows'].reindex(dates).fillna(0),
+        )
+        .assign(
+            total_portf_val=lambda x: x["market_val"] + x["cash"]
+        )
+        .assign(
+            total_portf_val_prev=lambda x: (
+                x['total_portf_val'].shift(1, fill_value=prev_total_val)
+            )
+        )
+        .assign(
+            hpr=lambda x: (
+                (
+                    x["total_portf_val"] /
+                    (x["total_portf_val_prev"] + x["inflows"])
+                ) - 1
+            ) * 100
+        )
+        .fillna({'hpr': 0.0})
+        .loc[:, ['market_val', 'cash', 'inflows', 'hpr']]
+    )
+    return df_daily_values
+
+
+def _period_to_date(
+    growth: np.ndarray,
+    dates: pd.DatetimeIndex,
+    freq: str
+) -> np.ndarray:
+    """
+    Return since the end of the previous calendar period, from the
+    cumulative growth factor of every date.
+    """
+    codes = dates.to_period(freq).asi8
+    is_period_start = np.empty(codes.shape[0], dtype=np.bool_)
+    is_period_start[:1] = True
+    np.not_equal(codes[1:], codes[:-1], out=is_period_start[1:])
+    base_growth = np.where(
+        is_period_start,
+        np.concatenate(([1.0], growth))[:-1],
+        0.0,
+    )
+    # Carry the base of each period forward to its other dates
+    period_start = np.maximum.accumulate(
+        np.where(is_period_start, np.arange(codes.shape[0]), 0)
+    )
+    return (growth / base_growth[period_start] - 1) * 100
+
+
+def calc_portf_returns(df_daily_values: pd.DataFrame) -> pd.DataFrame:
+    """
+    Chain-links the unrounded daily HPR % changes of a date indexed
+    frame into the series of RETURN_SERIES, from one cumulative
+    product of the daily growth factors:
+    - cum_return: time-weighted return since the first date.
+    - annualized_return: cum_return annualized, once the series
+        covers at least a year, cum_return before that.
+    - wtd/mtd/ytd_return: return since the end of the previous week,
+        month and year.
+    """
+    dates = pd.DatetimeIndex(df_daily_values.index)
+    pct_change = df_daily_values['hpr'].to_numpy(dtype='float64')
+    growth = np.cumprod(1 + pct_change / 100)
+    cum_return = (growth - 1) * 100
+    years = (dates - dates[:1].repeat(dates.shape[0])).days / DAYS_PER_YEAR
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annualized_return = np.where(
+            years >= 1,
+            (growth ** (1 / np.maximum(years, 1)) - 1) * 100,
+            cum_return,
+        )
+    df_returns = pd.DataFrame(
+        {
+            'pct_change': pct_change,
+            'cum_return': cum_return,
+            'annualized_return': annualized_return,
+            **{
+                series: _period_to_date(growth, dates, freq)
+                for series, freq in PERIOD_FREQS.items()
+            },
+        },
+        index=dates.rename('date'),
+    )
+    return df_returns
+
+
+def calc_portf_hpr(
+    df_portf_val: pd.DataFrame,
+    df_portf_flows: pd.DataFrame
+) -> List[tuple[Any, ...]]:
+    """
+    Where PortVal = Portfolio Value. The Formula for the Daily
+    Holding Period Return (HPR) is calculated as follows:
+    (Ending PortVal) / (Previous PortVal After Cash Flow) – 1.
+
+    1. Add the cash from the sale of securities to the portfolio value.
+    2. shift the total portfolio value column to allow us to easily
+        caclulate the Percentage change before and after each cash flow.
+    Returns a named tuple of daily HPR % changes, along with the
+    chain-linked return series of calc_portf_returns.
+    """
+    df_portf_hpr = (
+        calc_portf_returns(calc_daily_values(df_portf_val, df_portf_flows))
+        .round(3)
+        .reset_index()
+    )
+    return list(df_portf_hpr.itertuples(index=False))
+
+
+def calc_watchlists_overview(
+    df_trades: pd.DataFrame,
+    df_prices: pd.DataFrame,
+    max_workers: int = 1,
+    min_parallel_trades: int = 0,
+) -> pd.DataFrame:
+    """
+    Summarizes every watchlist of a user in one batched pass, from the
+    trades of all its watchlists (with a 'watchlist' column) and the
+    prices of the union of their tickers.
+
+    The positions of all the watchlists are matched together and valued
+    on one shared price matrix. Market value, cash, inflows and HPR are
+    then computed for all the watchlists at once, as (dates x watchlists)
+    matrices, with the same formulas as calc_daily_values. Every
+    watchlist is valued from its first valuation date, so the extra
+    dates of the other watchlists only add flat days to its series.
+
+    Returns, per watchlist, the last market value, cash, realized P&L,
+    daily HPR % change and cumulative return.
+    """
+    columns = [
+        'watchlist', 'date', 'market_val', 'cash',
+        'realized_pnl', 'pct_change', 'cum_return',
+    ]
+    if df_trades.empty:
+        return pd.DataFrame(columns=columns)
+    df_portf_pos = calc_portf_positions(
+        df_trades,
+        max_workers=max_workers,
+        min_parallel_trades=min_parallel_trades,
+        group_col='watchlist',
+    )
+    valuation = valuation_matrix(df_portf_pos, df_prices, group_col='watchlist')
+    dates = pd.DatetimeIndex(valuation.dates, name='date')
+    is_group_start = np.empty(valuation.groups.shape[0], dtype=np.bool_)
+    is_group_start[:1] = True
+    np.not_equal(
+        valuation.groups[1:], valuation.groups[:-1], out=is_group_start[1:]
+    )
+    group_starts = np.flatnonzero(is_group_start)
+    watchlists = valuation.groups[group_starts]
+
+    is_valued = np.logical_or.reduceat(
+        ~np.isnan(valuation.market_val), group_starts, axis=1
+    )
+    market_val = np.add.reduceat(
+        np.nan_to_num(valuation.market_val), group_starts, axis=1
+    )
+    df_flows = (
+        calc_trade_flows(df_trades, 'watchlist')
+        .assign(
+            inflows=lambda x: (
+                x['flows'].where(x['flows'] > 0, 0.0)
+                .groupby(x['watchlist']).cumsum()
+                .where(x['flows'] > 0, 0.0)
+            ),
+            cash=lambda x: (
+                x['flows'].abs().where(x['flows'] <= 0, 0.0)
+                .groupby(x['watchlist']).cumsum()
+            ),
+        )
+    )
+    cash = (
+        df_flows
+        .pivot(index='date', columns='watchlist', values='cash')
+        .reindex(index=dates, columns=watchlists)
+        .ffill()
+        .fillna(0)
+        .to_numpy()
+    )
+    inflows = (
+        df_flows
+        .pivot(index='date', columns='watchlist', values='inflows')
+        .reindex(index=dates, columns=watchlists)
+        .fillna(0)
+        .to_numpy()
+    )
+    total_portf_val = np.where(is_valued, market_val + cash, np.nan)
+    total_portf_val_prev = np.vstack((
+        np.full((1, watchlists.shape[0]), np.nan), total_portf_val[:-1]
+    ))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hpr = (total_portf_val / (total_portf_val_prev + inflows) - 1) * 100
+    hpr = np.where(np.isnan(hpr), 0.0, hpr)
+    growth = np.cumprod(1 + hpr / 100, axis=0)
+
+    df_realized_pnl = (
+        df_portf_pos
+        .groupby(['watchlist', 'ticker'], sort=False)['realized_pnl']
+        .last()
+        .groupby(level='watchlist')
+        .sum()
+    )
+    df_overview = (
+        pd
+        .DataFrame({
+            'watchlist': watchlists,
+            'date': dates[-1],
+            'market_val': market_val[-1],
+            'cash': cash[-1],
+            'realized_pnl': df_realized_pnl.reindex(watchlists).to_numpy(),
+            'pct_change': hpr[-1],
+            'cum_return': (growth[-1] - 1) * 100,
+        })
+        .loc[is_valued[-1]]
+        .round({
+            'market_val': 3, 'cash': 3, 'realized_pnl': 3,
+            'pct_change': 3, 'cum_return': 3,
+        })
+        .reset_index(drop=True)
+    )
+    return df_overview
+
+
+def calc_last_valuations(
+    df_positions: pd.DataFrame,
+    df_last_prices: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Market value of the current positions at their last stored price,
+    shaped like the last row of calc_portf_valuations.
+    """
+    df_last_val = (
+        pd
+        .merge(df_positions, df_last_prices, on='ticker', how='inner')
+        .astype({'price': 'float64', 'date': 'datetime64[ns]'})
+        .assign(market_val=lambda x: x['net_quantity'] * x['price'])
+        .round({'market_val': 3})
+    )
+    if df_last_val.empty:
+        return pd.DataFrame()
+    return pd.DataFrame(
+        [df_last_val['market_val'].to_numpy()],
+        index=pd.DatetimeIndex([df_last_val['date'].max()], name='date'),
+        columns=pd.Index(df_last_val['ticker'].to_numpy(), name='ticker'),
+    )
+
+
+def calc_last_portf_val(
+    df_portf_val: pd.DataFrame,
+    no_assets: int = 10
+) -> List[tuple[Any, ...]]:
+    """
+    Returns a named tuple of the largest positions by absolute exposure
+    in descending order. For the portfolios that contain more than 6
+    positions the next n positons are aggregated to and classified
+    as 'Other'
+    """
+    if df_portf_val.empty:
+        return list(df_portf_val.itertuples(index=False))
+    df_initial = (
+        df_portf_val
+        .sort_index()
+        .tail(1)
+        .T
+        .set_axis(['market_val'], axis=1)
+        .reset_index()
+        .assign(
+            market_val_pct=lambda x:
+                (x["market_val"] / x["market_val"].sum()) * 100
+        )
+        .round({'market_val_pct': 2})
+        .sort_values(by=['market_val_pct'], ascending=False)
+    )
+    max_no_assets = df_initial.shape[0]
+    if no_assets > max_no_assets:
+        return list(df_initial.itertuples(index=False))
+    else:
+        df_top = df_initial.head(no_assets)
+        df_bottom = (
+            df_initial
+            .tail(max_no_assets - no_assets)
+            .pivot_table(
+                index='ticker',
+                margins=True,
+                margins_name='Other',  # defaults to 'All'
+                aggfunc='sum'
+            )
+            .reset_index()
+            .tail(1)
+        )
+        df_final = pd.concat([df_top, df_bottom])
+        return list(df_final.itertuples(index=False))
+
+
+def calc_last_portf_position(
+    df_portf_pos: pd.DataFrame,
+    no_assets: int = 10
+) -> List[tuple[Any, ...]]:
+    if df_portf_pos.empty:
+        return list(df_portf_pos.itertuples(index=False))
+    last_portf_pos = list(
+        df_portf_pos
+        .loc[lambda x: x.groupby('ticker')['date'].idxmax()]
+        .drop(['date'], axis=1)
+        .itertuples(index=False)
+    )
+    max_no_assets = len(last_portf_pos)
+    if max_no_assets > no_assets:
+        return last_portf_pos[:no_assets]
+    return last_portf_pos
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.sql.elements import BinaryExpression
+
+from portfolio_builder import db
+from portfolio_builder.lazy import lazy_import
+from portfolio_builder.public.fifo import match_lots, open_lots
+from portfolio_builder.public.models import (
+    Position, PositionLot, Watchlist, WatchlistItem
+)
+
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import('pandas')
+
+
+LOTS_FETCH_SIZE = 16
+
+
+def _is_backdated(item: WatchlistItem) -> bool:
+    # The lots are only in trade order if the new trade is the latest one
+    later_trade = (
+        db
+        .session
+        .query(WatchlistItem.id)
+        .filter(
+            WatchlistItem.watchlist_id == item.watchlist_id,
+            WatchlistItem.ticker == item.ticker,
+            WatchlistItem.trade_date > item.trade_date,
+        )
+        .first()
+    )
+    return later_trade is not None
+
+
+def apply_trade(item: WatchlistItem) -> Optional[Position]:
+    """
+    Applies a new trade to the stored FIFO state of its
+    (watchlist, ticker) position, without committing the session.
+
+    A buy appends one lot to the queue, a sell consumes lots from
+    the head of the queue until its quantity is covered, so the cost
+    is proportional to the number of lots consumed. If the position
+    has no stored state yet, or the trade is dated before one already
+    stored, it's rebuilt from the trade history.
+    """
+    position = (
+        db
+        .session
+        .query(Position)
+        .filter(
+            Position.watchlist_id == item.watchlist_id,
+            Position.ticker == item.ticker,
+        )
+        .first()
+    )
+    if position is None or _is_backdated(item):
+        return rebuild_position(item.watchlist_id, item.ticker)
+    quantity = int(item.quantity)
+    price = float(item.price)
+    if item.side == 'buy':
+        db.session.add(
+            PositionLot(quantity=quantity, price=price, position_id=position.id)
+        )
+        position.net_quantity += quantity
+        return position
+    lots = (
+        db
+        .session
+        .query(PositionLot)
+        .filter(PositionLot.position_id == position.id)
+        .order_by(PositionLot.id)
+        .yield_per(LOTS_FETCH_SIZE)
+    )
+    remaining_qty = quantity
+    realized_pnl = position.realized_pnl
+    consumed_lots = []
+    for lot in lots:
+        consumed_qty = min(lot.quantity, remaining_qty)
+        realized_pnl += consumed_qty * (price - lot.price)
+        remaining_qty -= consumed_qty
+        if consumed_qty == lot.quantity:
+            consumed_lots.append(lot)
+        else:
+            lot.quantity -= consumed_qty
+        if remaining_qty == 0:
+            break
+    for lot in consumed_lots:
+        db.session.delete(lot)
+    position.net_quantity -= quantity - remaining_qty
+    position.realized_pnl = realized_pnl
+    return position
+
+
+def _delete_positions(position_ids: List[int]) -> None:
+    # 'fetch' removes the deleted rows already loaded from the session,
+    # so a position rebuilt with the same key doesn't clash with them
+    if not position_ids:
+        return
+    _ = (
+        db
+        .session
+        .query(PositionLot)
+        .filter(PositionLot.position_id.in_(position_ids))
+        .delete(synchronize_session='fetch')
+    )
+    _ = (
+        db
+        .session
+        .query(Position)
+        .filter(Position.id.in_(position_ids))
+        .delete(synchronize_session='fetch')
+    )
+
+
+def delete_position(watchlist_id: int, ticker: str) -> None:
+    position_ids = [
+        row.id
+        for row in (
+            db
+            .session
+            .query(Position.id)
+            .filter(
+                Position.watchlist_id == watchlist_id,
+                Position.ticker == ticker,
+            )
+        )
+    ]
+    _delete_positions(position_ids)
+
+
+def _write_positions(df_trades: pd.DataFrame) -> int:
+    """
+    Runs the FIFO engine over the trades of every (watchlist, ticker)
+    pair and inserts the resulting positions and open lots.
+    """
+    positions = []
+    lots_by_position = []
+    for (watchlist_id, ticker), df_group in df_trades.groupby(
+        ['watchlist_id', 'ticker'], sort=False
+    ):
+        is_buy = (df_group['side'] == 'buy').to_numpy()
+        quantities = df_group['quantity'].to_numpy()
+        prices = df_group['price'].to_numpy(dtype='float64')
+        net_quantity, realized_pnl = match_lots(is_buy, quantities, prices)
+        lot_qty, lot_price = open_lots(is_buy, quantities, prices)
+        positions.append(Position(
+            watchlist_id=int(watchlist_id),
+            ticker=ticker,
+            net_quantity=int(net_quantity[-1]),
+            realized_pnl=float(realized_pnl[-1]),
+        ))
+        lots_by_position.append((lot_qty, lot_price))
+    db.session.add_all(positions)
+    db.session.flush()
+    lot_rows = [
+        {'position_id': position.id, 'quantity': int(qty), 'price': float(price)}
+        for position, (lot_qty, lot_price) in zip(positions, lots_by_position)
+        for qty, price in zip(lot_qty, lot_price)
+    ]
+    if lot_rows:
+        db.session.execute(insert(PositionLot), lot_rows)
+    return len(positions)
+
+
+def _get_trades(filters: List[BinaryExpression]) -> pd.DataFrame:
+    # Read through the session connection, so trades that aren't
+    # committed yet are part of the history.
+    query = (
+        db
+        .session
+        .query(WatchlistItem)
+        .join(Watchlist, onclause=(WatchlistItem.watchlist_id == Watchlist.id))
+        .filter(*filters)
+        .with_entities(
+            WatchlistItem.watchlist_id,
+            WatchlistItem.ticker,
+            WatchlistItem.quantity,
+            WatchlistItem.price,
+            WatchlistItem.side,
+        )
+        .order_by(
+            WatchlistItem.watchlist_id,
+            WatchlistItem.ticker,
+            WatchlistItem.trade_date,
+            WatchlistItem.id,
+        )
+    )
+    return pd.read_sql(sql=query.statement, con=db.session.connection())
+
+
+def rebuild_position(watchlist_id: int, ticker: str) -> Optional[Position]:
+    """
+    Rebuilds the FIFO state of a single (watchlist, ticker) position
+    from its trade history, without committing the session.
+    """
+    delete_position(watchlist_id, ticker)
+    db.session.flush()
+    df_trades = _get_trades(filters=[
+        WatchlistItem.watchlist_id == watchlist_id,
+        WatchlistItem.ticker == ticker,
+    ])
+    if df_trades.empty:
+        return None
+    _write_positions(df_trades)
+    return (
+        db
+        .session
+        .query(Position)
+        .filter(
+            Position.watchlist_id == watchlist_id,
+            Position.ticker == ticker,
+        )
+        .first()
+    )
+
+
+def rebuild_positions(watchlist_ids: Optional[List[int]] = None) -> int:
+    """
+    Rebuilds the FIFO state of every position from the
+    'watchlist_items' table, for backfill and repair.
+    Returns the number of positions written.
+    """
+    if watchlist_ids:
+        filters = [Watchlist.id.in_(watchlist_ids)]
+    else:
+        filters = [db.literal(True)]
+    position_ids = [
+        row.id
+        for row in (
+            db
+            .session
+            .query(Position.id)
+            .join(Watchlist, onclause=(Position.watchlist_id == Watchlist.id))
+            .filter(*filters)
+        )
+    ]
+    _delete_positions(position_ids)
+    df_trades = _get_trades(filters=filters)
+    no_positions = 0
+    if not df_trades.empty:
+        no_positions = _write_positions(df_trades)
+    db.session.commit()
+    return no_positions
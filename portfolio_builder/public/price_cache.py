@@ -0,0 +1,203 @@
+"""
+In-process LRU cache of the daily close prices, one entry per ticker.
+
+An entry holds the sorted dates and prices of a ticker along with the
+date ranges it's complete for, so a request only loads the ranges that
+aren't covered yet. Entries are evicted least recently used first once
+their total size is over the limit.
+
+Every request is checked against the version and last stored date of
+each ticker, read from the database by the caller, so prices loaded by
+another process are picked up: ranges are only complete up to the last
+stored date, so a new one loads the days after it, and an entry of an
+older version (rewritten or older prices) is dropped.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING, Callable, Dict, Iterable, List, Mapping, NamedTuple,
+    Optional, Tuple
+)
+
+from portfolio_builder.lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+
+
+EPOCH = dt.date(1970, 1, 1)
+
+Loader = Callable[[List[str], dt.date, dt.date], 'pd.DataFrame']
+# Version and last stored date of a ticker's prices
+Version = Tuple[int, Optional[dt.date]]
+
+
+class PriceCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    nbytes: int
+
+
+class CachedPrices:
+    """Prices of a ticker and the disjoint, sorted day ranges they cover."""
+
+    def __init__(self, version: int) -> None:
+        self.version = version
+        self.days = np.zeros(0, dtype=np.int64)
+        self.prices = np.zeros(0)
+        self.ranges: List[Tuple[int, int]] = []
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + self.prices.nbytes
+
+    def missing(self, start_day: int, end_day: int) -> List[Tuple[int, int]]:
+        """Day ranges between 'start_day' and 'end_day' that aren't covered."""
+        gaps = []
+        for range_start, range_end in self.ranges:
+            if range_end < start_day:
+                continue
+            if range_start > end_day:
+                break
+            if range_start > start_day:
+                gaps.append((start_day, range_start - 1))
+            start_day = max(start_day, range_end + 1)
+        if start_day <= end_day:
+            gaps.append((start_day, end_day))
+        return gaps
+
+    def add(
+        self,
+        days: np.ndarray,
+        prices: np.ndarray,
+        start_day: int,
+        end_day: int
+    ) -> None:
+        """Merges the prices of a loaded range, they win over cached ones."""
+        all_days = np.concatenate((self.days, days))
+        order = np.argsort(all_days, kind='stable')[::-1]
+        self.days, first = np.unique(all_days[order], return_index=True)
+        self.prices = np.concatenate((self.prices, prices))[order][first]
+        ranges = sorted(self.ranges + [(start_day, end_day)])
+        self.ranges = [ranges[0]]
+        for range_start, range_end in ranges[1:]:
+            last_start, last_end = self.ranges[-1]
+            if range_start <= last_end + 1:
+                self.ranges[-1] = (last_start, max(last_end, range_end))
+            else:
+                self.ranges.append((range_start, range_end))
+
+    def slice(self, start_day: int, end_day: int) -> Tuple[np.ndarray, np.ndarray]:
+        lower = np.searchsorted(self.days, start_day, side='left')
+        upper = np.searchsorted(self.days, end_day, side='right')
+        return self.days[lower:upper], self.prices[lower:upper]
+
+
+_cache: 'OrderedDict[str, CachedPrices]' = OrderedDict()
+_counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def get_prices(
+    tickers: Iterable[str],
+    start_date: dt.date,
+    end_date: dt.date,
+    load: Loader,
+    versions: Mapping[str, Version],
+    max_bytes: int,
+) -> pd.DataFrame:
+    """
+    Prices of 'tickers' between two dates included, with ticker, date
+    and price columns ordered by ticker and date.
+
+    'versions' holds the current version and last stored date of each
+    ticker, tickers without one have no prices. 'load' is called with
+    the tickers and dates of the ranges missing from the cache, once per
+    distinct range, and must return the same columns. A ticker is a hit
+    when its whole range is cached.
+    """
+    start_day, end_day = (start_date - EPOCH).days, (end_date - EPOCH).days
+    tickers = sorted(set(tickers))
+    gap_tickers: Dict[Tuple[int, int], List[str]] = {}
+    for ticker in tickers:
+        version, last_date = versions.get(ticker, (0, None))
+        entry = _cache.get(ticker)
+        if entry is None or entry.version != version:
+            entry = _cache[ticker] = CachedPrices(version)
+        # There's nothing to load after the last stored date
+        last_day = (last_date - EPOCH).days if last_date else start_day - 1
+        gaps = entry.missing(start_day, min(end_day, last_day))
+        _counters['misses' if gaps else 'hits'] += 1
+        for gap in gaps:
+            gap_tickers.setdefault(gap, []).append(ticker)
+
+    for (gap_start, gap_end), missed in gap_tickers.items():
+        df_loaded = load(
+            missed,
+            EPOCH + dt.timedelta(days=gap_start),
+            EPOCH + dt.timedelta(days=gap_end),
+        )
+        loaded = dict(list(df_loaded.groupby('ticker', sort=False)))
+        for ticker in missed:
+            df_ticker = loaded.get(ticker, df_loaded.iloc[:0])
+            _cache[ticker].add(
+                df_ticker['date'].to_numpy(dtype='datetime64[D]').astype(np.int64),
+                df_ticker['price'].to_numpy(dtype=np.float64),
+                gap_start,
+                gap_end,
+            )
+
+    days, prices, n_rows = [], [], []
+    for ticker in tickers:
+        ticker_days, ticker_prices = _cache[ticker].slice(start_day, end_day)
+        days.append(ticker_days)
+        prices.append(ticker_prices)
+        n_rows.append(ticker_days.shape[0])
+        _cache.move_to_end(ticker)
+    df_prices = pd.DataFrame({
+        'ticker': np.repeat(np.array(tickers, dtype=object), n_rows),
+        'date': (
+            np.concatenate(days) if days else np.zeros(0, dtype=np.int64)
+        ).astype('datetime64[D]').astype('datetime64[ns]'),
+        'price': np.concatenate(prices) if prices else np.zeros(0),
+    })
+    _evict(max_bytes)
+    return df_prices
+
+
+def _evict(max_bytes: int) -> None:
+    nbytes = sum(entry.nbytes for entry in _cache.values())
+    while _cache and nbytes > max_bytes:
+        _, entry = _cache.popitem(last=False)
+        nbytes -= entry.nbytes
+        _counters['evictions'] += 1
+
+
+def invalidate(tickers: Iterable[str]) -> None:
+    """Drops the cached prices of 'tickers' in this process."""
+    for ticker in tickers:
+        _cache.pop(ticker, None)
+
+
+def clear() -> None:
+    _cache.clear()
+    for name in _counters:
+        _counters[name] = 0
+
+
+def get_stats() -> PriceCacheStats:
+    return PriceCacheStats(
+        hits=_counters['hits'],
+        misses=_counters['misses'],
+        evictions=_counters['evictions'],
+        entries=len(_cache),
+        nbytes=sum(entry.nbytes for entry in _cache.values()),
+    )
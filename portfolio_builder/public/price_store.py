@@ -0,0 +1,234 @@
+"""
+Columnar on-disk store of the daily close prices, one file per ticker.
+
+Each file is a single (2, n + 2) int64 .npy array, memory-mapped on
+read. Row 0 holds the dates as days since the epoch and row 1 the bits
+of the float64 close prices, so both columns are contiguous and a date
+range is two binary searches and a zero-copy slice of each row. The
+first two columns are a header: the first and last dates the file is
+complete for, which can reach past the last price (weekends, holidays)
+but not past the last stored date, and the history version of the
+ticker's prices it was written from (see PriceVersion).
+
+Reads are checked against the history version and last stored date of
+each ticker, read from the database by the caller, like the price
+cache: a file of another version is a miss, and so is a range past the
+file's last date once newer prices were stored, even by a process that
+doesn't share the store.
+
+A file is replaced atomically with os.replace, readers that already
+mapped the old one keep reading it. Writers of the same ticker take an
+exclusive flock on a sidecar '.lock' file around the read-merge-replace,
+so concurrent loads of a ticker never drop each other's prices.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import fcntl
+import os
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING, Iterable, Iterator, List, Mapping, Optional, Tuple
+)
+from urllib.parse import quote
+
+from portfolio_builder.lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+
+
+EPOCH = dt.date(1970, 1, 1)
+HEADER_COLUMNS = 2
+
+# History version and last stored date of a ticker's prices
+Version = Tuple[int, Optional[dt.date]]
+
+
+def _to_day(date: dt.date) -> int:
+    return (date - EPOCH).days
+
+
+def _path(root: str, ticker: str) -> str:
+    return os.path.join(root, quote(ticker, safe='') + '.npy')
+
+
+@contextmanager
+def _locked(root: str, ticker: str) -> Iterator[None]:
+    os.makedirs(root, exist_ok=True)
+    with open(_path(root, ticker) + '.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load(root: str, ticker: str) -> Optional[np.ndarray]:
+    try:
+        return np.load(_path(root, ticker), mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def get_coverage(root: str, ticker: str) -> Optional[Tuple[dt.date, dt.date]]:
+    """First and last dates the stored prices of 'ticker' are complete for."""
+    data = _load(root, ticker)
+    if data is None:
+        return None
+    return (
+        EPOCH + dt.timedelta(days=int(data[0, 0])),
+        EPOCH + dt.timedelta(days=int(data[1, 0])),
+    )
+
+
+def read_prices(
+    root: str,
+    tickers: Iterable[str],
+    start_date: dt.date,
+    end_date: dt.date,
+    versions: Mapping[str, Version],
+) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Prices of 'tickers' between two dates included, as a DataFrame with
+    ticker, date and price columns ordered by ticker and date, and the
+    tickers whose stored prices don't cover the whole range.
+
+    'versions' holds the current history version and last stored date
+    of each ticker, tickers without one have no prices.
+    """
+    start_day = _to_day(start_date)
+    tickers_found, days, closes, missed = [], [], [], []
+    for ticker in sorted(set(tickers)):
+        version, last_date = versions.get(ticker, (0, None))
+        if last_date is None:
+            continue
+        # There's nothing to read after the last stored date
+        end_day = min(_to_day(end_date), _to_day(last_date))
+        if end_day < start_day:
+            continue
+        data = _load(root, ticker)
+        if (
+            data is None
+            or data[0, 1] != version
+            or data[0, 0] > start_day
+            or data[1, 0] < end_day
+        ):
+            missed.append(ticker)
+            continue
+        ticker_days = data[0, HEADER_COLUMNS:]
+        lower = np.searchsorted(ticker_days, start_day, side='left')
+        upper = np.searchsorted(ticker_days, end_day, side='right')
+        tickers_found.append((ticker, upper - lower))
+        days.append(ticker_days[lower:upper])
+        closes.append(
+            data[1, HEADER_COLUMNS + lower:HEADER_COLUMNS + upper]
+            .view(np.float64)
+        )
+    df_prices = pd.DataFrame({
+        'ticker': np.repeat(
+            np.array([ticker for ticker, _ in tickers_found], dtype=object),
+            [n_rows for _, n_rows in tickers_found],
+        ),
+        'date': (
+            np.concatenate(days) if days else np.zeros(0, dtype=np.int64)
+        ).astype('datetime64[D]').astype('datetime64[ns]'),
+        'price': np.concatenate(closes) if closes else np.zeros(0),
+    })
+    return df_prices, missed
+
+
+def write_prices(
+    root: str,
+    ticker: str,
+    dates: Iterable[dt.date],
+    prices: Iterable[float],
+    start_date: dt.date,
+    end_date: dt.date,
+    version: int,
+    overwrite: bool = True,
+) -> None:
+    """
+    Merges the prices of 'ticker' between two dates included, read or
+    written at history 'version' of its prices, into its file. They
+    replace the stored prices of the same dates, unless 'overwrite' is
+    False, which is used when filling the store from the database so a
+    concurrent load isn't undone by older data. 'end_date' must not be
+    past the last stored date of the ticker.
+
+    The file stays complete for a single range of dates of a single
+    version: a range that doesn't touch the stored one drops the file,
+    and the prices are read from the database again on the next miss.
+    A file of another version is replaced.
+    """
+    new_days = (
+        pd.to_datetime(pd.Series(list(dates), dtype=object))
+        .to_numpy(dtype='datetime64[D]')
+        .astype(np.int64)
+    )
+    new_prices = np.asarray(prices, dtype=np.float64).reshape(-1)
+    with _locked(root, ticker):
+        _merge(
+            root, ticker, new_days, new_prices,
+            _to_day(start_date), _to_day(end_date), version, overwrite,
+        )
+
+
+def _merge(
+    root: str,
+    ticker: str,
+    new_days: np.ndarray,
+    new_prices: np.ndarray,
+    start_day: int,
+    end_day: int,
+    version: int,
+    overwrite: bool,
+) -> None:
+    stored = _load(root, ticker)
+    if stored is not None and stored[0, 1] == version:
+        if start_day > stored[1, 0] + 1 or end_day < stored[0, 0] - 1:
+            _remove(root, ticker)
+            return
+        start_day = min(start_day, int(stored[0, 0]))
+        end_day = max(end_day, int(stored[1, 0]))
+        old_days = np.array(stored[0, HEADER_COLUMNS:])
+        old_prices = np.array(stored[1, HEADER_COLUMNS:]).view(np.float64)
+        if overwrite:
+            new_days = np.concatenate((old_days, new_days))
+            new_prices = np.concatenate((old_prices, new_prices))
+        else:
+            new_days = np.concatenate((new_days, old_days))
+            new_prices = np.concatenate((new_prices, old_prices))
+    # Keep the last price of every date, in date order
+    order = np.argsort(new_days, kind='stable')[::-1]
+    days, first = np.unique(new_days[order], return_index=True)
+    data = np.empty((2, days.shape[0] + HEADER_COLUMNS), dtype=np.int64)
+    data[:, 0] = (start_day, end_day)
+    data[:, 1] = (version, 0)
+    data[0, HEADER_COLUMNS:] = days
+    data[1, HEADER_COLUMNS:] = new_prices[order][first].view(np.int64)
+
+    path = _path(root, ticker)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp_path, path)
+
+
+def _remove(root: str, ticker: str) -> None:
+    try:
+        os.remove(_path(root, ticker))
+    except FileNotFoundError:
+        pass
+
+
+def delete_prices(root: str, ticker: str) -> None:
+    if not os.path.exists(_path(root, ticker)):
+        return
+    with _locked(root, ticker):
+        _remove(root, ticker)
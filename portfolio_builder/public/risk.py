@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import datetime as dt
+from collections import OrderedDict
+from statistics import NormalDist
+from typing import (
+    TYPE_CHECKING, Callable, Dict, Hashable, Mapping, NamedTuple, Optional,
+    Tuple
+)
+
+from portfolio_builder.lazy import lazy_import
+from portfolio_builder.public.models import PriceVersion, prices_rewritten
+
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+
+
+TRADING_DAYS = 252
+VOLATILITY_WINDOW = 21
+VAR_LEVEL = 0.95
+RISK_CACHE_SIZE = 128
+PORTFOLIO_NAME = 'Portfolio'
+
+_cache: 'OrderedDict[int, RunningRisk]' = OrderedDict()
+
+
+class RiskInputs(NamedTuple):
+    """
+    Prices of the tickers of a portfolio on each of its valuation dates,
+    as a (dates x tickers) matrix carried forward over the dates without
+    a price, and the daily return of the portfolio on each date (its HPR
+    as a fraction). The first date of a portfolio only sets the prices
+    its first returns are computed from.
+    """
+    dates: np.ndarray
+    tickers: np.ndarray
+    prices: np.ndarray
+    portf_returns: np.ndarray
+
+
+class RiskMetrics(NamedTuple):
+    """
+    Risk metrics of every ticker of a portfolio, and of the portfolio in
+    the last column. The rolling volatility has a row per date of
+    'dates', the other metrics are as of the last one. Volatility,
+    drawdown and VaR are in %, volatility and the ratios are annualized.
+    """
+    dates: np.ndarray
+    names: np.ndarray
+    rolling_volatility: np.ndarray
+    max_drawdown: np.ndarray
+    sharpe: np.ndarray
+    sortino: np.ndarray
+    historical_var: np.ndarray
+    parametric_var: np.ndarray
+
+
+def calc_daily_returns(
+    prices: np.ndarray,
+    prev_prices: np.ndarray,
+    portf_returns: np.ndarray
+) -> np.ndarray:
+    """
+    Daily simple returns of every ticker price and of the portfolio, as
+    a (dates x (tickers + 1)) matrix that is NaN where undefined. The
+    returns of the first date are from 'prev_prices'.
+    """
+    returns = np.empty((prices.shape[0], prices.shape[1] + 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(prices[:1], prev_prices, out=returns[:1, :-1])
+        np.divide(prices[1:], prices[:-1], out=returns[1:, :-1])
+    returns[:, :-1] -= 1
+    returns[:, -1] = portf_returns
+    np.copyto(returns, np.nan, where=np.isinf(returns))
+    return returns
+
+
+def _rolling_volatility(
+    values: np.ndarray,
+    is_missing: np.ndarray,
+    window: int
+) -> np.ndarray:
+    """
+    Annualized sample standard deviation over the trailing 'window'
+    returns, from running sums of the returns and their squares. NaN
+    until the window holds 'window' valid returns.
+
+    'values' are the returns with the missing ones set to zero. Most
+    columns only miss the returns before their first price, windows
+    that start before it are blanked for those, the others count their
+    missing returns per window.
+    """
+    n_dates = values.shape[0]
+    if n_dates < window:
+        return np.full(values.shape, np.nan)
+    first_valid = is_missing.argmin(axis=0)
+    sums = np.add.accumulate(values, axis=0)
+    sums_sq = np.square(values)
+    np.add.accumulate(sums_sq, axis=0, out=sums_sq)
+
+    volatility = np.empty(values.shape)
+    volatility[:window - 1] = np.nan
+    variance = volatility[window - 1:]
+    variance[0] = sums_sq[window - 1]
+    np.subtract(sums_sq[window:], sums_sq[:-window], out=variance[1:])
+    total = np.empty_like(variance)
+    total[0] = sums[window - 1]
+    np.subtract(sums[window:], sums[:-window], out=total[1:])
+    total *= total
+    total /= window
+    variance -= total
+    np.maximum(variance, 0.0, out=variance)
+    variance *= TRADING_DAYS / (window - 1)
+    np.sqrt(variance, out=variance)
+    variance *= 100
+
+    window_start = np.arange(n_dates - window + 1)[:, np.newaxis]
+    np.copyto(variance, np.nan, where=(window_start < first_valid))
+    has_gaps = np.flatnonzero(
+        is_missing.sum(axis=0) > np.minimum(first_valid, n_dates)
+    )
+    if has_gaps.size:
+        n_missing = np.add.accumulate(
+            is_missing[:, has_gaps], axis=0, dtype=np.int32
+        )
+        window_missing = n_missing[window - 1:]
+        window_missing[1:] -= n_missing[:-window]
+        gap_vol = volatility[window - 1:, has_gaps]
+        gap_vol[window_missing > 0] = np.nan
+        volatility[window - 1:, has_gaps] = gap_vol
+    return volatility
+
+
+def _fall_from_peak(
+    wealth: np.ndarray,
+    peak: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Running max of 'wealth' along the dates axis, starting from 'peak'.
+    Returns its last value and the lowest ratio of wealth to it.
+    """
+    running_peak = np.fmax.accumulate(wealth, axis=0)
+    np.fmax(running_peak, peak, out=running_peak)
+    last_peak = running_peak[-1].copy()
+    np.divide(wealth, running_peak, out=running_peak)
+    return last_peak, np.fmin.reduce(running_peak, axis=0, initial=1.0)
+
+
+def _historical_var(
+    sorted_returns: np.ndarray,
+    n_valid: np.ndarray,
+    level: float
+) -> np.ndarray:
+    """
+    Loss at the (1 - level) quantile of the returns of each row of
+    'sorted_returns', with NaNs sorted to the end of every row, with
+    linear interpolation like np.nanquantile.
+    """
+    if sorted_returns.shape[1] == 0:
+        return np.full(sorted_returns.shape[0], np.nan)
+    position = (1 - level) * np.maximum(n_valid - 1, 0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    rows = np.arange(sorted_returns.shape[0])
+    lower_val = sorted_returns[rows, lower]
+    upper_val = sorted_returns[rows, upper]
+    quantile = lower_val + (upper_val - lower_val) * (position - lower)
+    return np.where(n_valid > 0, -quantile * 100, np.nan)
+
+
+class RunningRisk:
+    """
+    Running state of the risk metrics of a portfolio, so new dates are
+    added without going over the older ones again:
+    - count, sum and sum of squares of the returns of every column, and
+      of their part below the risk free rate, for the ratios and the
+      parametric VaR.
+    - running peak of the prices and of the portfolio wealth, and their
+      lowest ratio to it, for the drawdown.
+    - the last 'window - 1' returns, to extend the rolling volatility.
+    - every column's returns kept sorted, for the historical VaR. A
+      stable sort merges the new ones in about linear time.
+    """
+
+    def __init__(
+        self,
+        tickers: np.ndarray,
+        risk_free_rate: float = 0.0,
+        window: int = VOLATILITY_WINDOW,
+        level: float = VAR_LEVEL,
+    ) -> None:
+        n_columns = len(tickers) + 1
+        self.names = np.append(tickers, PORTFOLIO_NAME)
+        self.daily_rf = risk_free_rate / TRADING_DAYS
+        self.window = window
+        self.level = level
+        self.data_version: Hashable = None
+        # Price versions of the tickers the state was computed from
+        self.versions: Dict[str, PriceVersion] = {}
+        self.dates = np.empty(0, dtype='datetime64[ns]')
+        self.last_prices = np.full(n_columns - 1, np.nan)
+        self.n_valid = np.zeros(n_columns, dtype=np.int64)
+        self.sums = np.zeros(n_columns)
+        self.sums_sq = np.zeros(n_columns)
+        self.downside_sq = np.zeros(n_columns)
+        self.wealth = 1.0
+        self.peaks = np.full(n_columns, np.nan)
+        self.lowest_ratios = np.ones(n_columns)
+        self.recent_returns = np.full((0, n_columns), np.nan)
+        self.rolling_volatility = np.full((0, n_columns), np.nan)
+        self.sorted_returns = np.full((n_columns, 0), np.nan)
+
+    @property
+    def as_of(self) -> Optional[dt.date]:
+        if self.dates.shape[0] == 0:
+            return None
+        return pd.Timestamp(self.dates[-1]).date()
+
+    def push(self, inputs: RiskInputs) -> None:
+        """
+        Adds the dates of 'inputs', which come after the ones already
+        added. Tickers without a price on the first of them carry their
+        last price forward.
+        """
+        if inputs.dates.shape[0] == 0:
+            return
+        prices = inputs.prices
+        if self.dates.shape[0]:
+            is_leading = np.logical_and.accumulate(np.isnan(prices), axis=0)
+            prices = np.where(is_leading, self.last_prices, prices)
+        returns = calc_daily_returns(
+            prices, self.last_prices, inputs.portf_returns
+        )
+        if self.dates.shape[0] == 0:
+            returns = returns[1:]
+        is_missing = np.isnan(returns)
+        values = returns.copy()
+        np.copyto(values, 0.0, where=is_missing)
+
+        self.n_valid += returns.shape[0] - is_missing.sum(axis=0)
+        self.sums += values.sum(axis=0)
+        self.sums_sq += np.einsum('ij,ij->j', values, values)
+        downside = np.minimum(values, self.daily_rf)
+        if self.daily_rf:
+            downside -= self.daily_rf
+            np.copyto(downside, 0.0, where=is_missing)
+        self.downside_sq += np.einsum('ij,ij->j', downside, downside)
+
+        portf_wealth = self.wealth * np.cumprod(1 + values[:, -1])
+        if self.dates.shape[0] == 0:
+            portf_wealth = np.append(1.0, portf_wealth)
+        self.peaks[:-1], ticker_ratios = _fall_from_peak(prices, self.peaks[:-1])
+        self.peaks[-1], portf_ratio = _fall_from_peak(portf_wealth, self.peaks[-1])
+        np.fmin(self.lowest_ratios[:-1], ticker_ratios, out=self.lowest_ratios[:-1])
+        self.lowest_ratios[-1] = min(self.lowest_ratios[-1], portf_ratio)
+        self.wealth = portf_wealth[-1]
+
+        n_recent = self.recent_returns.shape[0]
+        if n_recent:
+            recent_returns = np.concatenate((self.recent_returns, returns))
+            recent_missing = np.isnan(recent_returns)
+            rolling_volatility = _rolling_volatility(
+                np.where(recent_missing, 0.0, recent_returns),
+                recent_missing,
+                self.window,
+            )[n_recent:]
+        else:
+            recent_returns = returns
+            rolling_volatility = _rolling_volatility(
+                values, is_missing, self.window
+            )
+        self.recent_returns = recent_returns[
+            max(recent_returns.shape[0] - self.window + 1, 0):
+        ].copy()
+        self.rolling_volatility = np.concatenate(
+            (self.rolling_volatility, rolling_volatility)
+        )
+
+        if self.sorted_returns.shape[1]:
+            sorted_returns = np.concatenate(
+                (self.sorted_returns, returns.T), axis=1
+            )
+            sorted_returns.sort(axis=1, kind='stable')
+        else:
+            sorted_returns = np.ascontiguousarray(returns.T)
+            sorted_returns.sort(axis=1)
+        self.sorted_returns = sorted_returns
+
+        self.dates = np.concatenate((self.dates, inputs.dates))
+        self.last_prices = prices[-1].copy()
+
+    def result(self) -> RiskMetrics:
+        n_valid = self.n_valid
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.sums / n_valid
+            variance = (self.sums_sq - n_valid * mean * mean) / (n_valid - 1)
+            std = np.sqrt(np.maximum(variance, 0.0))
+            downside_std = np.sqrt(self.downside_sq / n_valid)
+            sharpe = (mean - self.daily_rf) / std * np.sqrt(TRADING_DAYS)
+            sortino = (
+                (mean - self.daily_rf) / downside_std * np.sqrt(TRADING_DAYS)
+            )
+        z_score = NormalDist().inv_cdf(1 - self.level)
+        if self.dates.shape[0]:
+            max_drawdown = (self.lowest_ratios - 1) * 100
+        else:
+            max_drawdown = np.full(self.names.shape[0], np.nan)
+        return RiskMetrics(
+            dates=self.dates[1:],
+            names=self.names,
+            rolling_volatility=self.rolling_volatility,
+            max_drawdown=max_drawdown,
+            sharpe=np.where(np.isfinite(sharpe), sharpe, np.nan),
+            sortino=np.where(np.isfinite(sortino), sortino, np.nan),
+            historical_var=_historical_var(
+                self.sorted_returns, n_valid, self.level
+            ),
+            parametric_var=-(mean + z_score * std) * 100,
+        )
+
+
+def calc_risk_metrics(
+    inputs: RiskInputs,
+    risk_free_rate: float = 0.0,
+    window: int = VOLATILITY_WINDOW,
+    level: float = VAR_LEVEL,
+) -> RiskMetrics:
+    """
+    Computes the risk metrics of every ticker and of the portfolio from
+    the dense matrices of 'inputs'. Every metric is a whole-array
+    operation along the dates axis, there's no loop over dates or tickers.
+
+    'risk_free_rate' is annual, the VaR is the one day loss that is only
+    exceeded with probability (1 - level).
+    """
+    risk = RunningRisk(inputs.tickers, risk_free_rate, window, level)
+    risk.push(inputs)
+    return risk.result()
+
+
+def risk_to_df(metrics: RiskMetrics) -> pd.DataFrame:
+    """
+    Summary of the risk metrics, one row per ticker and one for the
+    portfolio, with the last rolling volatility of every column.
+    """
+    df_risk = pd.DataFrame(
+        {
+            'volatility': (
+                metrics.rolling_volatility[-1]
+                if metrics.rolling_volatility.shape[0]
+                else np.full(metrics.names.shape[0], np.nan)
+            ),
+            'max_drawdown': metrics.max_drawdown,
+            'sharpe': metrics.sharpe,
+            'sortino': metrics.sortino,
+            'historical_var': metrics.historical_var,
+            'parametric_var': metrics.parametric_var,
+        },
+        index=pd.Index(metrics.names, name='ticker'),
+    )
+    return df_risk
+
+
+def get_risk_metrics(
+    watchlist_id: int,
+    data_version: Hashable,
+    versions: Mapping[str, PriceVersion],
+    load_inputs: Callable[[Optional[dt.date]], RiskInputs],
+) -> RiskMetrics:
+    """
+    Returns the risk metrics of a watchlist, kept per watchlist in each
+    process. The dates after the kept ones are added from
+    'load_inputs(as_of)', which only loads those. A new 'data_version'
+    or prices written up to the last kept date (see the price
+    'versions' of its tickers) recompute them all from
+    'load_inputs(None)'. The least recently used watchlists are evicted
+    past RISK_CACHE_SIZE entries.
+    """
+    risk = _cache.get(watchlist_id)
+    if (
+        risk is None
+        or risk.as_of is None
+        or risk.data_version != data_version
+        or prices_rewritten(risk.versions, versions, risk.as_of)
+    ):
+        inputs = load_inputs(None)
+        risk = RunningRisk(inputs.tickers)
+        risk.push(inputs)
+    else:
+        risk.push(load_inputs(risk.as_of))
+    risk.data_version = data_version
+    risk.versions = dict(versions)
+    _cache[watchlist_id] = risk
+    _cache.move_to_end(watchlist_id)
+    if len(_cache) > RISK_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return risk.result()
@@ -1,18 +1,31 @@
 import datetime as dt
+import hashlib
 import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from io import StringIO
-from typing import Dict, List
+from typing import (
+    IO, Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional,
+    Tuple
+)
 
 import pandas as pd
-import requests
 from requests.exceptions import HTTPError, ConnectionError
 from flask import current_app
-from tiingo import TiingoClient
 
 from portfolio_builder import db, scheduler
+from portfolio_builder.public import http_cache, price_store
+from portfolio_builder.public.backfill import FetchRequest, plan_backfill
+from portfolio_builder.public.fetching import (
+    ProviderClient, TokenBucket, get_provider_client, get_rate_limiter
+)
+from portfolio_builder.public.daily_values import (
+    refresh_all_daily_values, refresh_ticker_daily_values
+)
+from portfolio_builder.public.leases import run_exclusive
 from portfolio_builder.public.models import (
-    Price, Security, WatchlistItem,
-    SecurityMgr, PriceMgr, WatchlistItemMgr
+    BootstrapBatch, Security, SecurityMgr, SecuritySync, PriceMgr,
+    PriceVersion
 )
 
 
@@ -24,25 +37,52 @@ EXCHANGES = [
     'NYSE',
     'NASDAQ',
 ]
+EODHD_BASE_URL = 'https://eodhistoricaldata.com/api'
+TIINGO_BASE_URL = 'https://api.tiingo.com'
+TIINGO_TICKERS_URL = (
+    'https://apimedia.tiingo.com/docs/tiingo/daily/supported_tickers.zip'
+)
+UNKNOWN_TICKER_ERROR = 'Not a known security'
+FETCH_ERROR = 'Fetching the prices failed'
+# Rows of the provider symbol lists parsed at a time
+SECURITIES_CHUNK_ROWS = 20000
+# Columns of the symbol lists with few distinct values, kept as categoricals
+SECURITIES_CATEGORIES = ['country', 'exchange', 'currency', 'asset_type']
 
 
-def get_securities_eodhd(api_key: str) -> pd.DataFrame:
-    df_list = []
-    try:
-        for exchange in EXCHANGES:
-            url = f'https://eodhistoricaldata.com/api/exchange-symbol-list/{exchange}'
-            response = requests.get(url, params={'api_token': api_key})
-            response.raise_for_status()
-            df_list.append(pd.read_csv(StringIO(response.text)))
-    except ConnectionError as e:
-        logging.error(f"API connection failed: {e}")
-        raise
-    except HTTPError as e:
-        logging.error(f"API request failed: {e}")
-        raise
-    df = pd.concat(df_list)
+def _get_client() -> ProviderClient:
+    app = current_app._get_current_object()  # type: ignore
+    return get_provider_client(
+        app.config['PROVIDER_MAX_CONNECTIONS'],
+        (app.config['PROVIDER_CONNECT_TIMEOUT'],
+         app.config['PROVIDER_READ_TIMEOUT']),
+    )
+
+
+def _read_securities(
+    f: IO[bytes],
+    clean: Callable[[pd.DataFrame], pd.DataFrame],
+    **kwargs: Any,
+) -> pd.DataFrame:
+    """
+    Rows of the CSV file 'f' kept by 'clean', which is applied to one
+    chunk of SECURITIES_CHUNK_ROWS rows at a time, so the whole list is
+    never held in memory.
+    """
+    with pd.read_csv(f, chunksize=SECURITIES_CHUNK_ROWS, **kwargs) as reader:
+        return pd.concat([clean(chunk) for chunk in reader], ignore_index=True)
+
+
+def _to_categories(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype({
+        column: 'category'
+        for column in SECURITIES_CATEGORIES if column in df.columns
+    })
+
+
+def _clean_securities_eodhd(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = df.columns.str.lower()
-    df_cleaned = (
+    return (
         df
         .loc[lambda x: x['code'].notna()]
         .loc[lambda x: x['exchange'].isin(EXCHANGES)]
@@ -56,81 +96,216 @@ def get_securities_eodhd(api_key: str) -> pd.DataFrame:
         }}, regex=True)
         .fillna({'isin': ''})
         .loc[lambda x: x['asset_type'] == 'Stock']
+    )
+
+
+def _parse_securities_eodhd(f: IO[bytes]) -> pd.DataFrame:
+    return _to_categories(
+        _read_securities(f, _clean_securities_eodhd, dtype=str)
+    )
+
+
+def get_securities_eodhd(
+    api_key: str,
+    base_url: Optional[str] = None,
+    client: Optional[ProviderClient] = None,
+    cache_dir: Optional[str] = None,
+    cache_ttl: float = 0.0,
+) -> pd.DataFrame:
+    client = client or get_provider_client()
+    df_list = []
+    try:
+        for exchange in EXCHANGES:
+            url = f'{base_url or EODHD_BASE_URL}/exchange-symbol-list/{exchange}'
+            df_list.append(http_cache.get_frame(
+                client,
+                url,
+                _parse_securities_eodhd,
+                cache_dir=cache_dir,
+                ttl=cache_ttl,
+                params={'api_token': api_key},
+            ))
+    except ConnectionError as e:
+        logging.error(f"API connection failed: {e}")
+        raise
+    except HTTPError as e:
+        logging.error(f"API request failed: {e}")
+        raise
+    return _to_categories(
+        pd
+        .concat(df_list, ignore_index=True)
         .drop_duplicates(subset=['ticker'])
     )
-    return df_cleaned
 
 
-def get_securities_tiingo(api_key: str) -> pd.DataFrame:
-    tiingo_client = TiingoClient({'session': True, 'api_key': api_key})
-    df = pd.DataFrame(tiingo_client.list_stock_tickers())
-    df_cleaned = (
+def _clean_securities_tiingo(df: pd.DataFrame) -> pd.DataFrame:
+    return (
         df
-        .loc[lambda x: x['ticker'].notna()]
-        .loc[lambda x: x['startDate'].notna()]
-        .loc[lambda x: x['endDate'].notna()]
-        .loc[lambda x: x['exchange'].isin(EXCHANGES)]
+        .loc[lambda x: (
+            x['ticker'].notna() &
+            x['startDate'].notna() &
+            x['endDate'].notna() &
+            x['exchange'].isin(EXCHANGES) &
+            (x['assetType'] == 'Stock')
+        )]
         .drop(columns=['startDate', 'endDate'], axis=1)
         .rename(columns={
             'assetType': 'asset_type',
             'priceCurrency': 'currency',
         })
-        .loc[lambda x: x['asset_type'] == 'Stock']
     )
-    return df_cleaned
+
+
+def _parse_securities_tiingo(f: IO[bytes]) -> pd.DataFrame:
+    return _to_categories(_read_securities(
+        f,
+        _clean_securities_tiingo,
+        compression='zip',
+        dtype=str,
+        keep_default_na=False,
+        na_values=[''],
+    ))
+
+
+def get_securities_tiingo(
+    api_key: str,
+    tickers_url: Optional[str] = None,
+    client: Optional[ProviderClient] = None,
+    cache_dir: Optional[str] = None,
+    cache_ttl: float = 0.0,
+) -> pd.DataFrame:
+    # Same file as TiingoClient.list_stock_tickers
+    client = client or get_provider_client()
+    return http_cache.get_frame(
+        client,
+        tickers_url or TIINGO_TICKERS_URL,
+        _parse_securities_tiingo,
+        cache_dir=cache_dir,
+        ttl=cache_ttl,
+    )
 
 
 def get_prices_tiingo(
     api_key: str,
     ticker_ids: Dict[str, int],
     start_date: dt.date,
-    end_date: dt.date
+    end_date: dt.date,
+    max_workers: int = 1,
+    rate_limiter: Optional[TokenBucket] = None,
+    max_retries: int = 0,
+    retry_backoff: float = 1.0,
+    base_url: Optional[str] = None,
+    client: Optional[ProviderClient] = None,
+    failed_tickers: Optional[List[str]] = None,
 ) -> pd.DataFrame:
-    tiingo_client = TiingoClient({'session': True, 'api_key': api_key})
-    tickers = [ticker for ticker, _ in ticker_ids.items()]
-    df = tiingo_client.get_dataframe(
-        tickers,
-        frequency='daily',
-        metric_name='close',
-        startDate=start_date,
-        endDate=end_date,
-    )
-    df.columns = [
-        (col if col == 'index' else ticker_ids[col])
-        for col in df.columns
-    ]
+    """
+    Daily close prices of every ticker between two dates, one request
+    per ticker spread over 'max_workers' threads. Every request takes a
+    token from 'rate_limiter' and is retried on transient errors, see
+    call_with_retry. Tickers that still fail are logged and left out,
+    and appended to 'failed_tickers' if given.
+    """
+    client = client or get_provider_client()
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f'Token {api_key}',
+    }
+    params = {
+        'startDate': start_date.isoformat(),
+        'endDate': end_date.isoformat(),
+        'resampleFreq': 'daily',
+        'format': 'json',
+    }
+
+    def get_ticker_prices(ticker: str) -> Optional[pd.DataFrame]:
+        url = f'{base_url or TIINGO_BASE_URL}/tiingo/daily/{ticker}/prices'
+        try:
+            prices = client.get(
+                url,
+                rate_limiter=rate_limiter,
+                max_retries=max_retries,
+                retry_backoff=retry_backoff,
+                params=params,
+                headers=headers,
+            ).json()
+        except Exception as e:
+            logging.error(f"Fetching the prices of {ticker} failed: {e}")
+            if failed_tickers is not None:
+                failed_tickers.append(ticker)
+            return None
+        if not prices:
+            return None
+        return pd.DataFrame({
+            'date': pd.to_datetime([price['date'] for price in prices]).date,
+            'ticker_id': ticker_ids[ticker],
+            'close_price': [price['close'] for price in prices],
+        })
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        df_list = [
+            df for df in executor.map(get_ticker_prices, ticker_ids)
+            if df is not None
+        ]
+    if not df_list:
+        df_list = [pd.DataFrame(columns=['date', 'ticker_id', 'close_price'])]
     df_cleaned = (
-        df
-        .reset_index()
-        .rename(columns={'index': 'date'})
-        .melt('date', var_name='ticker_id', value_name='close_price')
-        # Just take date part
-        .assign(**{'date': lambda x: pd.to_datetime(x['date']).dt.date})
+        pd
+        .concat(df_list, ignore_index=True)
         .astype({'ticker_id': 'int64', 'close_price': 'float64'})
     )
     return df_cleaned
 
 
-def load_securities_csv() -> None:
+def sync_securities(df_securities: pd.DataFrame) -> Optional[SecuritySync]:
+    """
+    Writes the changes of a full securities list, see
+    SecurityMgr.sync_items. An empty list is taken as a failed download
+    and skipped, not as every security delisted.
+    """
+    if df_securities.empty:
+        logging.error("Empty securities list, not synced.")
+        return None
+    sync = SecurityMgr.sync_items(df_securities)
+    logging.info(
+        f"Securities: {sync.inserted} inserted, {sync.updated} updated, "
+        f"{sync.delisted} delisted, {sync.unchanged} unchanged"
+    )
+    return sync
+
+
+def load_securities_csv() -> Optional[SecuritySync]:
     app = current_app._get_current_object()  # type: ignore
-    df = pd.read_csv(app.config['ROOT_DIR'] + '/data/securities.csv')
-    df.to_sql(
-        "securities",
-        con=db.engine,
-        if_exists="append",
-        index=False
+    df = pd.read_csv(
+        app.config['ROOT_DIR'] + '/data/securities.csv',
+        dtype=str,
+        keep_default_na=False,
+        na_values=[''],
     )
+    return sync_securities(df)
 
 
-def load_securities() -> None:
+def load_securities() -> Optional[SecuritySync]:
     app = current_app._get_current_object()  # type: ignore
     API_KEY_TIINGO = app.config['API_KEY_TIINGO']
     API_KEY_EODHD = app.config['API_KEY_EODHD']
+    client = _get_client()
     try:
-        df_eodhd = get_securities_eodhd(API_KEY_EODHD)
+        df_eodhd = get_securities_eodhd(
+            API_KEY_EODHD,
+            base_url=app.config['EODHD_BASE_URL'],
+            client=client,
+            cache_dir=app.config['HTTP_CACHE_DIR'],
+            cache_ttl=app.config['HTTP_CACHE_TTL'],
+        )
     except:
-        return
-    df_tiingo = get_securities_tiingo(API_KEY_TIINGO)
+        return None
+    df_tiingo = get_securities_tiingo(
+        API_KEY_TIINGO,
+        tickers_url=app.config['TIINGO_TICKERS_URL'],
+        client=client,
+        cache_dir=app.config['HTTP_CACHE_DIR'],
+        cache_ttl=app.config['HTTP_CACHE_TTL'],
+    )
     df_cleaned = (
         pd
         .merge(
@@ -142,67 +317,447 @@ def load_securities() -> None:
         .drop_duplicates(subset=['ticker', 'exchange', 'asset_type', 'currency'])
         .drop(columns=['asset_type'], axis=1)
     )
-    df_cleaned.to_sql(
-        "securities",
-        con=db.engine,
-        if_exists="append",
-        index=False
+    return sync_securities(df_cleaned)
+
+
+def write_through_prices(
+    root: str,
+    ticker_ids: Dict[str, int],
+    df_prices: pd.DataFrame,
+    start_date: dt.date,
+    end_date: dt.date,
+    versions_before: Mapping[str, PriceVersion],
+    versions_after: Mapping[str, PriceVersion],
+) -> None:
+    """
+    Writes freshly loaded prices to the price store, so it stays in
+    sync with the prices table, up to the last stored date of each
+    ticker. The file of a ticker whose history version changed around
+    the write (rewritten or older prices, here or elsewhere) is dropped
+    instead, it's read from the database again on the next miss.
+    """
+    df_groups = dict(list(df_prices.groupby('ticker_id', sort=False)))
+    for ticker, ticker_id in ticker_ids.items():
+        version = versions_after.get(ticker)
+        if version is None or version.last_date is None:
+            continue
+        version_before = versions_before.get(ticker)
+        if (
+            version_before is None
+            or version_before.history_version != version.history_version
+        ):
+            price_store.delete_prices(root, ticker)
+            continue
+        ticker_end_date = min(end_date, version.last_date)
+        if ticker_end_date < start_date:
+            continue
+        df_ticker = df_groups.get(ticker_id, df_prices.iloc[:0])
+        price_store.write_prices(
+            root,
+            ticker,
+            df_ticker['date'],
+            df_ticker['close_price'],
+            start_date,
+            ticker_end_date,
+            version.history_version,
+        )
+
+
+def get_bulk_prices_eodhd(
+    api_key: str,
+    date: dt.date,
+    base_url: Optional[str] = None,
+    client: Optional[ProviderClient] = None,
+) -> pd.DataFrame:
+    """
+    Close prices of every symbol of the supported exchanges on 'date',
+    from the exchange-wide end-of-day files: one request per exchange
+    whatever the number of tickers. Rows are keyed on (ticker, exchange).
+    """
+    client = client or get_provider_client()
+    df_list = []
+    try:
+        for exchange in EXCHANGES:
+            url = f'{base_url or EODHD_BASE_URL}/eod-bulk-last-day/{exchange}'
+            response = client.get(url, params={
+                'api_token': api_key,
+                'date': date.isoformat(),
+            })
+            df_list.append(
+                pd.read_csv(
+                    StringIO(response.text),
+                    usecols=['Code', 'Date', 'Close'],
+                    dtype={'Code': str, 'Date': str},
+                    keep_default_na=False,
+                    na_values=[''],
+                )
+                .assign(exchange=exchange)
+            )
+    except ConnectionError as e:
+        logging.error(f"API connection failed: {e}")
+        raise
+    except HTTPError as e:
+        logging.error(f"API request failed: {e}")
+        raise
+    return (
+        pd.concat(df_list)
+        .rename(columns={
+            'Code': 'ticker',
+            'Date': 'date',
+            'Close': 'close_price',
+        })
+        # Files of holidays hold the last trading day
+        .loc[lambda x: x['date'] == date.isoformat()]
+        .drop_duplicates(subset=['ticker', 'exchange'])
+        .assign(date=date)
+        .reset_index(drop=True)
+    )
+
+
+def store_prices(
+    ticker_ids: Dict[str, int],
+    df_prices: pd.DataFrame,
+    start_date: dt.date,
+    end_date: dt.date,
+    failed_tickers: Iterable[str] = (),
+) -> None:
+    """
+    Writes the prices fetched for 'ticker_ids' over a date range.
+    'failed_tickers' got no prices from the provider, so the price
+    store isn't told their range is complete.
+    """
+    app = current_app._get_current_object()  # type: ignore
+    failed = set(failed_tickers)
+    ticker_ids = {
+        ticker: ticker_id for ticker, ticker_id in ticker_ids.items()
+        if ticker not in failed
+    }
+    price_store_dir = app.config.get('PRICE_STORE_DIR')
+    versions_before = (
+        PriceMgr.get_price_versions(list(ticker_ids)) if price_store_dir
+        else {}
+    )
+    PriceMgr.upsert_items(
+        df_prices, batch_size=app.config['PRICES_UPSERT_BATCH_SIZE'])
+    if price_store_dir:
+        write_through_prices(
+            price_store_dir, ticker_ids, df_prices, start_date, end_date,
+            versions_before, PriceMgr.get_price_versions(list(ticker_ids)),
+        )
+
+
+def _get_listings(tickers: List[str]) -> pd.DataFrame:
+    """
+    The primary listing of each of 'tickers', when a ticker is listed on
+    several exchanges: listed before delisted, then in the order of
+    EXCHANGES, then the oldest security.
+    """
+    df_tickers = SecurityMgr.get_items(
+        filters=[Security.ticker.in_(tickers)],
+        entities=[
+            Security.ticker, Security.exchange, Security.id,
+            Security.delisted_date,
+        ],
+    )
+    if df_tickers.empty:
+        return pd.DataFrame(columns=['ticker', 'exchange', 'id'])
+    exchange_ranks = {exchange: rank for rank, exchange in enumerate(EXCHANGES)}
+    return (
+        df_tickers
+        .assign(
+            is_delisted=lambda x: x['delisted_date'].notna(),
+            exchange_rank=lambda x: (
+                x['exchange'].map(exchange_ranks).fillna(len(EXCHANGES))),
+        )
+        .sort_values(['ticker', 'is_delisted', 'exchange_rank', 'id'])
+        .drop_duplicates(subset=['ticker'])
+        .loc[:, ['ticker', 'exchange', 'id']]
+        .reset_index(drop=True)
     )
-    return
+
+
+def _get_ticker_ids(tickers: List[str]) -> Dict[str, int]:
+    df_listings = _get_listings(tickers)
+    return dict(zip(df_listings['ticker'], df_listings['id']))
+
+
+def _unknown_tickers(
+    tickers: List[str],
+    ticker_ids: Dict[str, int]
+) -> Dict[str, str]:
+    return {
+        ticker: UNKNOWN_TICKER_ERROR
+        for ticker in tickers if ticker not in ticker_ids
+    }
+
+
+def load_bulk_prices(
+    df_bulk: pd.DataFrame,
+    tickers: List[str],
+    start_date: dt.date,
+    end_date: dt.date
+) -> Dict[str, str]:
+    """
+    Stores the prices of 'tickers' found in an exchange-wide snapshot,
+    from the file of the exchange of their primary listing.
+    Returns the tickers that aren't known securities, with the error.
+    """
+    df_listings = _get_listings(tickers)
+    ticker_ids = dict(zip(df_listings['ticker'], df_listings['id']))
+    if ticker_ids:
+        df = (
+            df_bulk
+            .merge(
+                df_listings.rename(columns={'id': 'ticker_id'}),
+                on=['ticker', 'exchange'],
+            )
+            .loc[:, ['date', 'ticker_id', 'close_price']]
+            .dropna(subset=['close_price'])
+        )
+        store_prices(ticker_ids, df, start_date, end_date)
+    return _unknown_tickers(tickers, ticker_ids)
 
 
 def load_prices(
     tickers: List[str],
     start_date: dt.date,
     end_date: dt.date
-) -> None:
-    df_tickers = SecurityMgr.get_items(
-        filters=[Security.ticker.in_(tickers)],
-        entities=[Security.ticker, Security.id],
-    )
-    if not df_tickers.empty:
-        ticker_ids = (
-            df_tickers 
-            .set_index('ticker')
-            .to_dict()
-            .get('id', {})
+) -> Dict[str, str]:
+    """
+    Fetches and stores the prices of 'tickers' between two dates.
+    Returns the tickers that got no prices because of an error, unknown
+    securities and failed provider requests, with the error.
+    """
+    ticker_ids = _get_ticker_ids(tickers)
+    failed = _unknown_tickers(tickers, ticker_ids)
+    if ticker_ids:
+        app = current_app._get_current_object()  # type: ignore
+        API_KEY_TIINGO = app.config['API_KEY_TIINGO']
+        failed_tickers: List[str] = []
+        df = (
+            get_prices_tiingo(
+                API_KEY_TIINGO,
+                ticker_ids,
+                start_date,
+                end_date,
+                max_workers=app.config['TIINGO_MAX_WORKERS'],
+                rate_limiter=get_rate_limiter(
+                    app.config['TIINGO_REQUESTS_PER_HOUR'] / 3600,
+                    capacity=app.config['TIINGO_MAX_WORKERS'],
+                ),
+                max_retries=app.config['TIINGO_MAX_RETRIES'],
+                retry_backoff=app.config['TIINGO_RETRY_BACKOFF'],
+                base_url=app.config['TIINGO_BASE_URL'],
+                client=_get_client(),
+                failed_tickers=failed_tickers,
+            )
+            .dropna(subset=['close_price'])
         )
-        if ticker_ids:
-            app = current_app._get_current_object()  # type: ignore
-            API_KEY_TIINGO = app.config['API_KEY_TIINGO']
-            df = get_prices_tiingo(
-                API_KEY_TIINGO, ticker_ids, start_date, end_date)
-            df.to_sql(
-                "prices",
-                con=db.engine,
-                if_exists="append",
-                index=False
+        store_prices(ticker_ids, df, start_date, end_date, failed_tickers)
+        failed.update({ticker: FETCH_ERROR for ticker in failed_tickers})
+    return failed
+
+
+class BackfillResult(NamedTuple):
+    fetch_requests: List[FetchRequest]
+    failed_tickers: Dict[str, str]  # ticker -> error
+
+
+def backfill_prices(
+    tickers: Optional[List[str]] = None,
+    end_date: Optional[dt.date] = None,
+    use_bulk: bool = False,
+) -> BackfillResult:
+    """
+    Fetches the prices missing from the range each watchlist ticker
+    needs, or only 'tickers', one provider call per planned request.
+    With 'use_bulk', requests for a single day are served from the
+    EODHD exchange-wide file of that day, downloaded once.
+    The daily values of tickers that got older prices are recomputed.
+
+    Returns the planned requests and the tickers some request of which
+    failed, with the error.
+    """
+    fetch_requests = plan_backfill(tickers, end_date)
+    bulk_prices: Dict[dt.date, pd.DataFrame] = {}
+    failed_tickers: Dict[str, str] = {}
+    for request in fetch_requests:
+        if use_bulk and request.is_single_day:
+            if request.end_date not in bulk_prices:
+                bulk_prices[request.end_date] = get_bulk_prices_eodhd(
+                    current_app.config['API_KEY_EODHD'],
+                    request.end_date,
+                    base_url=current_app.config['EODHD_BASE_URL'],
+                    client=_get_client(),
+                )
+            failed = load_bulk_prices(
+                bulk_prices[request.end_date],
+                list(request.tickers),
+                request.start_date,
+                request.end_date,
             )
+        else:
+            failed = load_prices(
+                list(request.tickers), request.start_date, request.end_date)
+        failed_tickers.update(failed)
+    history_tickers = sorted({
+        ticker
+        for request in fetch_requests if not request.is_tail
+        for ticker in request.tickers
+    })
+    for ticker in history_tickers:
+        refresh_ticker_daily_values(ticker)
+    return BackfillResult(fetch_requests, failed_tickers)
+
+
+class BootstrapProgress(NamedTuple):
+    batches: int
+    done: int  # finished in earlier runs included
+    failed: int
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def _batch_key(tickers: List[str], start_date: dt.date, end_date: dt.date) -> str:
+    return hashlib.sha1(
+        f"{start_date}:{end_date}:{','.join(tickers)}".encode()
+    ).hexdigest()
+
+
+def bootstrap_prices(
+    tickers: List[str],
+    start_date: dt.date,
+    end_date: dt.date,
+    batch_size: int = 50,
+    max_workers: int = 4,
+    report: Optional[Callable[[BootstrapProgress], None]] = None,
+) -> BootstrapProgress:
+    """
+    Loads the prices of a large universe of tickers between two dates.
+    Tickers are split into batches of 'batch_size', fetched by
+    'max_workers' threads while finished batches are written. Each
+    written batch is recorded in the bootstrap_batches table, so a run
+    called again with the same tickers and dates skips them. Batches
+    with failed tickers are written but not recorded, to be retried by
+    the next run. 'report' is called after every batch.
+    """
+    app = current_app._get_current_object()  # type: ignore
+    ticker_ids = _get_ticker_ids(tickers)
+    sorted_tickers = sorted(ticker_ids)
+    batches = [
+        sorted_tickers[idx:idx + batch_size]
+        for idx in range(0, len(sorted_tickers), batch_size)
+    ]
+    keys = [_batch_key(batch, start_date, end_date) for batch in batches]
+    done_keys = {
+        key for key, in
+        db.session.query(BootstrapBatch.batch_key)
+        .filter(BootstrapBatch.batch_key.in_(keys))
+    }
+    todo = iter([
+        (key, batch) for key, batch in zip(keys, batches)
+        if key not in done_keys
+    ])
+    rate_limiter = get_rate_limiter(
+        app.config['TIINGO_REQUESTS_PER_HOUR'] / 3600,
+        capacity=max_workers,
+    )
+    client = _get_client()
+
+    def fetch_batch(batch: List[str]) -> Tuple[pd.DataFrame, List[str]]:
+        failed_tickers: List[str] = []
+        df = get_prices_tiingo(
+            app.config['API_KEY_TIINGO'],
+            {ticker: ticker_ids[ticker] for ticker in batch},
+            start_date,
+            end_date,
+            rate_limiter=rate_limiter,
+            max_retries=app.config['TIINGO_MAX_RETRIES'],
+            retry_backoff=app.config['TIINGO_RETRY_BACKOFF'],
+            base_url=app.config['TIINGO_BASE_URL'],
+            client=client,
+            failed_tickers=failed_tickers,
+        )
+        return df.dropna(subset=['close_price']), failed_tickers
+
+    started = time.monotonic()
+    progress = BootstrapProgress(len(batches), len(done_keys), 0, 0, 0.0)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: Dict[Future, Tuple[str, List[str]]] = {}
+
+        def submit_next() -> None:
+            # At most two batches per thread are held in memory
+            item = next(todo, None)
+            if item is not None:
+                running[executor.submit(fetch_batch, item[1])] = item
+
+        for _ in range(2 * max_workers):
+            submit_next()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key, batch = running.pop(future)
+                df, failed_tickers = future.result()
+                submit_next()
+                store_prices(
+                    {ticker: ticker_ids[ticker] for ticker in batch},
+                    df, start_date, end_date, failed_tickers,
+                )
+                if failed_tickers:
+                    progress = progress._replace(failed=progress.failed + 1)
+                else:
+                    db.session.add(BootstrapBatch(
+                        batch_key=key,
+                        start_date=start_date,
+                        end_date=end_date,
+                        no_tickers=len(batch),
+                        no_rows=df.shape[0],
+                    ))
+                    db.session.commit()
+                    progress = progress._replace(done=progress.done + 1)
+                progress = progress._replace(
+                    rows=progress.rows + df.shape[0],
+                    seconds=time.monotonic() - started,
+                )
+                if report is not None:
+                    report(progress)
+    return progress
+
+
+def update_all_tickers() -> None:
+    client = _get_client()
+    client.reset_stats()
+    backfill_prices(use_bulk=current_app.config['NIGHTLY_BULK_EOD'])
+    for host, stats in client.get_stats().items():
+        logging.info(
+            f"{host}: {stats.requests} requests, {stats.failures} failed, "
+            f"{stats.nbytes / 2**20:.1f} MiB, "
+            f"{stats.seconds / max(stats.requests, 1) * 1000:.0f} ms avg, "
+            f"{stats.max_seconds * 1000:.0f} ms max"
+        )
+    refresh_all_daily_values()
 
 
 def load_prices_all_tickers() -> None:
     with scheduler.app.app_context():  # type: ignore
-        df_all_tickers = WatchlistItemMgr.get_distinct_items(
-            filters=[db.literal(True)],
-            distinct_on=[WatchlistItem.ticker],
-            entities=[WatchlistItem.ticker],
-            orderby=[WatchlistItem.ticker],
+        # Fired in every worker, the first one to start runs it for the day.
+        # Web processes see the new prices through the price versions.
+        run_exclusive(
+            'update_db_last_prices',
+            update_all_tickers,
+            min_interval=dt.timedelta(hours=12),
         )
-        if not df_all_tickers.empty:
-            all_tickers = df_all_tickers.loc[:, 'ticker'].to_list()
-            if all_tickers:
-                end_date = dt.date.today() - dt.timedelta(days=1)
-                start_date = end_date
-                load_prices(all_tickers, start_date, end_date)
 
 
-def load_prices_ticker(ticker: str) -> None:
+def refresh_securities() -> None:
     with scheduler.app.app_context():  # type: ignore
-        price_obj = PriceMgr.get_first_item(
-            filters=[Security.ticker == ticker],
-            orderby = [Price.date.desc()]
+        # Writes only the securities that changed since the last refresh
+        run_exclusive(
+            'sync_securities',
+            load_securities,
+            min_interval=dt.timedelta(hours=12),
         )
-        if price_obj is None:
-            end_date = dt.date.today() - dt.timedelta(days=1)
-            start_date = end_date - dt.timedelta(days=100)
-            load_prices([ticker], start_date, end_date)
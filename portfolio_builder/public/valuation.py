@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, NamedTuple, Optional, Tuple
+
+from portfolio_builder.lazy import lazy_import
+
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+
+
+NS_PER_DAY = 86_400 * 10**9
+
+
+class Valuation(NamedTuple):
+    """
+    Dense (dates x tickers) float64 matrices of a portfolio. Cells are
+    NaN before the first trade or the first price of a ticker.
+
+    When positions are valued per group, every column is a (group,
+    ticker) pair, ordered by group, and 'groups' holds the group of
+    each column.
+    """
+    dates: np.ndarray
+    tickers: np.ndarray
+    quantities: np.ndarray
+    prices: np.ndarray
+    market_val: np.ndarray
+    groups: Optional[np.ndarray] = None
+
+
+def _factorize_dates(dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the codes and sorted unique values of an array of dates. Dates
+    at midnight are binned by day offset, which is linear in the number of
+    dates instead of hashing or sorting them.
+    """
+    nanos = dates.view(np.int64)
+    if nanos.shape[0] == 0 or (nanos % NS_PER_DAY).any():
+        codes, uniques = pd.factorize(dates, sort=True)
+        return codes.astype(np.int64), np.asarray(uniques, dtype='datetime64[ns]')
+    days = nanos // NS_PER_DAY
+    first_day = days.min()
+    offsets = days - first_day
+    is_used = np.zeros(offsets.max() + 1, dtype=np.bool_)
+    is_used[offsets] = True
+    codes = (np.cumsum(is_used) - 1)[offsets]
+    uniques = ((np.flatnonzero(is_used) + first_day) * NS_PER_DAY).view(
+        'datetime64[ns]'
+    )
+    return codes, uniques
+
+
+def _factorize_tickers(tickers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the codes and sorted unique values of an array of tickers.
+    Only the first ticker of each run of equal tickers is hashed, which
+    is much cheaper for inputs that are ordered by ticker.
+    """
+    n_tickers = tickers.shape[0]
+    if n_tickers == 0:
+        return np.zeros(0, dtype=np.int64), tickers
+    is_run_start = np.empty(n_tickers, dtype=np.bool_)
+    is_run_start[0] = True
+    np.not_equal(tickers[1:], tickers[:-1], out=is_run_start[1:])
+    run_starts = np.flatnonzero(is_run_start)
+    run_codes, uniques = pd.factorize(tickers[run_starts], sort=True)
+    codes = np.repeat(
+        run_codes.astype(np.int64),
+        np.diff(np.append(run_starts, n_tickers)),
+    )
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _asof_matrix(
+    ticker_codes: np.ndarray,
+    date_codes: np.ndarray,
+    values: np.ndarray,
+    n_dates: int,
+    n_tickers: int,
+) -> np.ndarray:
+    """
+    As-of join of (ticker, date, value) observations against the full
+    (dates x tickers) grid: each cell takes the last observation of its
+    ticker on or before its date, and is NaN before the first one. When
+    a ticker has several observations on the same date, the last one in
+    input order is kept.
+    """
+    if values.shape[0] == 0:
+        return np.full((n_dates, n_tickers), np.nan)
+    cell_obs = np.full((n_dates, n_tickers), -1, dtype=np.int32)
+    np.maximum.at(
+        cell_obs.reshape(-1),
+        date_codes * n_tickers + ticker_codes,
+        np.arange(values.shape[0], dtype=np.int32),
+    )
+    fill_date = np.where(
+        cell_obs >= 0, np.arange(n_dates, dtype=np.int32)[:, np.newaxis], 0
+    )
+    np.maximum.accumulate(fill_date, axis=0, out=fill_date)
+    obs = cell_obs[fill_date, np.arange(n_tickers)]
+    del cell_obs, fill_date
+    return np.where(obs >= 0, values[obs], np.nan)
+
+
+def valuation_matrix(
+    df_portf_pos: pd.DataFrame,
+    df_prices: pd.DataFrame,
+    group_col: Optional[str] = None,
+) -> Valuation:
+    """
+    Builds the daily market value of every position on the union of the
+    trade and price dates. Position changes and prices are as-of joined
+    against the same grid, one ticker column at a time, so nothing is
+    carried over from one ticker to the next. The market value is their
+    elementwise product.
+
+    With 'group_col', the positions of several portfolios are valued in
+    one pass: every (group, ticker) pair gets its own quantity column,
+    and the price matrix is built once and shared by all the groups.
+    """
+    n_pos = df_portf_pos.shape[0]
+    date_codes, dates = _factorize_dates(
+        np.concatenate((
+            df_portf_pos['date'].to_numpy(dtype='datetime64[ns]'),
+            df_prices['date'].to_numpy(dtype='datetime64[ns]'),
+        ))
+    )
+    ticker_codes, tickers = _factorize_tickers(
+        np.concatenate((
+            df_portf_pos['ticker'].to_numpy(dtype=object),
+            df_prices['ticker'].to_numpy(dtype=object),
+        ))
+    )
+    n_dates, n_tickers = dates.shape[0], tickers.shape[0]
+
+    prices = _asof_matrix(
+        ticker_codes[n_pos:],
+        date_codes[n_pos:],
+        df_prices['price'].to_numpy(dtype='float64'),
+        n_dates,
+        n_tickers,
+    )
+    groups = None
+    column_codes = ticker_codes[:n_pos]
+    if group_col is not None:
+        group_codes, group_uniques = pd.factorize(
+            df_portf_pos[group_col], sort=True
+        )
+        column_codes, pairs = pd.factorize(
+            group_codes.astype(np.int64) * n_tickers + column_codes,
+            sort=True,
+        )
+        column_tickers = pairs % n_tickers
+        groups = np.asarray(group_uniques)[pairs // n_tickers]
+        tickers = tickers[column_tickers]
+        prices = prices[:, column_tickers]
+    quantities = _asof_matrix(
+        column_codes,
+        date_codes[:n_pos],
+        df_portf_pos['net_quantity'].to_numpy(dtype='float64'),
+        n_dates,
+        tickers.shape[0],
+    )
+    market_val = np.round(quantities * prices, 3)
+    return Valuation(dates, tickers, quantities, prices, market_val, groups)
+
+
+def valuation_to_df(valuation: Valuation) -> pd.DataFrame:
+    df_portf_val = (
+        pd
+        .DataFrame(
+            valuation.market_val,
+            index=pd.DatetimeIndex(valuation.dates, name='date'),
+            columns=pd.Index(valuation.tickers, name='ticker'),
+        )
+        .dropna(how='all')
+        .dropna(axis=1, how='all')
+    )
+    return df_portf_val
+
+
+def price_matrix(
+    df_prices: pd.DataFrame,
+    dates: np.ndarray,
+    tickers: np.ndarray,
+) -> np.ndarray:
+    """
+    Prices of 'tickers' as of each of the sorted 'dates', as a (dates x
+    tickers) matrix. A price counts from the first of 'dates' on or
+    after its own date, cells are NaN before the first price of their
+    ticker and prices of other tickers or after the last date are left
+    out. 'df_prices' is ordered by ticker and date, like the output of
+    PriceMgr.get_prices.
+    """
+    date_codes = np.searchsorted(
+        dates, df_prices['date'].to_numpy(dtype='datetime64[ns]')
+    )
+    ticker_codes = pd.Index(tickers).get_indexer(df_prices['ticker'])
+    is_used = (date_codes < dates.shape[0]) & (ticker_codes >= 0)
+    return _asof_matrix(
+        ticker_codes[is_used],
+        date_codes[is_used],
+        df_prices['price'].to_numpy(dtype='float64')[is_used],
+        dates.shape[0],
+        tickers.shape[0],
+    )
@@ -1,312 +1,301 @@
-from collections import deque
-from typing import Any, List
+from __future__ import annotations
 
-import pandas as pd
-from flask import Blueprint, request, render_template
+import datetime as dt
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+
+from flask import Blueprint, current_app, request, render_template
 from flask_login import login_required, current_user
+from sqlalchemy.sql.elements import BinaryExpression
 
+from portfolio_builder.lazy import lazy_import
 from portfolio_builder.public.models import (
-    Watchlist, WatchlistItem, Security, Price,
-    PriceMgr, WatchlistMgr, WatchlistItemMgr
+    PortfolioValue, Watchlist, WatchlistItem, Security,
+    PortfolioValueMgr, PositionMgr, PriceMgr, WatchlistMgr, WatchlistItemMgr
+)
+from portfolio_builder.public.portfolio import (
+    calc_portf_positions, calc_portf_flows_adjusted,
+    calc_daily_values, calc_last_portf_val, calc_last_portf_position,
+    calc_last_valuations, calc_portf_returns, calc_watchlists_overview,
+    RETURN_SERIES
+)
+from portfolio_builder.public.covariance import get_covariance
+from portfolio_builder.public.risk import (
+    RiskInputs, calc_risk_metrics, get_risk_metrics, risk_to_df
+)
+from portfolio_builder.public.valuation import (
+    price_matrix, valuation_matrix, valuation_to_df
 )
 
 
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+
+
 bp = Blueprint('dashboard', __name__)
 
 
-def calc_fifo(df: pd.DataFrame) -> pd.DataFrame:
-    df2 = (
-        df
-        .loc[:, ['ticker', 'date']]
-        .assign(net_quantity=0, realized_pnl=0.0)
+def _trade_history(filters: List[BinaryExpression]) -> pd.DataFrame:
+    df_trade_history = (
+        WatchlistItemMgr
+        .get_items(
+            filters=filters,
+            entities=[
+                WatchlistItem.ticker,
+                WatchlistItem.quantity,
+                WatchlistItem.price,
+                WatchlistItem.side,
+                WatchlistItem.trade_date.label("date")
+            ],
+            orderby=[
+                WatchlistItem.ticker,
+                WatchlistItem.trade_date,
+                WatchlistItem.id,
+            ]
+        )
+        .astype({'date': 'datetime64[ns]'})
     )
-    net_quantity = 0
-    realized_pnl = 0
-    inventory = deque()  # Queue to track the inventory of stocks
-    for idx, row in df.iterrows():
-        if row['side'] == 'buy':
-            inventory.append({
-                'quantity': row['quantity'],
-                'price': row['price']
-            })
-            net_quantity += row['quantity']
-        else:
-            last_sold_qty = row['quantity']
-            last_sold_price = row['price']
-            remaining_qty = last_sold_qty
-            while remaining_qty > 0 and inventory:
-                first_item = next(iter(inventory))
-                first_purchase_qty = first_item['quantity']
-                first_purchase_price = first_item['price']
-                if first_purchase_qty >= remaining_qty:
-                    # The selling quantity is entirely covered by the earliest buying transaction
-                    realized_pnl += remaining_qty * (
-                        last_sold_price - first_purchase_price
-                    )
-                    first_item['quantity'] = first_purchase_qty - remaining_qty
-                    net_quantity -= remaining_qty
-                    remaining_qty = 0
-                else:
-                    # The selling quantity exceeds the earliest buying transaction
-                    realized_pnl += first_purchase_qty * (
-                        last_sold_price - first_purchase_price
-                    )
-                    remaining_qty -= first_purchase_qty
-                    net_quantity -= first_purchase_qty
-                    inventory.popleft()
-        df2.at[idx, 'net_quantity'] = net_quantity
-        df2.at[idx, 'realized_pnl'] = realized_pnl
-    return df2
+    return df_trade_history
 
 
-def calc_portf_positions(df: pd.DataFrame) -> pd.DataFrame:
-    dfs_by_ticker = []
-    for ticker in df['ticker'].unique():
-        df_temp = calc_fifo(df[lambda x: x['ticker'] == ticker])
-        dfs_by_ticker.append(df_temp)
-    df_positions = pd.concat(dfs_by_ticker)
-    return df_positions
+def _calc_positions(df_trade_history: pd.DataFrame) -> pd.DataFrame:
+    return calc_portf_positions(
+        df_trade_history,
+        max_workers=current_app.config['POSITIONS_MAX_WORKERS'],
+        min_parallel_trades=current_app.config['POSITIONS_MIN_PARALLEL_TRADES'],
+    )
 
 
-def calc_portf_valuations(
-    df_portf_pos: pd.DataFrame,
-    df_prices: pd.DataFrame
-) -> pd.DataFrame:
-    """
-    Combines the position breakdown with the daily prices to calculate
-    daily market value. The Daily market value is the positions quantity
-    multiplied by the market price.
-    """
-    df_portf_val = (
-        pd
-        .merge(df_portf_pos, df_prices, on=['ticker', 'date'], how='outer')
-        .astype({
-            'net_quantity': 'float64',
-            'price': 'float64',
-        })
-        .sort_values(by=['ticker', 'date'])
-        .fillna(method='ffill')
-        .assign(market_val=lambda x: x['net_quantity'] * x['price'])
-        .round({'market_val': 3})
-        .loc[:, ['date', 'ticker', 'market_val']]
-        .pivot_table(
-            index='date',
-            columns='ticker',
-            values='market_val',
-        )
+def _load_prices(df_trade_history: pd.DataFrame) -> pd.DataFrame:
+    return PriceMgr.get_prices(
+        df_trade_history['ticker'].unique().tolist(),
+        df_trade_history['date'].dt.date.min(),
     )
-    return df_portf_val
-
 
-def calc_portf_flows_adjusted(df_flows: pd.DataFrame) -> pd.DataFrame:
-    """
-    Using the Holding Period Return (HPR) methodology. Purchases of
-    securities are accounted as fund inflows and the sale of securities are
-    accounted as increases in cash.
 
-    By creating the cumulative sum of these values we can maintain an
-    accurate calculation of the HPR which can be distorted as purchases and
-    sells are added to the trades.
-    """
-    df_flows_adj = (
-        df_flows
-        .assign(
-            inflows=lambda x: x.loc[x['flows'] > 0, 'flows'].cumsum(),
-            cash=lambda x: x.loc[x['flows'] <= 0, 'flows'].abs().cumsum(),
-        )
-        .set_index("date")
-        .assign(cash=lambda x: x['cash'].ffill())
-        .fillna(0)
-        .drop(columns=['flows'])
+def _traded_tickers(filters: List[BinaryExpression]) -> List[str]:
+    df_tickers = WatchlistItemMgr.get_items(
+        filters=filters,
+        entities=[WatchlistItem.ticker],
+        orderby=[WatchlistItem.ticker],
     )
-    return df_flows_adj
+    return df_tickers['ticker'].unique().tolist()
 
 
-def calc_portf_hpr(
-    df_portf_val: pd.DataFrame,
-    df_portf_flows: pd.DataFrame
-) -> List[tuple[Any, ...]]:
+def _risk_inputs(
+    df_daily_values: pd.DataFrame,
+    tickers: List[str],
+    after: Optional[dt.date] = None,
+    df_prices: Optional[pd.DataFrame] = None,
+) -> RiskInputs:
     """
-    Where PortVal = Portfolio Value. The Formula for the Daily
-    Holding Period Return (HPR) is calculated as follows:
-    (Ending PortVal) / (Previous PortVal After Cash Flow) – 1.
-
-    1. Add the cash from the sale of securities to the portfolio value.
-    2. shift the total portfolio value column to allow us to easily
-        caclulate the Percentage change before and after each cash flow.
-    Returns a named tuple of daily HPR % changes.
+    Risk inputs of a watchlist from its date indexed daily values, on
+    the dates after 'after' or on all of them. The prices of 'tickers'
+    are loaded from the first of those dates unless they're given.
     """
-    df_portf_val_filtered = (
-        df_portf_val
-        .assign(portf_val=lambda x: x.sum(axis=1))
-        .loc[:, ['portf_val']]
-    )
-    df_portf_hpr = (
-        pd
-        .merge(
-            df_portf_val_filtered,
-            df_portf_flows,
-            left_index=True,
-            right_index=True,
-            how='left'
-        )
-        .assign(cash=lambda x: x['cash'].ffill())
-        .fillna(0)
-        .assign(
-            total_portf_val=lambda x: x["portf_val"] + x["cash"]
-        )
-        .assign(
-            total_portf_val_prev=lambda x: x['total_portf_val'].shift(1)
-        )
-        .assign(
-            pct_change=lambda x: (
-                (
-                    x["total_portf_val"] /
-                    (x["total_portf_val_prev"] + x["inflows"])
-                ) - 1
-            ) * 100
-        )
-        .round({'pct_change': 3})
-        .fillna({'pct_change': 0.0})
-        .loc[:, ['pct_change']]
-        .reset_index()
+    if after is not None:
+        df_daily_values = df_daily_values.loc[
+            df_daily_values.index > pd.Timestamp(after)
+        ]
+    dates = df_daily_values.index.to_numpy(dtype='datetime64[ns]')
+    if df_prices is None:
+        df_prices = pd.DataFrame(columns=['ticker', 'date', 'price'])
+        if dates.shape[0]:
+            df_prices = PriceMgr.get_prices(
+                tickers, df_daily_values.index[0].date()
+            )
+    risk_tickers = np.asarray(tickers, dtype=object)
+    return RiskInputs(
+        dates=dates,
+        tickers=risk_tickers,
+        prices=price_matrix(df_prices, dates, risk_tickers),
+        portf_returns=df_daily_values['hpr'].to_numpy(dtype='float64') / 100,
     )
-    return list(df_portf_hpr.itertuples(index=False))
 
 
-def calc_last_portf_val(
-    df_portf_val: pd.DataFrame,
-    no_assets: int = 10
-) -> List[tuple[Any, ...]]:
+def _calc_from_trades(
+    filters: List[BinaryExpression]
+) -> Tuple[
+    List[tuple[Any, ...]], List[tuple[Any, ...]], pd.DataFrame, RiskInputs
+]:
     """
-    Returns a named tuple of the largest positions by absolute exposure
-    in descending order. For the portfolios that contain more than 6
-    positions the next n positons are aggregated to and classified
-    as 'Other'
+    Computes the position summary, the daily HPR and the valuations of
+    a watchlist from its trade history, for watchlists without stored
+    positions or daily values. Like the stored ones, they run up to the
+    last stored price. The inputs of the risk metrics are returned as
+    well.
     """
-    if df_portf_val.empty:
-        return list(df_portf_val.itertuples(index=False))
-    df_initial = (
-        df_portf_val
-        .sort_index()
-        .tail(1)
-        .T
-        .set_axis(['market_val'], axis=1)
-        .reset_index()
-        .assign(
-            market_val_pct=lambda x:
-                (x["market_val"] / x["market_val"].sum()) * 100
-        )
-        .round({'market_val_pct': 2})
-        .sort_values(by=['market_val_pct'], ascending=False)
+    df_trade_history = _trade_history(filters)
+    df_portf_pos = _calc_positions(df_trade_history)
+    df_prices = _load_prices(df_trade_history)
+    df_portf_val = valuation_to_df(valuation_matrix(df_portf_pos, df_prices))
+    df_portf_flows = (
+        WatchlistItemMgr
+        .get_grouped_items(filters=filters)
+        .astype({'date': 'datetime64[ns]'})
     )
-    max_no_assets = df_initial.shape[0]
-    if no_assets > max_no_assets:
-        return list(df_initial.itertuples(index=False))
-    else:
-        df_top = df_initial.head(no_assets)
-        df_bottom = (
-            df_initial
-            .tail(max_no_assets - no_assets)
-            .pivot_table(
-                index='ticker',
-                margins=True,
-                margins_name='Other',  # defaults to 'All'
-                aggfunc='sum'
-            )
-            .reset_index()
-            .tail(1)
-        )
-        df_final = pd.concat([df_top, df_bottom])
-        return list(df_final.itertuples(index=False))
-
-
-def calc_last_portf_position(
-    df_portf_pos: pd.DataFrame,
-    no_assets: int = 10
-) -> List[tuple[Any, ...]]:
-    if df_portf_pos.empty:
-        return list(df_portf_pos.itertuples(index=False))
-    last_portf_pos = list(
-        df_portf_pos
-        .loc[lambda x: x.groupby('ticker')['date'].idxmax()]
-        .drop(['date'], axis=1)
+    df_daily_values = calc_daily_values(
+        df_portf_val, calc_portf_flows_adjusted(df_portf_flows)
+    )
+    df_portf_hpr = list(
+        calc_portf_returns(df_daily_values)
+        .round(3)
+        .reset_index()
         .itertuples(index=False)
     )
-    max_no_assets = len(last_portf_pos)
-    if max_no_assets > no_assets:
-        return last_portf_pos[:no_assets]
-    return last_portf_pos
+    df_portf_pos_summary = calc_last_portf_position(df_portf_pos)
+    risk_inputs = _risk_inputs(
+        df_daily_values,
+        df_trade_history['ticker'].unique().tolist(),
+        df_prices=df_prices,
+    )
+    return df_portf_pos_summary, df_portf_hpr, df_portf_val, risk_inputs
 
 
 @bp.route('/', methods=['GET', 'POST'])
 @login_required
 def index() -> str:
-    df_watch_names = WatchlistMgr.get_items(filters=[
-        Watchlist.user_id == current_user.id  # type: ignore
-    ])
+    df_watch_names = WatchlistMgr.get_items(
+        filters=[Watchlist.user_id == current_user.id],  # type: ignore
+        entities=[Watchlist.id, Watchlist.name, Watchlist.values_stale_from],
+    )
     watch_names = df_watch_names.loc[:, 'name'].to_list()
     if request.method == 'POST':
         curr_watch_name = request.form.get('watchlist_group_selection', '')
     else:
         curr_watch_name = next(iter(watch_names), '')
-    df_trade_history = (
-        WatchlistItemMgr
-        .get_items(
-            filters=[
-                Watchlist.user_id == current_user.id,  # type: ignore
-                Watchlist.name == curr_watch_name,
-            ],
-            entities=[
-                WatchlistItem.ticker,
-                WatchlistItem.quantity,
-                WatchlistItem.price,
-                WatchlistItem.side,
-                WatchlistItem.trade_date.label("date")
-            ],
-            orderby=[WatchlistItem.ticker, WatchlistItem.trade_date]
-        )
-        .astype({'date': 'datetime64[ns]'})
-     )
-    tickers = df_trade_history['ticker'].unique()
-    min_date = df_trade_history['date'].dt.date.min()
-    max_date = df_trade_history['date'].dt.date.max()
-    df_prices = (
-        PriceMgr
+    line_series = request.values.get('line_series', 'pct_change')
+    if line_series not in RETURN_SERIES:
+        line_series = 'pct_change'
+    filters = [
+        Watchlist.user_id == current_user.id,  # type: ignore
+        Watchlist.name == curr_watch_name,
+    ]
+    curr_watch = df_watch_names.loc[df_watch_names['name'] == curr_watch_name]
+    df_positions = PositionMgr.get_items(filters=filters)
+    df_daily_values = (
+        PortfolioValueMgr
         .get_items(
-            filters=[
-                Security.ticker.in_(tickers),
-                Price.date.between(min_date, max_date)
-            ],
-            entities=[
-                Security.ticker, 
-                Price.date, 
-                Price.close_price.label('price'),
-            ],
-            orderby=[Security.ticker, Price.date]
+            filters=filters,
+            entities=[PortfolioValue.date, PortfolioValue.hpr]
         )
         .astype({'date': 'datetime64[ns]'})
+        .set_index('date')
     )
-    df_portf_pos = calc_portf_positions(df_trade_history)
-    df_portf_val = calc_portf_valuations(df_portf_pos, df_prices)
-    df_portf_flows = (
-        WatchlistItemMgr
-        .get_grouped_items(filters=[
-            Watchlist.user_id == current_user.id,  # type: ignore
-            Watchlist.name == curr_watch_name
+    # Daily values made stale by a trade edit are recomputed by the
+    # worker, until then the watchlist is valued from its trades.
+    is_stale = curr_watch['values_stale_from'].notna().any()
+    risk_inputs: Optional[RiskInputs] = None
+    if df_positions.empty or df_daily_values.empty or is_stale:
+        df_portf_pos_summary, df_portf_hpr, df_portf_val, risk_inputs = (
+            _calc_from_trades(filters)
+        )
+    else:
+        df_portf_pos_summary = list(
+            df_positions.head(10).itertuples(index=False)
+        )
+        df_portf_hpr = list(
+            calc_portf_returns(df_daily_values)
+            .round(3)
+            .reset_index()
+            .itertuples(index=False)
+        )
+        df_last_prices = PriceMgr.get_last_items(filters=[
+            Security.ticker.in_(df_positions['ticker'].to_list())
         ])
-        .astype({'date': 'datetime64[ns]'})
-    )
-    df_portf_flows_adj = calc_portf_flows_adjusted(df_portf_flows)
-    df_portf_hpr = calc_portf_hpr(df_portf_val, df_portf_flows_adj)
-    df_portf_pos_summary = calc_last_portf_position(df_portf_pos)
+        df_portf_val = calc_last_valuations(df_positions, df_last_prices)
     df_portf_val_summary = calc_last_portf_val(df_portf_val)
+    risk_summary = []
+    watch_ids = curr_watch['id']
+    if df_portf_hpr and not watch_ids.empty:
+        if risk_inputs is not None:
+            risk_metrics = calc_risk_metrics(risk_inputs)
+        else:
+            # Only the dates after the cached ones are loaded, the
+            # portfolio returns are the stored daily HPR.
+            tickers = _traded_tickers(filters)
+            risk_metrics = get_risk_metrics(
+                int(watch_ids.iloc[0]),
+                WatchlistItemMgr.get_data_version(filters=filters),
+                PriceMgr.get_price_versions(tickers),
+                lambda after: _risk_inputs(df_daily_values, tickers, after),
+            )
+        risk_summary = list(
+            risk_to_df(risk_metrics)
+            .iloc[::-1]
+            .round(3)
+            .reset_index()
+            .itertuples(index=False)
+        )
+    corr_tickers = []
+    corr_rows = []
+    if not df_portf_val.empty:
+        corr_tickers = sorted(df_portf_val.columns)
+        correlation = get_covariance(corr_tickers).correlation.round(2)
+        corr_rows = [
+            (ticker, row.tolist())
+            for ticker, row in zip(corr_tickers, correlation)
+        ]
     return render_template(
         'public/dashboard.html',
         summary=df_portf_pos_summary,
         line_chart=df_portf_hpr,
+        line_series=line_series,
+        line_series_names=RETURN_SERIES,
         pie_chart=df_portf_val_summary,
         bar_chart=df_portf_val_summary,
+        risk_summary=risk_summary,
+        corr_tickers=corr_tickers,
+        corr_rows=corr_rows,
         watch_names=watch_names,
         curr_watch_name=curr_watch_name,
     )
+
+
+@bp.route('/overview', methods=['GET'])
+@login_required
+def overview() -> str:
+    """
+    Renders the summary of every watchlist of the user, computed from
+    one query of their trades and one query of their tickers' prices.
+    """
+    df_trades = (
+        WatchlistItemMgr
+        .get_items(
+            filters=[Watchlist.user_id == current_user.id],  # type: ignore
+            entities=[
+                Watchlist.name.label('watchlist'),
+                WatchlistItem.ticker,
+                WatchlistItem.quantity,
+                WatchlistItem.price,
+                WatchlistItem.side,
+                WatchlistItem.trade_date.label("date")
+            ],
+            orderby=[
+                Watchlist.name,
+                WatchlistItem.ticker,
+                WatchlistItem.trade_date,
+                WatchlistItem.id,
+            ]
+        )
+        .astype({'date': 'datetime64[ns]'})
+    )
+    df_prices = pd.DataFrame(columns=['ticker', 'date', 'price'])
+    if not df_trades.empty:
+        df_prices = PriceMgr.get_prices(
+            df_trades['ticker'].unique().tolist(),
+            df_trades['date'].dt.date.min(),
+        )
+    df_overview = calc_watchlists_overview(
+        df_trades,
+        df_prices.astype({'date': 'datetime64[ns]'}),
+        max_workers=current_app.config['POSITIONS_MAX_WORKERS'],
+        min_parallel_trades=current_app.config['POSITIONS_MIN_PARALLEL_TRADES'],
+    )
+    return render_template(
+        'public/overview.html',
+        overview=list(df_overview.itertuples(index=False)),
+    )
@@ -1,20 +1,27 @@
 import datetime as dt
 
-from flask import Blueprint, flash, redirect, render_template, url_for
+from flask import (
+    Blueprint, flash, jsonify, redirect, render_template, url_for
+)
 from werkzeug.wrappers.response import Response
 from flask_login import current_user, login_required
 from flask_wtf import FlaskForm
+from sqlalchemy.sql import func
 
-from portfolio_builder import db, scheduler
+from portfolio_builder import db
 from portfolio_builder.public.forms import (
     AddWatchlistForm, SelectWatchlistForm,
     AddItemForm, UpdateItemForm
 )
+from portfolio_builder.public.backfill_queue import (
+    enqueue_backfill, get_backfill_status
+)
+from portfolio_builder.public.daily_values import mark_daily_values_stale
 from portfolio_builder.public.models import (
-    Watchlist, WatchlistItem,
+    Security, Watchlist, WatchlistItem,
     SecurityMgr, WatchlistMgr, WatchlistItemMgr
 )
-from portfolio_builder.public.tasks import load_prices_ticker
+from portfolio_builder.public.positions import apply_trade, delete_position
 
 
 bp = Blueprint("watchlist", __name__, url_prefix="/watchlist")
@@ -66,7 +73,7 @@ def index() -> str:
     )
     securities = list(
         SecurityMgr
-        .get_items(filters=[db.literal(True)])
+        .get_items(filters=[Security.delisted_date.is_(None)])
         .itertuples(index=False)
     )
     return render_template(
@@ -169,15 +176,13 @@ def add(watch_name: str) -> Response:
                 watchlist_id=watchlist.id
             )
             db.session.add(item)
+            apply_trade(item)
             db.session.commit()
+            mark_daily_values_stale(item.watchlist_id, item.trade_date)
             flash(
                 f"The ticker '{item.ticker}' has been added to the watchlist."
             )
-            scheduler.add_job(
-                id='add_db_last100day_prices',
-                func=load_prices_ticker,
-                args=[item.ticker],
-            )  # task executes only once, immediately.
+            enqueue_backfill(item.ticker)
     elif form.errors:
         flash_errors(form)
     return redirect(url_for("watchlist.index"))
@@ -219,7 +224,9 @@ def update(watch_name: str, ticker: str) -> Response:
                 watchlist_id=last_item.watchlist_id
             )
             db.session.add_all([last_item, new_item])
+            apply_trade(new_item)
             db.session.commit()
+            mark_daily_values_stale(new_item.watchlist_id, new_item.trade_date)
             flash(f"The ticker '{new_item.ticker}' has been updated.")
     elif form.errors:
         flash_errors(form)
@@ -245,7 +252,7 @@ def delete(watch_name: str, ticker: str) -> Response:
             Watchlist.name == watch_name,
             WatchlistItem.ticker == ticker,
         ],
-        entities=[WatchlistItem.id]
+        entities=[WatchlistItem.id, WatchlistItem.watchlist_id]
     )
     if df_ids.empty:
         flash(
@@ -254,6 +261,13 @@ def delete(watch_name: str, ticker: str) -> Response:
         )
     else:
         IDs = df_ids.loc[:, 'id'].to_list()
+        first_trade_date = (
+            db
+            .session
+            .query(func.min(WatchlistItem.trade_date))
+            .filter(WatchlistItem.id.in_(IDs))
+            .scalar()
+        )
         _ = (
             db
             .session
@@ -261,9 +275,37 @@ def delete(watch_name: str, ticker: str) -> Response:
             .filter(WatchlistItem.id.in_(IDs))
             .delete()
         )
+        watchlist_id = int(df_ids.loc[0, 'watchlist_id'])
+        delete_position(watchlist_id, ticker)
         db.session.commit()
+        mark_daily_values_stale(watchlist_id, first_trade_date)
         flash(
             f"The items of ticker '{ticker}' have been deleted " +
             f"from watchlist '{watch_name}'."
         )
     return redirect(url_for('watchlist.index'))
+
+
+@bp.route('/backfill/<ticker>', methods=['GET'])
+@login_required
+def backfill_status(ticker: str) -> Response:
+    """
+    Reports the state of the price backfill of a ticker, so the page
+    can show when its prices are ready.
+
+    Args:
+        ticker (str): The ticker symbol added to a watchlist.
+
+    Returns:
+        Response: A JSON response with the ticker and its backfill status,
+        404 if no backfill was ever requested for it.
+    """
+    job = get_backfill_status(ticker)
+    if job is None:
+        return jsonify({'ticker': ticker, 'status': None}), 404  # type: ignore
+    return jsonify({
+        'ticker': job.ticker,
+        'status': job.status,
+        'error': job.error,
+        'updated': job.updated_timestamp.isoformat(),
+    })
@@ -0,0 +1,73 @@
+"""
+Background worker running the scheduled jobs, started with `flask worker`.
+
+The web processes don't run the scheduler or import the ingestion
+dependencies, they only record work, like backfill jobs or daily
+values made stale by trade edits, that the worker picks up. Several workers can run side by side, the job leases
+keep each job to one of them at a time.
+"""
+import datetime as dt
+import logging
+import signal
+import threading
+
+from flask import Flask
+
+from portfolio_builder import scheduler
+from portfolio_builder.public.backfill_queue import (
+    JOB_ID as BACKFILL_JOB_ID, process_backfill_queue
+)
+from portfolio_builder.public.daily_values import (
+    JOB_ID as DAILY_VALUES_JOB_ID, process_stale_daily_values
+)
+from portfolio_builder.public.tasks import (
+    load_prices_all_tickers, refresh_securities
+)
+
+
+def register_jobs(app: Flask) -> None:
+    scheduler.add_job(
+        id='sync_securities',
+        func=refresh_securities,
+        trigger='interval',
+        start_date=dt.datetime.combine(
+            dt.date.today() + dt.timedelta(days=1),
+            dt.time(0, 30)
+        ),
+        days=1,
+    )  # refreshes the securities every day at 0:30, before the prices.
+    scheduler.add_job(
+        id='update_db_last_prices',
+        func=load_prices_all_tickers,
+        trigger='interval',
+        start_date=dt.datetime.combine(
+            dt.date.today() + dt.timedelta(days=1),
+            dt.time(1, 0)
+        ),
+        days=1,
+    )  # task executes periodically, every day at 1am, starting tomorrow.
+    scheduler.add_job(
+        id=BACKFILL_JOB_ID,
+        func=process_backfill_queue,
+        trigger='interval',
+        seconds=app.config['BACKFILL_COALESCE_SECONDS'],
+    )  # polls the backfill queue, tickers added in between share a run.
+    scheduler.add_job(
+        id=DAILY_VALUES_JOB_ID,
+        func=process_stale_daily_values,
+        trigger='interval',
+        seconds=app.config['DAILY_VALUES_REFRESH_SECONDS'],
+    )  # recomputes the daily values made stale by trade edits.
+
+
+def run_worker(app: Flask) -> None:
+    """Runs the scheduled jobs until SIGINT or SIGTERM."""
+    stopped = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stopped.set())
+    register_jobs(app)
+    scheduler.start()
+    logging.info("Worker started.")
+    stopped.wait()
+    logging.info("Worker stopping, waiting for running jobs.")
+    scheduler.shutdown()
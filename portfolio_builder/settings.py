@@ -17,9 +17,78 @@ class Settings:
     API_KEY_TIINGO = os.environ.get('API_KEY_TIINGO')
     API_KEY_EODHD = os.environ.get('API_KEY_EODHD')
 
+    # Provider addresses, the real APIs if not set. They can point at
+    # the local stand-in in benchmarks.fake_provider.
+    EODHD_BASE_URL = os.environ.get('EODHD_BASE_URL')
+    TIINGO_BASE_URL = os.environ.get('TIINGO_BASE_URL')
+    TIINGO_TICKERS_URL = os.environ.get('TIINGO_TICKERS_URL')
+
+    # Market data HTTP client, shared by every provider request
+    PROVIDER_MAX_CONNECTIONS = int(
+        os.environ.get('PROVIDER_MAX_CONNECTIONS') or 8
+    )  # per host
+    PROVIDER_CONNECT_TIMEOUT = 10.0  # seconds
+    PROVIDER_READ_TIMEOUT = 60.0
+
+    # Price provider requests
+    TIINGO_MAX_WORKERS = int(os.environ.get('TIINGO_MAX_WORKERS') or 8)
+    TIINGO_REQUESTS_PER_HOUR = int(
+        os.environ.get('TIINGO_REQUESTS_PER_HOUR') or 10000
+    )
+    TIINGO_MAX_RETRIES = 3
+    TIINGO_RETRY_BACKOFF = 1.0  # seconds, doubled on each retry
+    # init-db price loads: tickers per checkpointed batch, and batches
+    # fetched at once
+    BOOTSTRAP_BATCH_SIZE = int(os.environ.get('BOOTSTRAP_BATCH_SIZE') or 50)
+    BOOTSTRAP_MAX_WORKERS = int(os.environ.get('BOOTSTRAP_MAX_WORKERS') or 4)
+    # Nightly update from the EODHD exchange-wide end-of-day files, one
+    # request per exchange instead of one per ticker
+    NIGHTLY_BULK_EOD = os.environ.get('NIGHTLY_BULK_EOD', '') == '1'
+
     # Database Configurations
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Portfolio calculations
+    POSITIONS_MAX_WORKERS = int(os.environ.get('POSITIONS_MAX_WORKERS') or 1)
+    POSITIONS_MIN_PARALLEL_TRADES = 50000
+
+    # Columnar price files read before the prices table, disabled if empty
+    PRICE_STORE_DIR = (
+        os.environ.get('PRICE_STORE_DIR') or
+        os.path.join(ROOT_DIR, 'price-store')
+    )
+    # Provider symbol lists kept on disk as parsed frames, disabled if
+    # empty. Revalidated with the provider once older than the TTL.
+    HTTP_CACHE_DIR = (
+        os.environ.get('HTTP_CACHE_DIR') or
+        os.path.join(ROOT_DIR, 'http-cache')
+    )
+    HTTP_CACHE_TTL = int(
+        os.environ.get('HTTP_CACHE_TTL') or 24 * 3600
+    )  # seconds
+    # Rows per multi-row INSERT when loading prices
+    PRICES_UPSERT_BATCH_SIZE = int(
+        os.environ.get('PRICES_UPSERT_BATCH_SIZE') or 1000
+    )
+    # Size of the in-process price cache, disabled if 0
+    PRICE_CACHE_MAX_BYTES = int(
+        os.environ.get('PRICE_CACHE_MAX_BYTES') or 64 * 2**20
+    )
+    # Seconds between worker polls of the new-ticker backfill queue
+    BACKFILL_COALESCE_SECONDS = int(
+        os.environ.get('BACKFILL_COALESCE_SECONDS') or 5
+    )
+    # Seconds between worker polls of the watchlists with stale daily values
+    DAILY_VALUES_REFRESH_SECONDS = int(
+        os.environ.get('DAILY_VALUES_REFRESH_SECONDS') or 5
+    )
+    # Seconds a scheduled job's lease outlives its last renewal
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS') or 300)
+    # Import time of create_app allowed by the startup budget test
+    IMPORT_TIME_BUDGET_MS = int(
+        os.environ.get('IMPORT_TIME_BUDGET_MS') or 1000
+    )
+
 
 class DevSettings(Settings):
     DEBUG = True
@@ -36,6 +105,9 @@ class TestSettings(Settings):
         'sqlite://'
     )
     WTF_CSRF_ENABLED = False
+    PRICE_STORE_DIR = os.environ.get('TEST_PRICE_STORE_DIR')
+    HTTP_CACHE_DIR = os.environ.get('TEST_HTTP_CACHE_DIR')
+    PRICE_CACHE_MAX_BYTES = 0
 
 
 class ProdSettings(Settings):
@@ -19,7 +19,8 @@ def app():
     yield _app
 
     ctx.pop()
-    _sched.shutdown(wait=False)
+    if _sched.running:
+        _sched.shutdown(wait=False)
 
 
 @pytest.fixture(scope='module')
@@ -0,0 +1,111 @@
+import datetime as dt
+
+import pytest
+
+from portfolio_builder.public import tasks
+from portfolio_builder.public.backfill import FetchRequest, plan_backfill
+from portfolio_builder.public.models import (
+    Price, Security, Watchlist, WatchlistItem
+)
+
+
+END_DATE = dt.date(2023, 10, 20)  # Friday
+
+
+@pytest.fixture(scope='function')
+def holdings(db):
+    watchlists = [
+        Watchlist(name="Technology", user_id=1),
+        Watchlist(name="Retail", user_id=1),
+    ]
+    db.session.add_all(watchlists)
+    db.session.flush()
+    trades = [
+        # ticker, watchlist, trade date
+        ('AAPL', 0, dt.date(2023, 10, 2)),
+        ('AAPL', 1, dt.date(2023, 9, 25)),
+        ('MSFT', 0, dt.date(2023, 10, 2)),
+        ('AMZN', 1, dt.date(2023, 10, 9)),
+        ('NFLX', 1, dt.date(2023, 10, 9)),
+        ('META', 0, dt.date(2023, 10, 2)),
+    ]
+    db.session.add_all([
+        WatchlistItem(
+            ticker=ticker, quantity=1, price=100.0, side='buy',
+            trade_date=trade_date, watchlist_id=watchlists[pos].id,
+        )
+        for ticker, pos, trade_date in trades
+    ])
+    stored_ranges = {
+        # AAPL misses its first week and everything after the 13th
+        'AAPL': (dt.date(2023, 10, 2), dt.date(2023, 10, 13)),
+        # MSFT misses the same last week as AAPL
+        'MSFT': (dt.date(2023, 10, 2), dt.date(2023, 10, 13)),
+        # AMZN and META are up to date, up to a Friday
+        'AMZN': (dt.date(2023, 10, 9), END_DATE),
+        'META': (dt.date(2023, 10, 2), END_DATE),
+    }
+    for ticker, (start_date, end_date) in stored_ranges.items():
+        security = Security(name=ticker, ticker=ticker, exchange='NASDAQ')
+        db.session.add(security)
+        db.session.flush()
+        db.session.add_all([
+            Price(date=start_date, close_price=1.0, ticker_id=security.id),
+            Price(date=end_date, close_price=1.0, ticker_id=security.id),
+        ])
+    db.session.commit()
+    yield
+    db.session.query(Price).delete()
+    db.session.query(Security).delete()
+    db.session.query(WatchlistItem).delete()
+    db.session.query(Watchlist).delete()
+    db.session.commit()
+
+
+class TestPlanBackfill:
+
+    def test_plans_only_missing_ranges(self, holdings):
+        assert plan_backfill(end_date=END_DATE + dt.timedelta(days=2)) == [
+            FetchRequest(
+                ('AAPL',), dt.date(2023, 9, 25), dt.date(2023, 10, 1), False),
+            FetchRequest(
+                ('NFLX',), dt.date(2023, 10, 9), dt.date(2023, 10, 22), False),
+            FetchRequest(
+                ('AAPL', 'MSFT'), dt.date(2023, 10, 14), dt.date(2023, 10, 22),
+                True),
+        ]
+
+    def test_filters_tickers(self, holdings):
+        assert plan_backfill(['AMZN', 'MSFT'], END_DATE) == [
+            FetchRequest(
+                ('MSFT',), dt.date(2023, 10, 14), END_DATE, True),
+        ]
+
+    def test_weekend_only_gaps_are_skipped(self, holdings):
+        assert plan_backfill(
+            ['AMZN', 'META'], END_DATE + dt.timedelta(days=2)) == []
+
+
+    def test_single_day_requests(self):
+        monday = dt.date(2023, 10, 23)
+        after_weekend = FetchRequest(
+            ('AAPL',), END_DATE + dt.timedelta(days=1), monday, True)
+        whole_week = FetchRequest(
+            ('AAPL',), END_DATE - dt.timedelta(days=4), END_DATE, True)
+        assert after_weekend.is_single_day
+        assert not whole_week.is_single_day
+
+
+class TestBackfillPrices:
+
+    def test_loads_each_request_and_refreshes_history(self, holdings, mocker):
+        load_prices = mocker.patch.object(tasks, 'load_prices', return_value={})
+        refresh = mocker.patch.object(tasks, 'refresh_ticker_daily_values')
+        fetch_requests, failed_tickers = tasks.backfill_prices(end_date=END_DATE)
+        assert failed_tickers == {}
+        assert load_prices.call_count == len(fetch_requests) == 3
+        load_prices.assert_any_call(
+            ['AAPL', 'MSFT'], dt.date(2023, 10, 14), END_DATE)
+        assert [call.args[0] for call in refresh.call_args_list] == [
+            'AAPL', 'NFLX'
+        ]
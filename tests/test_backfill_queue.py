@@ -0,0 +1,94 @@
+import pytest
+
+from portfolio_builder.public import tasks
+from portfolio_builder.public.backfill_queue import (
+    DONE, FAILED, PENDING, enqueue_backfill, process_backfill_queue,
+    process_pending_backfills
+)
+from portfolio_builder.public.models import BackfillJob, JobLease
+from portfolio_builder.public.tasks import BackfillResult
+
+
+@pytest.fixture(scope='function')
+def queue(app, db):
+    yield
+    db.session.query(BackfillJob).delete()
+    db.session.query(JobLease).delete()
+    db.session.commit()
+    # Ids are reused by the next test, drop the deleted jobs from the session
+    db.session.expunge_all()
+
+
+class TestEnqueueBackfill:
+
+    def test_dedupes_pending_tickers(self, db, queue):
+        first = enqueue_backfill('AAPL')
+        second = enqueue_backfill('AAPL')
+        enqueue_backfill('MSFT')
+        assert first.id == second.id
+        assert db.session.query(BackfillJob).count() == 2
+
+
+class TestProcessPendingBackfills:
+
+    def test_coalesces_into_one_backfill(self, db, queue, mocker):
+        backfill_prices = mocker.patch.object(
+            tasks, 'backfill_prices', return_value=BackfillResult([], {}))
+        for ticker in ['MSFT', 'AAPL', 'MSFT']:
+            enqueue_backfill(ticker)
+        assert process_pending_backfills() == 2
+        backfill_prices.assert_called_once_with(['AAPL', 'MSFT'])
+        statuses = db.session.query(BackfillJob.status).all()
+        assert statuses == [(DONE,), (DONE,)]
+        assert process_pending_backfills() == 0
+
+    def test_poll_takes_lease_only_with_work(self, db, queue, mocker):
+        backfill_prices = mocker.patch.object(
+            tasks, 'backfill_prices', return_value=BackfillResult([], {}))
+        process_backfill_queue()
+        assert db.session.query(JobLease).count() == 0
+        enqueue_backfill('AAPL')
+        process_backfill_queue()
+        backfill_prices.assert_called_once_with(['AAPL'])
+        assert db.session.query(JobLease).count() == 1
+
+    def test_failures_are_recorded(self, db, queue, mocker):
+        mocker.patch.object(
+            tasks, 'backfill_prices',
+            side_effect=RuntimeError('provider down')
+        )
+        enqueue_backfill('AAPL')
+        process_pending_backfills()
+        job = db.session.query(BackfillJob).one()
+        assert (job.status, job.error) == (FAILED, 'provider down')
+        # A new request retries the ticker
+        assert enqueue_backfill('AAPL').status == PENDING
+
+    def test_tickers_without_prices_fail(self, db, queue, mocker):
+        mocker.patch.object(
+            tasks, 'backfill_prices',
+            return_value=BackfillResult([], {'MSFT': 'provider down'})
+        )
+        enqueue_backfill('AAPL')
+        enqueue_backfill('MSFT')
+        process_pending_backfills()
+        jobs = db.session.query(BackfillJob).order_by(BackfillJob.ticker).all()
+        assert [(job.ticker, job.status, job.error) for job in jobs] == [
+            ('AAPL', DONE, None),
+            ('MSFT', FAILED, 'provider down'),
+        ]
+
+
+class TestBackfillStatus:
+
+    @pytest.mark.usefixtures("login_required")
+    def test_reports_latest_job(self, client, queue, mocker):
+        mocker.patch.object(
+            tasks, 'backfill_prices', return_value=BackfillResult([], {}))
+        assert client.get('/watchlist/backfill/AAPL').status_code == 404
+        enqueue_backfill('AAPL')
+        assert client.get('/watchlist/backfill/AAPL').json['status'] == PENDING
+        process_pending_backfills()
+        response = client.get('/watchlist/backfill/AAPL')
+        assert response.status_code == 200
+        assert response.json['status'] == DONE
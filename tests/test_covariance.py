@@ -0,0 +1,120 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public import covariance
+from portfolio_builder.public.covariance import get_covariance
+from portfolio_builder.public.models import Price, PriceMgr, Security
+
+
+TICKERS = ('AAA', 'BBB', 'CCC', 'DDD')
+DATES = pd.bdate_range('2023-01-02', periods=80).date
+
+
+@pytest.fixture(scope='function')
+def prices(db):
+    rng = np.random.default_rng(13)
+    securities = [
+        Security(name=ticker, ticker=ticker, exchange='NYSE')
+        for ticker in TICKERS
+    ]
+    db.session.add_all(securities)
+    db.session.flush()
+    df_prices = pd.DataFrame(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.02, (DATES.size, 4)), axis=0)),
+        index=pd.Index(DATES, name='date'),
+        columns=list(TICKERS),
+    ).round(6)
+    # DDD starts trading later and misses a date
+    df_prices.loc[DATES[:30], 'DDD'] = np.nan
+    df_prices.loc[DATES[50], 'DDD'] = np.nan
+    db.session.add_all([
+        Price(date=date, close_price=price, ticker_id=security.id)
+        for security in securities
+        for date, price in df_prices[security.ticker].dropna().items()
+    ])
+    db.session.commit()
+    covariance._cache.clear()
+    yield df_prices
+    covariance._cache.clear()
+    db.session.query(Price).delete()
+    db.session.query(Security).delete()
+    db.session.commit()
+
+
+def _upsert(ticker, dates, prices):
+    security = Security.query.filter_by(ticker=ticker).one()
+    PriceMgr.upsert_items(pd.DataFrame({
+        'ticker_id': [security.id] * len(dates),
+        'date': list(dates),
+        'close_price': list(prices),
+    }))
+
+
+def _expected(df_prices, window, as_of):
+    df_returns = (
+        df_prices
+        .loc[:as_of]
+        .ffill()
+        .pct_change(fill_method=None)
+        .where(df_prices.loc[:as_of].notna())
+        .iloc[-window:]
+    )
+    return df_returns.cov(), df_returns.corr()
+
+
+class TestGetCovariance:
+
+    def test_matches_pairwise_pandas(self, prices):
+        result = get_covariance(TICKERS, window=40, as_of=DATES[-1])
+        df_cov, df_corr = _expected(prices, 40, DATES[-1])
+        np.testing.assert_allclose(result.covariance, df_cov, rtol=1e-9)
+        np.testing.assert_allclose(result.correlation, df_corr, rtol=1e-9)
+
+    def test_incremental_update_matches_full_build(self, prices):
+        get_covariance(TICKERS, window=40, as_of=DATES[60])
+        incremental = get_covariance(TICKERS, window=40, as_of=DATES[-1])
+        covariance._cache.clear()
+        full = get_covariance(TICKERS, window=40, as_of=DATES[-1])
+        np.testing.assert_allclose(incremental.covariance, full.covariance)
+        np.testing.assert_allclose(incremental.correlation, full.correlation)
+        np.testing.assert_array_equal(incremental.n_obs, full.n_obs)
+
+    def test_updates_cached_window_with_new_dates_only(self, prices, mocker):
+        get_covariance(TICKERS, window=40, as_of=DATES[60])
+        spy = mocker.spy(covariance, '_get_price_matrix')
+        get_covariance(TICKERS, window=40, as_of=DATES[61])
+        (_, start_date, end_date), _ = spy.call_args
+        assert (start_date, end_date) == (
+            DATES[60] + dt.timedelta(days=1), DATES[61]
+        )
+
+    def test_earlier_as_of_leaves_cache(self, prices):
+        get_covariance(TICKERS, window=40, as_of=DATES[-1])
+        earlier = get_covariance(TICKERS, window=40, as_of=DATES[60])
+        assert earlier.as_of == DATES[60]
+        assert covariance._cache[(TICKERS, 40)].as_of == DATES[-1]
+
+    def test_defaults_to_last_price_date(self, prices):
+        assert get_covariance(TICKERS, window=40).as_of == DATES[-1]
+
+    def test_prices_written_elsewhere_are_picked_up(self, prices, mocker):
+        get_covariance(TICKERS, window=40, as_of=DATES[-1])
+        # As written by the worker, which doesn't share this cache
+        _upsert('AAA', [DATES[70]], [prices.loc[DATES[70], 'AAA'] * 1.1])
+        _upsert('DDD', [DATES[50]], [prices.loc[DATES[49], 'DDD']])
+        result = get_covariance(TICKERS, window=40)
+        df_prices = prices.copy()
+        df_prices.loc[DATES[70], 'AAA'] *= 1.1
+        df_prices.loc[DATES[50], 'DDD'] = df_prices.loc[DATES[49], 'DDD']
+        df_cov, _ = _expected(df_prices, 40, DATES[-1])
+        np.testing.assert_allclose(result.covariance, df_cov, rtol=1e-6)
+
+        new_date = DATES[-1] + dt.timedelta(days=3)
+        for ticker in TICKERS:
+            _upsert(ticker, [new_date], [prices.loc[DATES[-1], ticker]])
+        spy = mocker.spy(covariance, '_build')
+        assert get_covariance(TICKERS, window=40).as_of == new_date
+        assert spy.call_count == 0
@@ -0,0 +1,170 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public.daily_values import (
+    mark_daily_values_stale, refresh_all_daily_values, refresh_daily_values,
+    refresh_stale_daily_values
+)
+from portfolio_builder.public.models import (
+    PortfolioValue, Price, Security, Watchlist, WatchlistItem
+)
+
+
+START_DATE = dt.date(2023, 10, 2)
+
+
+@pytest.fixture(scope='function')
+def watchlist(db):
+    rng = np.random.default_rng(11)
+    securities = [
+        Security(name=name, ticker=ticker, exchange='NASDAQ')
+        for name, ticker in [('Apple', 'AAPL'), ('Microsoft', 'MSFT')]
+    ]
+    db.session.add_all(securities)
+    db.session.flush()
+    db.session.add_all([
+        Price(
+            date=START_DATE + dt.timedelta(days=days),
+            close_price=round(float(price), 2),
+            ticker_id=security.id,
+        )
+        for security in securities
+        for days, price in enumerate(rng.uniform(90, 110, 20))
+    ])
+    watchlist = Watchlist(name="Technology", user_id=1)
+    db.session.add(watchlist)
+    db.session.flush()
+    trades = [
+        ('AAPL', 'buy', 10, 100.0, 0),
+        ('MSFT', 'buy', 5, 95.0, 2),
+        ('AAPL', 'sell', 4, 104.0, 5),
+        ('MSFT', 'buy', 3, 101.0, 9),
+        ('AAPL', 'sell', 6, 98.0, 14),
+    ]
+    db.session.add_all([
+        WatchlistItem(
+            ticker=ticker,
+            side=side,
+            quantity=quantity,
+            price=price,
+            trade_date=START_DATE + dt.timedelta(days=days),
+            watchlist_id=watchlist.id,
+        )
+        for ticker, side, quantity, price, days in trades
+    ])
+    db.session.commit()
+    yield watchlist
+    db.session.query(PortfolioValue).delete()
+    db.session.query(WatchlistItem).delete()
+    db.session.query(Watchlist).delete()
+    db.session.query(Price).delete()
+    db.session.query(Security).delete()
+    db.session.commit()
+
+
+def _get_daily_values(db, watchlist):
+    return pd.read_sql(
+        sql=(
+            db
+            .session
+            .query(
+                PortfolioValue.date,
+                PortfolioValue.market_val,
+                PortfolioValue.cash,
+                PortfolioValue.inflows,
+                PortfolioValue.hpr,
+            )
+            .filter(PortfolioValue.watchlist_id == watchlist.id)
+            .order_by(PortfolioValue.date)
+            .statement
+        ),
+        con=db.session.connection(),
+    )
+
+
+class TestRefreshDailyValues:
+
+    def test_full_refresh_covers_every_price_date(self, db, watchlist):
+        assert refresh_daily_values(watchlist.id) == 20
+        df_daily_values = _get_daily_values(db, watchlist)
+        assert df_daily_values['date'].iloc[0] == START_DATE
+        assert df_daily_values['hpr'].iloc[0] == 0.0
+        last_msft_price = (
+            db
+            .session
+            .query(Price.close_price)
+            .join(Security, onclause=(Price.ticker_id == Security.id))
+            .filter(Security.ticker == 'MSFT')
+            .order_by(Price.date.desc())
+            .first()
+        )[0]
+        # AAPL is sold out, its proceeds are carried as cash
+        assert df_daily_values['market_val'].iloc[-1] == pytest.approx(
+            8 * float(last_msft_price)
+        )
+        assert df_daily_values['cash'].iloc[-1] == pytest.approx(
+            4 * 104.0 + 6 * 98.0
+        )
+
+    def test_incremental_refresh_matches_full_refresh(self, db, watchlist):
+        refresh_daily_values(watchlist.id)
+        df_full = _get_daily_values(db, watchlist)
+        refresh_daily_values(watchlist.id, START_DATE + dt.timedelta(days=7))
+        df_incremental = _get_daily_values(db, watchlist)
+        pd.testing.assert_frame_equal(df_incremental, df_full)
+
+    def test_refresh_all_appends_missing_dates(self, db, watchlist):
+        refresh_daily_values(watchlist.id)
+        df_full = _get_daily_values(db, watchlist)
+        _ = (
+            db
+            .session
+            .query(PortfolioValue)
+            .filter(PortfolioValue.date > START_DATE + dt.timedelta(days=15))
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        assert refresh_all_daily_values() == 4
+        pd.testing.assert_frame_equal(_get_daily_values(db, watchlist), df_full)
+
+
+class TestRefreshStaleDailyValues:
+
+    def test_keeps_the_earliest_marked_date(self, db, watchlist):
+        for days in (9, 5, 12):
+            mark_daily_values_stale(
+                watchlist.id, START_DATE + dt.timedelta(days=days)
+            )
+        assert db.session.get(Watchlist, watchlist.id).values_stale_from == (
+            START_DATE + dt.timedelta(days=5)
+        )
+
+    def test_refreshes_from_the_marked_date(self, db, watchlist):
+        refresh_daily_values(watchlist.id)
+        trade_date = START_DATE + dt.timedelta(days=9)
+        db.session.add(WatchlistItem(
+            ticker='AAPL', side='buy', quantity=2, price=99.0,
+            trade_date=trade_date, watchlist_id=watchlist.id,
+        ))
+        db.session.commit()
+        mark_daily_values_stale(watchlist.id, trade_date)
+        assert refresh_stale_daily_values() == 11
+        assert db.session.get(Watchlist, watchlist.id).values_stale_from is None
+        df_stale_refresh = _get_daily_values(db, watchlist)
+        refresh_daily_values(watchlist.id)
+        pd.testing.assert_frame_equal(
+            df_stale_refresh, _get_daily_values(db, watchlist)
+        )
+        assert refresh_stale_daily_values() == 0
+
+    def test_drops_the_values_of_deleted_first_trades(self, db, watchlist):
+        refresh_daily_values(watchlist.id)
+        db.session.query(WatchlistItem).filter_by(ticker='AAPL').delete()
+        db.session.commit()
+        mark_daily_values_stale(watchlist.id, START_DATE)
+        refresh_stale_daily_values()
+        df_daily_values = _get_daily_values(db, watchlist)
+        assert df_daily_values['date'].iloc[0] == START_DATE + dt.timedelta(days=2)
@@ -0,0 +1,290 @@
+import datetime as dt
+import threading
+
+import pandas as pd
+import pytest
+from requests.exceptions import HTTPError
+
+from benchmarks.fake_provider import (
+    FakeProvider, base_urls, make_server
+)
+from portfolio_builder.public import price_store, tasks
+from portfolio_builder.public.backfill_queue import (
+    DONE, FAILED, enqueue_backfill, process_pending_backfills
+)
+from portfolio_builder.public.models import (
+    BackfillJob, BootstrapBatch, Price, Security, Watchlist, WatchlistItem
+)
+from portfolio_builder.public.tasks import (
+    EXCHANGES, backfill_prices, bootstrap_prices, get_bulk_prices_eodhd,
+    get_prices_tiingo, get_securities_eodhd, get_securities_tiingo,
+    load_prices, load_securities
+)
+
+
+END_DATE = dt.date(2023, 10, 20)
+
+
+def _serve(provider):
+    server = make_server(provider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture(scope='module')
+def provider():
+    return FakeProvider(20, 10, end_date=END_DATE)
+
+
+@pytest.fixture(scope='module')
+def urls(provider):
+    server = _serve(provider)
+    yield base_urls(server)
+    server.shutdown()
+
+
+@pytest.fixture(scope='module')
+def failing_urls():
+    server = _serve(FakeProvider(20, 10, end_date=END_DATE, error_rate=1.0))
+    yield base_urls(server)
+    server.shutdown()
+
+
+@pytest.fixture(scope='function')
+def app_urls(app, db, urls, monkeypatch):
+    for name, url in urls.items():
+        monkeypatch.setitem(app.config, name, url)
+    monkeypatch.setitem(app.config, 'API_KEY_TIINGO', 'key')
+    monkeypatch.setitem(app.config, 'API_KEY_EODHD', 'key')
+    yield urls
+    db.session.query(BootstrapBatch).delete()
+    db.session.query(BackfillJob).delete()
+    db.session.query(WatchlistItem).delete()
+    db.session.query(Watchlist).delete()
+    db.session.query(Price).delete()
+    db.session.query(Security).delete()
+    db.session.commit()
+
+
+class TestFakeProvider:
+
+    def test_serves_symbol_lists(self, urls):
+        df_eodhd = get_securities_eodhd('key', base_url=urls['EODHD_BASE_URL'])
+        df_tiingo = get_securities_tiingo(
+            'key', tickers_url=urls['TIINGO_TICKERS_URL'])
+        assert df_eodhd.shape[0] == df_tiingo.shape[0] == 20
+        assert df_eodhd['exchange'].isin(EXCHANGES).all()
+        assert (df_eodhd['asset_type'] == 'Stock').all()
+        assert df_eodhd['isin'].str.len().eq(12).all()
+
+    def test_symbol_lists_parse_in_chunks(self, urls, monkeypatch):
+        df_eodhd = get_securities_eodhd('key', base_url=urls['EODHD_BASE_URL'])
+        df_tiingo = get_securities_tiingo(
+            'key', tickers_url=urls['TIINGO_TICKERS_URL'])
+        monkeypatch.setattr(tasks, 'SECURITIES_CHUNK_ROWS', 3)
+        pd.testing.assert_frame_equal(
+            get_securities_eodhd('key', base_url=urls['EODHD_BASE_URL']),
+            df_eodhd,
+        )
+        pd.testing.assert_frame_equal(
+            get_securities_tiingo('key', tickers_url=urls['TIINGO_TICKERS_URL']),
+            df_tiingo,
+        )
+        assert (df_eodhd.dtypes[tasks.SECURITIES_CATEGORIES] == 'category').all()
+        assert (
+            df_tiingo.dtypes[['exchange', 'currency', 'asset_type']] == 'category'
+        ).all()
+
+    def test_prices_are_deterministic(self, urls):
+        ticker_ids = {'T00000': 1, 'T00007': 2}
+        fetch = lambda start_date: get_prices_tiingo(
+            'key', ticker_ids, start_date, END_DATE,
+            max_workers=2, base_url=urls['TIINGO_BASE_URL'],
+        )
+        df_all = fetch(dt.date(2023, 1, 1))
+        df_last = fetch(dt.date(2023, 10, 16))
+        assert df_all.groupby('ticker_id').size().tolist() == [10, 10]
+        assert df_all['date'].max() == END_DATE
+        assert df_last.shape[0] == 10
+        assert (
+            df_last.set_index(['ticker_id', 'date'])['close_price']
+            .equals(
+                df_all
+                .loc[lambda x: x['date'] >= dt.date(2023, 10, 16)]
+                .set_index(['ticker_id', 'date'])['close_price']
+            )
+        )
+
+    def test_serves_bulk_eod(self, urls):
+        df_bulk = get_bulk_prices_eodhd(
+            'key', dt.date(2023, 10, 19), base_url=urls['EODHD_BASE_URL'])
+        df_tiingo = get_prices_tiingo(
+            'key', {'T00003': 3}, dt.date(2023, 10, 19), dt.date(2023, 10, 19),
+            base_url=urls['TIINGO_BASE_URL'],
+        )
+        assert df_bulk.shape[0] == 20
+        assert (df_bulk['date'] == dt.date(2023, 10, 19)).all()
+        assert (
+            df_bulk.set_index('ticker').loc['T00003', 'close_price']
+            == df_tiingo['close_price'].iloc[0]
+        )
+        # Weekends and holidays get the last trading day, which is dropped
+        assert get_bulk_prices_eodhd(
+            'key', dt.date(2023, 10, 21), base_url=urls['EODHD_BASE_URL']
+        ).empty
+
+    def test_injected_errors(self, failing_urls):
+        with pytest.raises(HTTPError):
+            get_securities_eodhd('key', base_url=failing_urls['EODHD_BASE_URL'])
+        df = get_prices_tiingo(
+            'key', {'T00000': 1}, dt.date(2023, 10, 16), END_DATE,
+            base_url=failing_urls['TIINGO_BASE_URL'],
+        )
+        assert df.empty
+
+    def test_loads_end_to_end(self, app_urls, db):
+        load_securities()
+        assert db.session.query(Security).count() == 20
+        load_prices(['T00001', 'T00002'], dt.date(2023, 10, 16), END_DATE)
+        assert db.session.query(Price).count() == 10
+
+    def test_failed_tickers_are_not_stored(
+        self, app, app_urls, failing_urls, db, monkeypatch, tmp_path
+    ):
+        load_securities()
+        monkeypatch.setitem(app.config, 'PRICE_STORE_DIR', str(tmp_path))
+        monkeypatch.setitem(
+            app.config, 'TIINGO_BASE_URL', failing_urls['TIINGO_BASE_URL'])
+        monkeypatch.setitem(app.config, 'TIINGO_MAX_RETRIES', 0)
+        load_prices(['T00001'], dt.date(2023, 10, 16), END_DATE)
+        assert price_store.get_coverage(str(tmp_path), 'T00001') is None
+
+    def test_store_write_through_follows_the_prices_table(
+        self, app, app_urls, db, monkeypatch, tmp_path
+    ):
+        load_securities()
+        monkeypatch.setitem(app.config, 'PRICE_STORE_DIR', str(tmp_path))
+        load_prices(['T00001'], dt.date(2023, 10, 16), dt.date(2023, 10, 22))
+        # Up to the last stored price, not the weekend after it
+        assert price_store.get_coverage(str(tmp_path), 'T00001') == (
+            dt.date(2023, 10, 16), END_DATE)
+        # Older prices change the history, the file is read again
+        load_prices(['T00001'], dt.date(2023, 10, 9), dt.date(2023, 10, 13))
+        assert price_store.get_coverage(str(tmp_path), 'T00001') is None
+
+    def test_securities_refresh_is_a_no_op(self, app_urls, db):
+        assert load_securities().inserted == 20
+        sync = load_securities()
+        assert (sync.inserted, sync.updated, sync.delisted) == (0, 0, 0)
+        assert db.session.query(Security).count() == 20
+
+    def test_nightly_bulk_update(self, app_urls, provider, db):
+        load_securities()
+        tickers = ['T00001', 'T00002', 'T00004']
+        load_prices(tickers, dt.date(2023, 10, 16), dt.date(2023, 10, 19))
+        watchlist = Watchlist(name='Bulk', user_id=1)
+        db.session.add(watchlist)
+        db.session.flush()
+        db.session.add_all([
+            WatchlistItem(
+                ticker=ticker, quantity=1, price=100.0, side='buy',
+                trade_date=dt.date(2023, 10, 16), watchlist_id=watchlist.id,
+            )
+            for ticker in tickers
+        ])
+        db.session.commit()
+        provider.requests.clear()
+        fetch_requests, _ = backfill_prices(end_date=END_DATE, use_bulk=True)
+        assert [request.tickers for request in fetch_requests] == [
+            tuple(tickers)]
+        # One file per exchange, no request per ticker
+        assert provider.requests == {'bulk_eod': len(EXCHANGES)}
+        assert db.session.query(Price).count() == 15
+
+
+class TestBackfillQueue:
+
+    @pytest.mark.usefixtures("login_required")
+    def test_jobs_of_tickers_without_prices_fail(
+        self, app, app_urls, client, db, monkeypatch
+    ):
+        server = _serve(
+            FakeProvider(20, 10, end_date=END_DATE, failing_tickers=['T00002']))
+        monkeypatch.setitem(
+            app.config, 'TIINGO_BASE_URL', base_urls(server)['TIINGO_BASE_URL'])
+        monkeypatch.setitem(app.config, 'TIINGO_MAX_RETRIES', 0)
+        load_securities()
+        watchlist = Watchlist(name='Queue', user_id=1)
+        db.session.add(watchlist)
+        db.session.flush()
+        tickers = ['T00001', 'T00002', 'UNKNOWN']
+        db.session.add_all([
+            WatchlistItem(
+                ticker=ticker, quantity=1, price=100.0, side='buy',
+                trade_date=dt.date(2023, 10, 16), watchlist_id=watchlist.id,
+            )
+            for ticker in tickers
+        ])
+        db.session.commit()
+        for ticker in tickers:
+            enqueue_backfill(ticker)
+        process_pending_backfills()
+        server.shutdown()
+        statuses = {
+            ticker: client.get(f'/watchlist/backfill/{ticker}').json
+            for ticker in tickers
+        }
+        assert {
+            ticker: (status['status'], status['error'])
+            for ticker, status in statuses.items()
+        } == {
+            'T00001': (DONE, None),
+            'T00002': (FAILED, tasks.FETCH_ERROR),
+            'UNKNOWN': (FAILED, tasks.UNKNOWN_TICKER_ERROR),
+        }
+
+
+class TestBootstrapPrices:
+
+    def test_loads_in_batches(self, app_urls, provider, db):
+        load_securities()
+        tickers = provider.tickers[:14]
+        reports = []
+        progress = bootstrap_prices(
+            tickers, dt.date(2023, 10, 16), END_DATE,
+            batch_size=4, max_workers=2, report=reports.append,
+        )
+        assert (progress.batches, progress.done, progress.failed) == (4, 4, 0)
+        assert progress.rows == db.session.query(Price).count() == 70
+        assert [x.done for x in reports] == [1, 2, 3, 4]
+        assert db.session.query(BootstrapBatch).count() == 4
+
+    def test_rerun_resumes_failed_batches(
+        self, app, app_urls, failing_urls, provider, db, monkeypatch, tmp_path
+    ):
+        load_securities()
+        tickers = provider.tickers[:6]
+        monkeypatch.setitem(app.config, 'PRICE_STORE_DIR', str(tmp_path))
+        monkeypatch.setitem(
+            app.config, 'TIINGO_BASE_URL', failing_urls['TIINGO_BASE_URL'])
+        monkeypatch.setitem(app.config, 'TIINGO_MAX_RETRIES', 0)
+        progress = bootstrap_prices(
+            tickers, dt.date(2023, 10, 16), END_DATE, batch_size=4)
+        assert (progress.done, progress.failed, progress.rows) == (0, 2, 0)
+        assert db.session.query(BootstrapBatch).count() == 0
+        assert all(
+            price_store.get_coverage(str(tmp_path), ticker) is None
+            for ticker in tickers
+        )
+
+        monkeypatch.setitem(
+            app.config, 'TIINGO_BASE_URL', app_urls['TIINGO_BASE_URL'])
+        progress = bootstrap_prices(
+            tickers, dt.date(2023, 10, 16), END_DATE, batch_size=4)
+        assert (progress.done, progress.failed, progress.rows) == (2, 0, 30)
+
+        provider.requests.clear()
+        progress = bootstrap_prices(
+            tickers, dt.date(2023, 10, 16), END_DATE, batch_size=4)
+        assert (progress.done, progress.rows) == (2, 0)
+        assert provider.requests['daily_prices'] == 0
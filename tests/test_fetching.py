@@ -0,0 +1,177 @@
+import datetime as dt
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from requests.exceptions import HTTPError
+
+from portfolio_builder.public.fetching import (
+    ProviderClient, TokenBucket, call_with_retry
+)
+from portfolio_builder.public.tasks import get_prices_tiingo
+
+
+# Recorded Tiingo daily price responses, trimmed to the fields we read
+RECORDED = {
+    'AAPL': [
+        {'date': '2023-10-02T00:00:00.000Z', 'close': 173.75},
+        {'date': '2023-10-03T00:00:00.000Z', 'close': 172.40},
+    ],
+    'MSFT': [
+        {'date': '2023-10-02T00:00:00.000Z', 'close': 321.80},
+        {'date': '2023-10-03T00:00:00.000Z', 'close': 313.39},
+    ],
+    'AMZN': [],
+}
+
+
+class StandInTiingo(BaseHTTPRequestHandler):
+    """Serves RECORDED, failing the first request of each ticker in 'flaky'."""
+    protocol_version = 'HTTP/1.1'
+    flaky = set()
+    client_ports = set()
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        ticker = self.path.split('/')[3].upper()
+        cls = type(self)
+        with cls.lock:
+            cls.client_ports.add(self.client_address[1])
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            is_flaky = ticker in cls.flaky
+            cls.flaky.discard(ticker)
+        time.sleep(0.05)
+        if ticker not in RECORDED:
+            status, body = 404, {'detail': 'Not found.'}
+        elif is_flaky:
+            status, body = 503, {'detail': 'Try again.'}
+        else:
+            status, body = 200, RECORDED[ticker]
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        with cls.lock:
+            cls.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def tiingo_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInTiingo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+@pytest.fixture(scope='function')
+def stand_in(tiingo_url):
+    StandInTiingo.flaky = set()
+    StandInTiingo.max_in_flight = 0
+    StandInTiingo.client_ports = set()
+    yield tiingo_url
+
+
+class TestTokenBucket:
+
+    def test_paces_requests_after_a_burst(self):
+        bucket = TokenBucket(rate=100, capacity=5)
+        start = time.monotonic()
+        for _ in range(15):
+            bucket.acquire()
+        # 5 tokens at once, then 10 at 100 per second
+        assert 0.09 <= time.monotonic() - start < 0.5
+
+
+class TestCallWithRetry:
+
+    def _failing(self, errors):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+        return func, calls
+
+    def _http_error(self, status):
+        response = type('Response', (), {'status_code': status})()
+        return HTTPError(response=response)
+
+    def test_retries_transient_errors(self):
+        func, calls = self._failing([self._http_error(503), self._http_error(429)])
+        assert call_with_retry(func, max_retries=2, retry_backoff=0.001) == 'ok'
+        assert len(calls) == 3
+
+    def test_does_not_retry_client_errors(self):
+        func, calls = self._failing([self._http_error(404)])
+        with pytest.raises(HTTPError):
+            call_with_retry(func, max_retries=3, retry_backoff=0.001)
+        assert len(calls) == 1
+
+
+class TestProviderClient:
+
+    def test_reuses_connections(self, stand_in):
+        client = ProviderClient(max_connections=2)
+        for _ in range(3):
+            client.get(f'{stand_in}/tiingo/daily/AAPL/prices')
+        assert len(StandInTiingo.client_ports) == 1
+
+    def test_counts_latency_and_bytes(self, stand_in):
+        client = ProviderClient()
+        client.get(f'{stand_in}/tiingo/daily/MSFT/prices')
+        with pytest.raises(HTTPError):
+            client.get(f'{stand_in}/tiingo/daily/NFLX/prices')
+        stats = client.get_stats()[stand_in.split('//')[1]]
+        assert (stats.requests, stats.failures) == (2, 1)
+        assert stats.nbytes == len(json.dumps(RECORDED['MSFT'])) + len(
+            json.dumps({'detail': 'Not found.'}))
+        assert stats.seconds >= 2 * 0.05
+        assert stats.max_seconds >= 0.05
+
+
+class TestGetPricesTiingo:
+
+    def test_fetches_tickers_concurrently(self, stand_in):
+        df = get_prices_tiingo(
+            'key', {'AAPL': 1, 'MSFT': 2, 'AMZN': 3, 'NFLX': 4},
+            dt.date(2023, 10, 2), dt.date(2023, 10, 3),
+            max_workers=4, base_url=stand_in,
+        )
+        assert StandInTiingo.max_in_flight > 1
+        assert sorted(df.itertuples(index=False)) == [
+            (dt.date(2023, 10, 2), 1, 173.75),
+            (dt.date(2023, 10, 2), 2, 321.80),
+            (dt.date(2023, 10, 3), 1, 172.40),
+            (dt.date(2023, 10, 3), 2, 313.39),
+        ]
+
+    def test_retries_through_rate_limiter(self, stand_in):
+        StandInTiingo.flaky = {'AAPL'}
+        limiter = TokenBucket(rate=1000, capacity=1)
+        df = get_prices_tiingo(
+            'key', {'AAPL': 1}, dt.date(2023, 10, 2), dt.date(2023, 10, 3),
+            rate_limiter=limiter, max_retries=1, retry_backoff=0.001,
+            base_url=stand_in,
+        )
+        assert df['close_price'].tolist() == [173.75, 172.40]
+
+    def test_failed_tickers_are_left_out(self, stand_in):
+        df = get_prices_tiingo(
+            'key', {'NFLX': 4}, dt.date(2023, 10, 2), dt.date(2023, 10, 3),
+            base_url=stand_in,
+        )
+        assert df.empty
+        assert list(df.columns) == ['date', 'ticker_id', 'close_price']
@@ -0,0 +1,156 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public import fifo
+from portfolio_builder.public.fifo import match_lots
+from portfolio_builder.public.portfolio import calc_fifo, calc_portf_positions
+
+
+def _reference_fifo(df: pd.DataFrame) -> pd.DataFrame:
+    # Trade-by-trade FIFO queue, kept as the reference behaviour
+    df2 = (
+        df
+        .loc[:, ['ticker', 'date']]
+        .assign(net_quantity=0, realized_pnl=0.0)
+    )
+    net_quantity = 0
+    realized_pnl = 0
+    inventory = deque()
+    for idx, row in df.iterrows():
+        if row['side'] == 'buy':
+            inventory.append([row['quantity'], row['price']])
+            net_quantity += row['quantity']
+        else:
+            remaining_qty = row['quantity']
+            while remaining_qty > 0 and inventory:
+                first_item = inventory[0]
+                if first_item[0] >= remaining_qty:
+                    realized_pnl += remaining_qty * (row['price'] - first_item[1])
+                    first_item[0] -= remaining_qty
+                    net_quantity -= remaining_qty
+                    remaining_qty = 0
+                else:
+                    realized_pnl += first_item[0] * (row['price'] - first_item[1])
+                    remaining_qty -= first_item[0]
+                    net_quantity -= first_item[0]
+                    inventory.popleft()
+        df2.at[idx, 'net_quantity'] = net_quantity
+        df2.at[idx, 'realized_pnl'] = realized_pnl
+    return df2
+
+
+def _make_trades(n_trades: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ticker': 'AAPL',
+        'quantity': rng.integers(1, 50, n_trades),
+        'price': rng.uniform(50, 250, n_trades).round(2),
+        'side': np.where(rng.random(n_trades) < 0.6, 'buy', 'sell'),
+        'date': pd.date_range('2020-01-01', periods=n_trades, freq='D'),
+    })
+
+
+class TestMatchLots:
+
+    def test_partial_and_full_lot_consumption(self):
+        net_quantity, realized_pnl = match_lots(
+            is_buy=np.array([True, True, False, False]),
+            quantities=np.array([10, 5, 12, 3]),
+            prices=np.array([100.0, 110.0, 120.0, 130.0]),
+        )
+        assert net_quantity.tolist() == [10, 15, 3, 0]
+        assert realized_pnl.tolist() == [0.0, 0.0, 220.0, 280.0]
+
+    def test_oversold_quantity_is_ignored(self):
+        net_quantity, realized_pnl = match_lots(
+            is_buy=np.array([True, False, True, False]),
+            quantities=np.array([5, 8, 4, 2]),
+            prices=np.array([10.0, 12.0, 11.0, 15.0]),
+        )
+        assert net_quantity.tolist() == [5, 0, 4, 2]
+        assert realized_pnl.tolist() == [0.0, 10.0, 10.0, 18.0]
+
+    def test_sells_before_any_buy(self):
+        net_quantity, realized_pnl = match_lots(
+            is_buy=np.array([False, True]),
+            quantities=np.array([3, 2]),
+            prices=np.array([10.0, 11.0]),
+        )
+        assert net_quantity.tolist() == [0, 2]
+        assert realized_pnl.tolist() == [0.0, 0.0]
+
+    def test_empty_input(self):
+        net_quantity, realized_pnl = match_lots(
+            np.array([], dtype=bool), np.array([]), np.array([])
+        )
+        assert net_quantity.size == 0
+        assert realized_pnl.size == 0
+
+
+class TestCalcFifo:
+
+    @pytest.mark.parametrize('seed', range(5))
+    def test_matches_reference(self, seed):
+        df = _make_trades(500, seed)
+        pd.testing.assert_frame_equal(
+            calc_fifo(df), _reference_fifo(df), check_exact=True
+        )
+
+    def test_keeps_input_index(self):
+        df = _make_trades(20, 42).set_index(pd.RangeIndex(100, 120))
+        df_result = calc_fifo(df)
+        assert df_result.index.equals(df.index)
+        assert df_result.columns.tolist() == [
+            'ticker', 'date', 'net_quantity', 'realized_pnl'
+        ]
+
+
+class TestCalcPortfPositions:
+
+    @pytest.fixture(scope='class')
+    def df_trades(self):
+        rng = np.random.default_rng(3)
+        df = _make_trades(3000, 3)
+        df['ticker'] = rng.choice(['AAPL', 'MSFT', 'AMZN', 'META', 'NFLX'], 3000)
+        return df
+
+    def _calc_by_mask(self, df):
+        return pd.concat([
+            calc_fifo(df[lambda x: x['ticker'] == ticker])
+            for ticker in df['ticker'].unique()
+        ])
+
+    def test_matches_per_ticker_fifo(self, df_trades):
+        pd.testing.assert_frame_equal(
+            calc_portf_positions(df_trades),
+            self._calc_by_mask(df_trades),
+            check_exact=True,
+        )
+
+    def test_parallel_matches_serial(self, df_trades):
+        pd.testing.assert_frame_equal(
+            calc_portf_positions(df_trades, max_workers=2),
+            calc_portf_positions(df_trades),
+            check_exact=True,
+        )
+
+    def test_pool_is_not_forked_and_shut_down(self, df_trades):
+        calc_portf_positions(df_trades, max_workers=2)
+        executor = fifo._executors[2]
+        assert executor._mp_context.get_start_method() == fifo.START_METHOD
+        assert fifo.START_METHOD in ('forkserver', 'spawn')
+
+        fifo.shutdown_executors()
+        assert fifo._executors == {}
+        with pytest.raises(RuntimeError):
+            executor.submit(abs, -1)
+
+    def test_empty_trades(self):
+        df_positions = calc_portf_positions(_make_trades(0, 0))
+        assert df_positions.empty
+        assert df_positions.columns.tolist() == [
+            'ticker', 'date', 'net_quantity', 'realized_pnl'
+        ]
@@ -0,0 +1,74 @@
+import datetime as dt
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from benchmarks.fake_provider import (
+    FakeProvider, base_urls, make_server
+)
+from portfolio_builder.public.fetching import ProviderClient
+from portfolio_builder.public.tasks import (
+    get_securities_eodhd, get_securities_tiingo
+)
+
+
+@pytest.fixture(scope='function')
+def provider():
+    provider = FakeProvider(20, 10, end_date=dt.date(2023, 10, 20))
+    server = make_server(provider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    provider.urls = base_urls(server)
+    yield provider
+    server.shutdown()
+
+
+class TestGetFrame:
+
+    def test_fresh_entry_skips_the_request(self, provider, tmp_path, mocker):
+        client = ProviderClient()
+        url = provider.urls['TIINGO_TICKERS_URL']
+        df = get_securities_tiingo('key', url, client, str(tmp_path), 3600)
+        parse = mocker.patch('portfolio_builder.public.tasks._parse_securities_tiingo')
+        df_cached = get_securities_tiingo('key', url, client, str(tmp_path), 3600)
+        assert provider.requests['supported_tickers'] == 1
+        parse.assert_not_called()
+        pd.testing.assert_frame_equal(df_cached, df)
+
+    def test_stale_entry_is_revalidated(self, provider, tmp_path, mocker):
+        client = ProviderClient()
+        base_url = provider.urls['EODHD_BASE_URL']
+        df = get_securities_eodhd('key', base_url, client, str(tmp_path), 0)
+        parse = mocker.patch('portfolio_builder.public.tasks._parse_securities_eodhd')
+        df_cached = get_securities_eodhd('key', base_url, client, str(tmp_path), 0)
+        assert provider.requests['symbol_list'] == 4
+        assert provider.not_modified['symbol_list'] == 2
+        parse.assert_not_called()
+        pd.testing.assert_frame_equal(df_cached, df)
+
+    def test_changed_response_is_parsed_again(self, provider, tmp_path):
+        client = ProviderClient()
+        url = provider.urls['TIINGO_TICKERS_URL']
+        get_securities_tiingo('key', url, client, str(tmp_path), 0)
+        provider.tickers.append('NEW')
+        df = get_securities_tiingo('key', url, client, str(tmp_path), 0)
+        assert provider.not_modified['supported_tickers'] == 0
+        assert 'NEW' in df['ticker'].values
+
+    def test_secret_params_stay_out_of_the_cache(self, provider, tmp_path):
+        client = ProviderClient()
+        base_url = provider.urls['EODHD_BASE_URL']
+        get_securities_eodhd('secret', base_url, client, str(tmp_path), 3600)
+        get_securities_eodhd('other', base_url, client, str(tmp_path), 3600)
+        assert provider.requests['symbol_list'] == 2
+        for name in os.listdir(tmp_path):
+            with open(tmp_path / name, 'rb') as f:
+                assert b'secret' not in f.read()
+
+    def test_no_cache_dir_always_downloads(self, provider):
+        client = ProviderClient()
+        url = provider.urls['TIINGO_TICKERS_URL']
+        get_securities_tiingo('key', url, client)
+        get_securities_tiingo('key', url, client)
+        assert provider.requests['supported_tickers'] == 2
@@ -0,0 +1,35 @@
+from portfolio_builder.import_profile import (
+    ImportTime, import_time_ms, parse_importtime, profile_create_app
+)
+
+
+REPORT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _abc
+import time:       300 |        420 | abc
+import time:      1500 |       1500 |     flask.json
+import time:      2000 |       3500 |   flask.app
+import time:       500 |       4000 | flask
+"""
+
+
+class TestParseImporttime:
+
+    def test_parses_rows(self):
+        rows = parse_importtime(REPORT)
+        assert rows[2] == ImportTime('flask.json', 2, 1500, 1500)
+        assert [row.depth for row in rows] == [1, 0, 2, 1, 0]
+        assert import_time_ms(rows) == 4.42
+
+
+class TestImportBudget:
+
+    def test_create_app_within_budget(self, app):
+        # Best of 3, a single cold run is noisy
+        profiles = [profile_create_app('testing') for _ in range(3)]
+        assert (
+            min(import_time_ms(rows) for rows in profiles)
+            <= app.config['IMPORT_TIME_BUDGET_MS']
+        )
+        modules = {row.module for row in profiles[0]}
+        assert not {'pandas', 'numpy', 'tiingo'} & modules
@@ -0,0 +1,77 @@
+import datetime as dt
+
+import pytest
+
+from portfolio_builder.public import leases
+from portfolio_builder.public.leases import (
+    DONE, FAILED, RUNNING, acquire_lease, run_exclusive
+)
+from portfolio_builder.public.models import JobLease
+
+
+TTL = dt.timedelta(minutes=5)
+
+
+@pytest.fixture(scope='function')
+def lease_db(app, db):
+    yield db
+    db.session.query(JobLease).delete()
+    db.session.commit()
+
+
+def _lease(db, job_id='job'):
+    db.session.expire_all()
+    return db.session.get(JobLease, job_id)
+
+
+class TestAcquireLease:
+
+    def test_one_owner_at_a_time(self, lease_db, mocker):
+        assert acquire_lease('job', TTL)
+        mocker.patch.object(leases, '_owner', return_value='other:1:1')
+        assert not acquire_lease('job', TTL)
+        assert acquire_lease('other_job', TTL)
+        assert _lease(lease_db).status == RUNNING
+
+    def test_expired_lease_fails_over(self, lease_db, mocker):
+        assert acquire_lease('job', TTL)
+        lease = _lease(lease_db)
+        lease.expires_at = dt.datetime.utcnow() - dt.timedelta(seconds=1)
+        lease_db.session.commit()
+        mocker.patch.object(leases, '_owner', return_value='other:1:1')
+        assert acquire_lease('job', TTL)
+        assert _lease(lease_db).owner == 'other:1:1'
+
+    def test_min_interval_skips_recent_runs(self, lease_db):
+        assert run_exclusive('job', lambda: None)
+        assert not acquire_lease('job', TTL, min_interval=dt.timedelta(hours=1))
+        assert acquire_lease('job', TTL)
+
+
+class TestRunExclusive:
+
+    def test_records_finished_runs(self, lease_db):
+        calls = []
+        assert run_exclusive('job', lambda: calls.append(1))
+        lease = _lease(lease_db)
+        assert calls == [1]
+        assert (lease.status, lease.expires_at) == (DONE, None)
+        assert lease.finished_timestamp >= lease.started_timestamp
+
+    def test_skips_while_held_elsewhere(self, lease_db, mocker):
+        mocker.patch.object(leases, '_owner', return_value='other:1:1')
+        assert acquire_lease('job', TTL)
+        mocker.stopall()
+        calls = []
+        assert not run_exclusive('job', lambda: calls.append(1))
+        assert calls == []
+
+    def test_records_failures(self, lease_db):
+        def fail():
+            raise RuntimeError('provider down')
+        with pytest.raises(RuntimeError):
+            run_exclusive('job', fail)
+        lease = _lease(lease_db)
+        assert (lease.status, lease.error) == (FAILED, 'provider down')
+        # A failed run leaves the lease free for the next one
+        assert run_exclusive('job', lambda: None)
@@ -8,7 +8,7 @@ from sqlalchemy.exc import IntegrityError
 
 from portfolio_builder.public.models import (
     Security, Price, Watchlist, WatchlistItem, 
-    SecurityMgr, PriceMgr, WatchlistMgr, WatchlistItemMgr
+    SecurityMgr, SecuritySync, PriceMgr, WatchlistMgr, WatchlistItemMgr
 )
 
 
@@ -718,3 +718,145 @@ class TestGetSecurities:
         with pytest.raises(AttributeError):
             filter = [Security.invalid_column == 'Invalid Value']
             SecurityMgr.get_items(filters=filter)
+
+
+class TestUpsertPrices:
+
+    def test_inserts_new_prices(self, db, securities, db_teardown):
+        df_prices = pd.DataFrame({
+            'ticker_id': [securities[0].id] * 3,
+            'date': [dt.date(2023, 10, day) for day in (10, 11, 12)],
+            'close_price': [175.0, 180.0, 170.0],
+        })
+        assert PriceMgr.upsert_items(df_prices, batch_size=2) == 3
+        result = PriceMgr.get_items(filters=[Price.ticker_id == securities[0].id])
+        assert result['close_price'].tolist() == [175.0, 180.0, 170.0]
+
+    def test_reloading_updates_instead_of_duplicating(
+        self, db, securities, db_teardown
+    ):
+        df_prices = pd.DataFrame({
+            'ticker_id': [securities[0].id, securities[1].id],
+            'date': [dt.date(2023, 10, 10)] * 2,
+            'close_price': [175.0, 131.0],
+        })
+        PriceMgr.upsert_items(df_prices)
+        PriceMgr.upsert_items(df_prices.assign(close_price=[176.5, 131.0]))
+        result = PriceMgr.get_items(
+            filters=[Price.date == dt.date(2023, 10, 10)],
+            entities=[Price.ticker_id, Price.close_price],
+            orderby=[Price.ticker_id],
+        )
+        assert result['close_price'].tolist() == [176.5, 131.0]
+
+    def test_duplicate_rows_keep_the_last(self, db, securities, db_teardown):
+        df_prices = pd.DataFrame({
+            'ticker_id': [securities[0].id] * 2,
+            'date': [dt.date(2023, 10, 10)] * 2,
+            'close_price': [175.0, 177.0],
+        })
+        assert PriceMgr.upsert_items(df_prices) == 1
+        result = PriceMgr.get_items(filters=[Price.ticker_id == securities[0].id])
+        assert result['close_price'].tolist() == [177.0]
+
+    def test_price_versions(self, db, securities, db_teardown):
+        ticker_id = securities[0].id
+
+        def upsert(days):
+            PriceMgr.upsert_items(pd.DataFrame({
+                'ticker_id': [ticker_id] * len(days),
+                'date': [dt.date(2023, 10, day) for day in days],
+                'close_price': [175.0] * len(days),
+            }))
+            return PriceMgr.get_price_versions(['AAPL', 'AMZN'])
+
+        assert PriceMgr.get_price_versions(['AAPL'])['AAPL'] == (0, 0, None)
+        assert upsert([10, 11]) == {
+            'AAPL': (1, 0, dt.date(2023, 10, 11)),
+            'AMZN': (0, 0, None),
+        }
+        # New dates extend the history, rewrites and older dates change it
+        assert upsert([12])['AAPL'] == (2, 0, dt.date(2023, 10, 12))
+        assert upsert([11])['AAPL'] == (3, 1, dt.date(2023, 10, 12))
+        assert upsert([9])['AAPL'] == (4, 2, dt.date(2023, 10, 12))
+
+    def test_unique_ticker_date(self, db, securities, db_rollback):
+        db.session.add_all([
+            Price(date=dt.date(2023, 10, 10), close_price=1.0, ticker_id=securities[0].id),
+            Price(date=dt.date(2023, 10, 10), close_price=2.0, ticker_id=securities[0].id),
+        ])
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+
+
+class TestSyncSecurities:
+
+    @pytest.fixture(scope='function')
+    def df_securities(self, db):
+        db.session.query(Price).delete()
+        db.session.query(Security).delete()
+        db.session.commit()
+        db.session.expunge_all()
+        return pd.DataFrame({
+            'ticker': ['AAPL', 'AMZN', 'GOOG'],
+            'exchange': ['NASDAQ'] * 3,
+            'name': ['Apple Inc.', 'Amazon.com Inc.', 'Alphabet Inc.'],
+            'currency': ['USD'] * 3,
+            'country': ['USA'] * 3,
+            'isin': ['US0378331005', 'US0231351067', ''],
+        })
+
+    def _stored(self, db):
+        return {
+            ticker: (name, delisted_date)
+            for ticker, name, delisted_date in
+            db.session.query(
+                Security.ticker, Security.name, Security.delisted_date)
+        }
+
+    def test_applies_inserts_updates_and_delistings(
+        self, db, df_securities, prices, db_teardown
+    ):
+        ids_before = dict(db.session.query(Security.ticker, Security.id))
+        sync = SecurityMgr.sync_items(
+            df_securities, delisted_date=dt.date(2023, 10, 13), batch_size=1)
+        # Rows stored before hashes existed are rewritten once
+        assert sync == SecuritySync(inserted=1, updated=2, delisted=1, unchanged=0)
+        stored = self._stored(db)
+        assert stored['GOOG'] == ('Alphabet Inc.', None)
+        assert stored['MSFT'][1] == dt.date(2023, 10, 13)
+        ids_after = dict(db.session.query(Security.ticker, Security.id))
+        assert all(ids_after[x] == ids_before[x] for x in ids_before)
+        assert db.session.query(Price).count() == len(prices)
+
+    def test_resync_writes_only_changes(self, db, db_teardown, df_securities):
+        SecurityMgr.sync_items(df_securities)
+        assert SecurityMgr.sync_items(df_securities) == SecuritySync(0, 0, 0, 3)
+        df_securities.loc[1, 'name'] = 'Amazon Inc.'
+        assert SecurityMgr.sync_items(df_securities) == SecuritySync(0, 1, 0, 2)
+        assert self._stored(db)['AMZN'] == ('Amazon Inc.', None)
+        assert db.session.query(Security).count() == 3
+
+    def test_relisted_securities_are_restored(
+        self, db, db_teardown, df_securities
+    ):
+        SecurityMgr.sync_items(df_securities)
+        assert SecurityMgr.sync_items(df_securities.iloc[:2]) == (
+            SecuritySync(0, 0, 1, 2))
+        assert SecurityMgr.sync_items(df_securities.iloc[:2]) == (
+            SecuritySync(0, 0, 0, 2))
+        assert SecurityMgr.sync_items(df_securities) == SecuritySync(0, 1, 0, 2)
+        assert self._stored(db)['GOOG'] == ('Alphabet Inc.', None)
+
+    def test_duplicated_rows_change_together(
+        self, db, db_teardown, df_securities
+    ):
+        db.session.add_all([
+            Security(name="Microsoft Corporation", ticker="MSFT", exchange="NASDAQ")
+            for _ in range(2)
+        ])
+        db.session.commit()
+        assert SecurityMgr.sync_items(df_securities) == SecuritySync(3, 0, 1, 0)
+        assert db.session.query(Security).filter(
+            Security.ticker == 'MSFT', Security.delisted_date.isnot(None)
+        ).count() == 2
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public.portfolio import (
+    calc_daily_values, calc_portf_flows_adjusted, calc_portf_positions,
+    calc_portf_returns, calc_portf_valuations, calc_trade_flows,
+    calc_watchlists_overview
+)
+
+
+@pytest.fixture(scope='module')
+def market():
+    rng = np.random.default_rng(5)
+    dates = pd.bdate_range('2023-01-02', periods=120)
+    tickers = [f'T{idx:02d}' for idx in range(12)]
+    df_prices = pd.DataFrame({
+        'ticker': np.repeat(tickers, dates.shape[0]),
+        'date': np.tile(dates, len(tickers)),
+        'price': rng.uniform(10, 100, dates.shape[0] * len(tickers)).round(2),
+    })
+    df_trades = pd.concat([
+        pd.DataFrame({
+            'watchlist': f'W{watchlist}',
+            'ticker': ticker,
+            'date': np.sort(rng.choice(dates, 5, replace=False)),
+            'side': ['buy', *rng.choice(['buy', 'sell'], 4)],
+            'quantity': rng.integers(1, 20, 5),
+            'price': rng.uniform(10, 100, 5).round(2),
+        })
+        for watchlist in range(6)
+        for ticker in rng.choice(tickers, 4, replace=False)
+    ])
+    return df_trades.reset_index(drop=True), df_prices
+
+
+class TestCalcWatchlistsOverview:
+
+    def test_matches_single_watchlist_pipeline(self, market):
+        df_trades, df_prices = market
+        df_overview = (
+            calc_watchlists_overview(df_trades, df_prices)
+            .set_index('watchlist')
+        )
+        assert df_overview.shape[0] == 6
+        for watchlist, df_group in df_trades.groupby('watchlist'):
+            df_portf_pos = calc_portf_positions(df_group)
+            df_daily_values = calc_daily_values(
+                calc_portf_valuations(df_portf_pos, df_prices),
+                calc_portf_flows_adjusted(
+                    calc_trade_flows(df_group, 'watchlist')
+                    .drop(columns=['watchlist'])
+                ),
+            )
+            df_returns = calc_portf_returns(df_daily_values)
+            row = df_overview.loc[watchlist]
+            assert row['market_val'] == pytest.approx(
+                df_daily_values['market_val'].iloc[-1], abs=1e-3
+            )
+            assert row['cash'] == pytest.approx(
+                df_daily_values['cash'].iloc[-1], abs=1e-3
+            )
+            assert row['cum_return'] == pytest.approx(
+                df_returns['cum_return'].iloc[-1], abs=1e-3
+            )
+            assert row['realized_pnl'] == pytest.approx(
+                df_portf_pos.groupby('ticker')['realized_pnl'].last().sum(),
+                abs=1e-3
+            )
+
+    def test_no_trades(self, market):
+        _, df_prices = market
+        df_trades = pd.DataFrame(columns=[
+            'watchlist', 'ticker', 'date', 'side', 'quantity', 'price'
+        ])
+        assert calc_watchlists_overview(df_trades, df_prices).empty
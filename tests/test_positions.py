@@ -0,0 +1,139 @@
+import datetime as dt
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy.exc import SAWarning
+
+from portfolio_builder.public.models import (
+    Position, PositionLot, Watchlist, WatchlistItem
+)
+from portfolio_builder.public.portfolio import calc_fifo
+from portfolio_builder.public.positions import (
+    apply_trade, delete_position, rebuild_positions
+)
+
+
+@pytest.fixture(scope='function')
+def watchlist(db):
+    watchlist = Watchlist(name="Technology", user_id=1)
+    db.session.add(watchlist)
+    db.session.commit()
+    yield watchlist
+    db.session.query(PositionLot).delete()
+    db.session.query(Position).delete()
+    db.session.query(WatchlistItem).delete()
+    db.session.query(Watchlist).delete()
+    db.session.commit()
+
+
+def _add_trade(db, watchlist, side, quantity, price, trade_date):
+    item = WatchlistItem(
+        ticker='AAPL',
+        quantity=quantity,
+        price=price,
+        side=side,
+        trade_date=trade_date,
+        watchlist_id=watchlist.id,
+    )
+    db.session.add(item)
+    apply_trade(item)
+    db.session.commit()
+    return item
+
+
+def _add_trades(db, watchlist, trades):
+    return [
+        _add_trade(
+            db, watchlist, side, quantity, price,
+            dt.date(2023, 10, 2) + dt.timedelta(days=days),
+        )
+        for days, (side, quantity, price) in enumerate(trades)
+    ]
+
+
+def _get_state(db, watchlist):
+    position = db.session.query(Position).filter_by(
+        watchlist_id=watchlist.id, ticker='AAPL').one()
+    lots = [
+        (lot.quantity, lot.price)
+        for lot in (
+            db.session.query(PositionLot)
+            .filter_by(position_id=position.id)
+            .order_by(PositionLot.id)
+        )
+    ]
+    return position.net_quantity, position.realized_pnl, lots
+
+
+class TestApplyTrade:
+
+    def test_buys_append_lots(self, db, watchlist):
+        _add_trades(db, watchlist, [('buy', 10, 100.0), ('buy', 5, 110.0)])
+        assert _get_state(db, watchlist) == (
+            15, 0.0, [(10, 100.0), (5, 110.0)]
+        )
+
+    def test_sells_consume_lots_from_the_head(self, db, watchlist):
+        _add_trades(db, watchlist, [
+            ('buy', 10, 100.0),
+            ('buy', 5, 110.0),
+            ('sell', 12, 120.0),
+        ])
+        assert _get_state(db, watchlist) == (3, 220.0, [(3, 110.0)])
+
+    def test_matches_fifo_engine(self, db, watchlist):
+        rng = np.random.default_rng(7)
+        sides = np.where(rng.random(60) < 0.6, 'buy', 'sell')
+        trades = [
+            (side, int(qty), float(price))
+            for side, qty, price in zip(
+                sides,
+                rng.integers(1, 30, 60),
+                rng.uniform(50, 150, 60).round(2),
+            )
+        ]
+        _add_trades(db, watchlist, trades)
+        df_trades = pd.DataFrame(
+            trades, columns=['side', 'quantity', 'price']
+        ).assign(ticker='AAPL', date=None)
+        df_fifo = calc_fifo(df_trades)
+        net_quantity, realized_pnl, _ = _get_state(db, watchlist)
+        assert net_quantity == df_fifo['net_quantity'].iloc[-1]
+        assert realized_pnl == df_fifo['realized_pnl'].iloc[-1]
+
+    def test_backdated_buy_is_matched_in_trade_order(self, db, watchlist):
+        _add_trades(db, watchlist, [('buy', 10, 100.0)])
+        # The replaced position must not linger in the session
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', SAWarning)
+            _add_trade(db, watchlist, 'buy', 5, 90.0, dt.date(2023, 9, 25))
+        assert _get_state(db, watchlist) == (
+            15, 0.0, [(5, 90.0), (10, 100.0)]
+        )
+        _add_trade(db, watchlist, 'sell', 8, 120.0, dt.date(2023, 10, 5))
+        assert _get_state(db, watchlist) == (7, 210.0, [(7, 100.0)])
+
+
+class TestRebuildPositions:
+
+    def test_rebuild_matches_incremental_state(self, db, watchlist):
+        _add_trades(db, watchlist, [
+            ('buy', 10, 100.0),
+            ('sell', 4, 105.0),
+            ('buy', 8, 98.0),
+            ('sell', 9, 101.5),
+        ])
+        state_before = _get_state(db, watchlist)
+        assert rebuild_positions() == 1
+        assert _get_state(db, watchlist) == state_before
+
+    def test_rebuild_creates_missing_state(self, db, watchlist):
+        items = _add_trades(db, watchlist, [('buy', 10, 100.0)])
+        delete_position(watchlist.id, 'AAPL')
+        db.session.commit()
+        assert db.session.query(Position).count() == 0
+        assert rebuild_positions([watchlist.id]) == 1
+        assert _get_state(db, watchlist) == (10, 0.0, [(10, 100.0)])
+        assert items[0].watchlist_id == watchlist.id
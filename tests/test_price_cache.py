@@ -0,0 +1,132 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public import price_cache
+
+
+DATES = pd.bdate_range('2023-01-02', periods=40)
+PRICES = pd.DataFrame({
+    'ticker': np.repeat(['AAA', 'BBB'], DATES.size).astype(object),
+    'date': np.tile(DATES, 2),
+    'price': np.arange(2.0 * DATES.size),
+})
+VERSIONS = {ticker: (0, DATES[-1].date()) for ticker in ('AAA', 'BBB')}
+
+
+class FakeLoader:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, tickers, start_date, end_date):
+        self.calls.append((tickers, start_date, end_date))
+        return (
+            PRICES
+            .loc[lambda x: x['ticker'].isin(tickers)]
+            .loc[lambda x: x['date'].between(
+                pd.Timestamp(start_date), pd.Timestamp(end_date))]
+        )
+
+
+def _expected(tickers, start_date, end_date):
+    return (
+        PRICES
+        .loc[lambda x: x['ticker'].isin(tickers)]
+        .loc[lambda x: x['date'].between(
+            pd.Timestamp(start_date), pd.Timestamp(end_date))]
+        .reset_index(drop=True)
+    )
+
+
+@pytest.fixture(scope='function')
+def loader():
+    price_cache.clear()
+    yield FakeLoader()
+    price_cache.clear()
+
+
+class TestGetPrices:
+
+    def test_second_request_is_a_hit(self, loader):
+        start, end = dt.date(2023, 1, 2), dt.date(2023, 2, 10)
+        df_first = price_cache.get_prices(['BBB', 'AAA'], start, end, loader, VERSIONS, 2**20)
+        df_second = price_cache.get_prices(['AAA', 'BBB'], start, end, loader, VERSIONS, 2**20)
+        assert len(loader.calls) == 1
+        pd.testing.assert_frame_equal(df_first, _expected(['AAA', 'BBB'], start, end))
+        pd.testing.assert_frame_equal(df_second, df_first)
+        stats = price_cache.get_stats()
+        assert (stats.hits, stats.misses, stats.entries) == (2, 2, 2)
+
+    def test_only_missing_ranges_are_loaded(self, loader):
+        price_cache.get_prices(
+            ['AAA'], dt.date(2023, 1, 10), dt.date(2023, 1, 20), loader, VERSIONS, 2**20)
+        df_prices = price_cache.get_prices(
+            ['AAA'], dt.date(2023, 1, 2), dt.date(2023, 1, 31), loader, VERSIONS, 2**20)
+        assert loader.calls[1:] == [
+            (['AAA'], dt.date(2023, 1, 2), dt.date(2023, 1, 9)),
+            (['AAA'], dt.date(2023, 1, 21), dt.date(2023, 1, 31)),
+        ]
+        pd.testing.assert_frame_equal(
+            df_prices,
+            _expected(['AAA'], dt.date(2023, 1, 2), dt.date(2023, 1, 31))
+        )
+
+    def test_tickers_sharing_a_gap_are_loaded_together(self, loader):
+        price_cache.get_prices(
+            ['AAA', 'BBB'], dt.date(2023, 1, 2), dt.date(2023, 1, 6), loader, VERSIONS, 2**20)
+        assert loader.calls == [
+            (['AAA', 'BBB'], dt.date(2023, 1, 2), dt.date(2023, 1, 6)),
+        ]
+
+    def test_lru_eviction_by_bytes(self, loader):
+        start, end = dt.date(2023, 1, 2), dt.date(2023, 2, 24)
+        entry_bytes = DATES.size * 16
+        price_cache.get_prices(['AAA'], start, end, loader, VERSIONS, entry_bytes)
+        price_cache.get_prices(['BBB'], start, end, loader, VERSIONS, entry_bytes)
+        stats = price_cache.get_stats()
+        assert (stats.entries, stats.nbytes, stats.evictions) == (
+            1, entry_bytes, 1)
+        price_cache.get_prices(['BBB'], start, end, loader, VERSIONS, entry_bytes)
+        assert len(loader.calls) == 2
+
+    def test_invalidate_drops_the_ticker(self, loader):
+        start, end = dt.date(2023, 1, 2), dt.date(2023, 1, 31)
+        price_cache.get_prices(['AAA', 'BBB'], start, end, loader, VERSIONS, 2**20)
+        price_cache.invalidate(['AAA'])
+        price_cache.get_prices(['AAA', 'BBB'], start, end, loader, VERSIONS, 2**20)
+        assert loader.calls[-1] == (['AAA'], start, end)
+
+    def test_range_is_complete_up_to_the_last_stored_date(self, loader):
+        start, end = dt.date(2023, 1, 2), dt.date(2023, 1, 31)
+        versions = {'AAA': (0, dt.date(2023, 1, 20))}
+        df_first = price_cache.get_prices(['AAA'], start, end, loader, versions, 2**20)
+        price_cache.get_prices(['AAA'], start, end, loader, versions, 2**20)
+        assert loader.calls == [(['AAA'], start, dt.date(2023, 1, 20))]
+        pd.testing.assert_frame_equal(
+            df_first, _expected(['AAA'], start, dt.date(2023, 1, 20)))
+
+        versions = {'AAA': (0, dt.date(2023, 1, 27))}
+        df_prices = price_cache.get_prices(['AAA'], start, end, loader, versions, 2**20)
+        assert loader.calls[1:] == [
+            (['AAA'], dt.date(2023, 1, 21), dt.date(2023, 1, 27)),
+        ]
+        pd.testing.assert_frame_equal(
+            df_prices, _expected(['AAA'], start, dt.date(2023, 1, 27)))
+
+    def test_new_version_drops_the_entry(self, loader):
+        start, end = dt.date(2023, 1, 2), dt.date(2023, 1, 31)
+        price_cache.get_prices(['AAA', 'BBB'], start, end, loader, VERSIONS, 2**20)
+        versions = {**VERSIONS, 'AAA': (1, DATES[-1].date())}
+        price_cache.get_prices(['AAA', 'BBB'], start, end, loader, versions, 2**20)
+        assert loader.calls[-1] == (['AAA'], start, end)
+        assert len(loader.calls) == 2
+
+    def test_tickers_without_prices_are_not_loaded(self, loader):
+        df_prices = price_cache.get_prices(
+            ['ZZZ'], dt.date(2023, 1, 2), dt.date(2023, 1, 31), loader,
+            VERSIONS, 2**20)
+        assert loader.calls == []
+        assert df_prices.empty
@@ -0,0 +1,209 @@
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public import price_cache, price_store
+from portfolio_builder.public.models import Price, Security, PriceMgr
+
+
+DATES = pd.bdate_range('2023-01-02', periods=30).date
+VERSIONS = {'AAA': (0, DATES[-1])}
+
+
+@pytest.fixture(scope='function')
+def prices(app, db, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'PRICE_STORE_DIR', str(tmp_path))
+    securities = [
+        Security(name=ticker, ticker=ticker, exchange='NYSE')
+        for ticker in ('AAA', 'BBB')
+    ]
+    db.session.add_all(securities)
+    db.session.flush()
+    db.session.add_all([
+        Price(date=date, close_price=100 + idx + 0.5 * pos, ticker_id=security.id)
+        for pos, security in enumerate(securities)
+        for idx, date in enumerate(DATES)
+    ])
+    db.session.commit()
+    yield str(tmp_path)
+    db.session.query(Price).delete()
+    db.session.query(Security).delete()
+    db.session.commit()
+
+
+class TestPriceStore:
+
+    def test_read_slices_the_stored_range(self, tmp_path):
+        root = str(tmp_path)
+        price_store.write_prices(
+            root, 'AAA', DATES, np.arange(30.0), DATES[0], DATES[-1], 0)
+        versions = {**VERSIONS, 'ZZZ': (0, DATES[-1])}
+        df_prices, missed = price_store.read_prices(
+            root, ['AAA', 'YYY', 'ZZZ'], DATES[5], DATES[9], versions)
+        # YYY has no stored prices, there's nothing to read
+        assert missed == ['ZZZ']
+        assert df_prices['ticker'].tolist() == ['AAA'] * 5
+        assert df_prices['date'].dt.date.tolist() == list(DATES[5:10])
+        assert df_prices['price'].tolist() == [5.0, 6.0, 7.0, 8.0, 9.0]
+
+    def test_range_outside_coverage_misses(self, tmp_path):
+        root = str(tmp_path)
+        price_store.write_prices(
+            root, 'AAA', DATES[10:], np.arange(20.0), DATES[10], DATES[-1], 0)
+        _, missed = price_store.read_prices(
+            root, ['AAA'], DATES[0], DATES[-1], VERSIONS)
+        assert missed == ['AAA']
+
+    def test_range_is_complete_up_to_the_last_stored_date(self, tmp_path):
+        root = str(tmp_path)
+        price_store.write_prices(
+            root, 'AAA', DATES[:20], np.arange(20.0), DATES[0], DATES[19], 0)
+        versions = {'AAA': (0, DATES[19])}
+        df_prices, missed = price_store.read_prices(
+            root, ['AAA'], DATES[0], DATES[-1], versions)
+        assert missed == []
+        assert df_prices.shape[0] == 20
+        # Newer prices were stored since, by a process not sharing the store
+        versions = {'AAA': (0, DATES[20])}
+        _, missed = price_store.read_prices(
+            root, ['AAA'], DATES[0], DATES[-1], versions)
+        assert missed == ['AAA']
+
+    def test_other_version_misses_and_is_replaced(self, tmp_path):
+        root = str(tmp_path)
+        price_store.write_prices(
+            root, 'AAA', DATES, np.arange(30.0), DATES[0], DATES[-1], 0)
+        versions = {'AAA': (1, DATES[-1])}
+        _, missed = price_store.read_prices(
+            root, ['AAA'], DATES[0], DATES[-1], versions)
+        assert missed == ['AAA']
+        price_store.write_prices(
+            root, 'AAA', DATES[:10], -np.arange(10.0), DATES[0], DATES[9], 1,
+            overwrite=False)
+        assert price_store.get_coverage(root, 'AAA') == (DATES[0], DATES[9])
+        df_prices, missed = price_store.read_prices(
+            root, ['AAA'], DATES[0], DATES[9], versions)
+        assert missed == []
+        assert df_prices['price'].tolist() == list(-np.arange(10.0))
+
+    def test_writes_merge_and_replace_dates(self, tmp_path):
+        root = str(tmp_path)
+        price_store.write_prices(
+            root, 'AAA', DATES[:10], np.arange(10.0), DATES[0], DATES[9], 0)
+        price_store.write_prices(
+            root, 'AAA', DATES[9:12], [-1.0, -2.0, -3.0], DATES[9], DATES[11],
+            0)
+        price_store.write_prices(
+            root, 'AAA', DATES[11:12], [99.0], DATES[11], DATES[11], 0,
+            overwrite=False)
+        assert price_store.get_coverage(root, 'AAA') == (DATES[0], DATES[11])
+        df_prices, _ = price_store.read_prices(
+            root, ['AAA'], DATES[0], DATES[11], VERSIONS)
+        assert df_prices['price'].tolist()[8:] == [8.0, -1.0, -2.0, -3.0]
+
+    def test_disjoint_write_drops_the_file(self, tmp_path):
+        root = str(tmp_path)
+        price_store.write_prices(
+            root, 'AAA', DATES[:5], np.arange(5.0), DATES[0], DATES[4], 0)
+        price_store.write_prices(
+            root, 'AAA', DATES[20:], np.arange(10.0), DATES[20], DATES[-1], 0)
+        assert price_store.get_coverage(root, 'AAA') is None
+
+    def test_concurrent_writes_keep_every_date(self, tmp_path):
+        root = str(tmp_path)
+
+        def write(idx):
+            price_store.write_prices(
+                root, 'AAA', DATES[idx:idx + 1], [float(idx)],
+                DATES[0], DATES[-1], 0)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(write, range(len(DATES))))
+        df_prices, _ = price_store.read_prices(
+            root, ['AAA'], DATES[0], DATES[-1], VERSIONS)
+        assert df_prices['price'].tolist() == list(np.arange(30.0))
+
+
+class TestGetPrices:
+
+    def test_matches_sql_and_fills_the_store(self, app, prices, mocker):
+        df_sql = PriceMgr.get_items(
+            filters=[Security.ticker.in_(['AAA', 'BBB'])],
+            entities=[
+                Security.ticker,
+                Price.date,
+                Price.close_price.label('price'),
+            ],
+            orderby=[Security.ticker, Price.date]
+        ).astype({'date': 'datetime64[ns]', 'price': 'float64'})
+        df_first = PriceMgr.get_prices(['BBB', 'AAA'], DATES[0])
+        pd.testing.assert_frame_equal(df_first, df_sql)
+        # Only up to the last stored price, not the requested end date
+        assert price_store.get_coverage(prices, 'AAA') == (
+            DATES[0], DATES[-1])
+
+        spy = mocker.spy(PriceMgr, '_get_sql_prices')
+        df_cached = PriceMgr.get_prices(['AAA', 'BBB'], DATES[3], DATES[7])
+        assert spy.call_count == 0
+        pd.testing.assert_frame_equal(
+            df_cached,
+            df_sql
+            .loc[lambda x: x['date'].dt.date.between(DATES[3], DATES[7])]
+            .reset_index(drop=True)
+        )
+
+    def test_miss_reads_only_missing_tickers(self, app, prices, mocker):
+        PriceMgr.get_prices(['AAA'], DATES[0], DATES[-1])
+        spy = mocker.spy(PriceMgr, '_get_sql_prices')
+        df_prices = PriceMgr.get_prices(['AAA', 'BBB'], DATES[0], DATES[-1])
+        assert spy.call_args.args[0] == ['BBB']
+        assert df_prices.groupby('ticker').size().to_dict() == {
+            'AAA': 30, 'BBB': 30
+        }
+
+    def test_store_sees_prices_written_elsewhere(self, app, prices):
+        PriceMgr.get_prices(['AAA'], DATES[0])
+        security = Security.query.filter_by(ticker='AAA').one()
+        new_date = DATES[-1] + dt.timedelta(days=3)
+        # As written by a worker that doesn't share this price store
+        PriceMgr.upsert_items(pd.DataFrame({
+            'ticker_id': [security.id],
+            'date': [new_date],
+            'close_price': [2.0],
+        }))
+        df_prices = PriceMgr.get_prices(['AAA'], DATES[0])
+        assert df_prices['date'].dt.date.iloc[-1] == new_date
+        PriceMgr.upsert_items(pd.DataFrame({
+            'ticker_id': [security.id],
+            'date': [DATES[5]],
+            'close_price': [1.0],
+        }))
+        df_prices = PriceMgr.get_prices(['AAA'], DATES[0])
+        assert df_prices['price'].iloc[[5, -1]].tolist() == [1.0, 2.0]
+
+    def test_cache_sees_prices_written_elsewhere(
+        self, app, prices, monkeypatch, mocker
+    ):
+        monkeypatch.setitem(app.config, 'PRICE_CACHE_MAX_BYTES', 2**20)
+        monkeypatch.setitem(app.config, 'PRICE_STORE_DIR', None)
+        price_cache.clear()
+        PriceMgr.get_prices(['AAA'], DATES[0])
+        security = Security.query.filter_by(ticker='AAA').one()
+        new_date = DATES[-1] + dt.timedelta(days=3)
+        # As written by the worker, which doesn't share this cache
+        PriceMgr.upsert_items(pd.DataFrame({
+            'ticker_id': [security.id] * 2,
+            'date': [DATES[5], new_date],
+            'close_price': [1.0, 2.0],
+        }))
+        df_prices = PriceMgr.get_prices(['AAA'], DATES[0])
+        assert df_prices['date'].dt.date.iloc[-1] == new_date
+        assert df_prices['price'].iloc[[5, -1]].tolist() == [1.0, 2.0]
+
+        spy = mocker.spy(PriceMgr, '_load_prices')
+        PriceMgr.get_prices(['AAA'], DATES[0])
+        assert spy.call_count == 0
+        price_cache.clear()
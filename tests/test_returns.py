@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public.portfolio import (
+    calc_portf_returns, RETURN_SERIES
+)
+
+
+@pytest.fixture(scope='module')
+def df_daily_values():
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range('2022-12-26', periods=400, name='date')
+    return pd.DataFrame({'hpr': rng.normal(0, 1, 400)}, index=dates)
+
+
+class TestCalcPortfReturns:
+
+    def test_returns_every_series(self, df_daily_values):
+        df_returns = calc_portf_returns(df_daily_values)
+        assert tuple(df_returns.columns) == RETURN_SERIES
+        assert df_returns.index.equals(df_daily_values.index)
+
+    def test_cum_return_chains_daily_changes(self, df_daily_values):
+        df_returns = calc_portf_returns(df_daily_values)
+        growth = 1.0
+        for pct_change, cum_return in zip(
+            df_daily_values['hpr'], df_returns['cum_return']
+        ):
+            growth *= 1 + pct_change / 100
+            assert cum_return == pytest.approx((growth - 1) * 100)
+
+    @pytest.mark.parametrize('series, freq', [
+        ('wtd_return', 'W'), ('mtd_return', 'M'), ('ytd_return', 'Y'),
+    ])
+    def test_period_to_date_returns(self, df_daily_values, series, freq):
+        df_returns = calc_portf_returns(df_daily_values)
+        expected = (
+            (1 + df_daily_values['hpr'] / 100)
+            .groupby(df_daily_values.index.to_period(freq))
+            .cumprod()
+            .sub(1)
+            .mul(100)
+        )
+        np.testing.assert_allclose(df_returns[series], expected)
+
+    def test_annualizes_after_one_year(self, df_daily_values):
+        df_returns = calc_portf_returns(df_daily_values)
+        years = (
+            (df_daily_values.index - df_daily_values.index[0]).days / 365.25
+        )
+        under_a_year = years < 1
+        np.testing.assert_allclose(
+            df_returns['annualized_return'][under_a_year],
+            df_returns['cum_return'][under_a_year],
+        )
+        growth = 1 + df_returns['cum_return'].iloc[-1] / 100
+        assert df_returns['annualized_return'].iloc[-1] == pytest.approx(
+            (growth ** (1 / years[-1]) - 1) * 100
+        )
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public import risk
+from portfolio_builder.public.models import PriceVersion
+from portfolio_builder.public.risk import (
+    RiskInputs, RunningRisk, calc_risk_metrics, get_risk_metrics
+)
+from portfolio_builder.public.valuation import valuation_matrix
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    rng = np.random.default_rng(9)
+    dates = pd.bdate_range('2022-01-03', periods=300)
+    tickers = ['AAA', 'BBB', 'CCC']
+    df_prices = pd.DataFrame({
+        'ticker': np.repeat(tickers, dates.size),
+        'date': np.tile(dates, len(tickers)),
+        'price': (
+            100 * np.exp(np.cumsum(rng.normal(0, 0.02, (3, dates.size)), axis=1))
+        ).ravel(),
+    })
+    # CCC has no prices for its first 40 dates
+    df_prices = df_prices.loc[
+        ~((df_prices['ticker'] == 'CCC') & (df_prices['date'] < dates[40]))
+    ]
+    df_portf_pos = pd.DataFrame({
+        'ticker': ['AAA', 'BBB', 'AAA', 'CCC'],
+        'date': dates[[0, 10, 100, 50]],
+        'net_quantity': [10, 5, 25, 8],
+        'realized_pnl': 0.0,
+    })
+    valuation = valuation_matrix(df_portf_pos, df_prices)
+    return RiskInputs(
+        dates=valuation.dates,
+        tickers=valuation.tickers,
+        prices=valuation.prices,
+        portf_returns=rng.normal(0, 0.01, dates.size),
+    )
+
+
+def _inputs_after(inputs, after):
+    is_after = (
+        slice(None) if after is None
+        else inputs.dates > np.datetime64(after)
+    )
+    return RiskInputs(
+        inputs.dates[is_after],
+        inputs.tickers,
+        inputs.prices[is_after],
+        inputs.portf_returns[is_after],
+    )
+
+
+def _as_of(inputs, idx):
+    return pd.Timestamp(inputs.dates[idx]).date()
+
+
+def _assert_metrics_equal(actual, expected):
+    for name, values in actual._asdict().items():
+        if values.dtype.kind == 'f':
+            np.testing.assert_allclose(values, getattr(expected, name))
+        else:
+            np.testing.assert_array_equal(values, getattr(expected, name))
+
+
+class TestCalcRiskMetrics:
+
+    def test_metrics_match_pandas(self, inputs):
+        metrics = calc_risk_metrics(inputs, window=21)
+        df_returns = (
+            pd.DataFrame(inputs.prices, columns=inputs.tickers)
+            .pct_change(fill_method=None)
+            .assign(Portfolio=inputs.portf_returns)
+            .iloc[1:]
+        )
+        np.testing.assert_allclose(
+            metrics.rolling_volatility,
+            (df_returns.rolling(21).std() * np.sqrt(252) * 100).to_numpy(),
+            rtol=1e-6,
+        )
+        np.testing.assert_allclose(
+            metrics.sharpe,
+            (df_returns.mean() / df_returns.std() * np.sqrt(252)).to_numpy(),
+        )
+        np.testing.assert_allclose(
+            metrics.historical_var,
+            -df_returns.quantile(0.05).to_numpy() * 100,
+        )
+        wealth = (1 + df_returns.fillna(0)).cumprod()
+        np.testing.assert_allclose(
+            metrics.max_drawdown,
+            ((wealth / wealth.cummax() - 1).min() * 100).to_numpy(),
+        )
+
+    def test_added_dates_match_a_full_computation(self, inputs):
+        running = RunningRisk(inputs.tickers)
+        for start, end in [(0, 1), (1, 30), (30, 31), (31, 200), (200, 300)]:
+            running.push(RiskInputs(
+                inputs.dates[start:end],
+                inputs.tickers,
+                inputs.prices[start:end],
+                inputs.portf_returns[start:end],
+            ))
+        _assert_metrics_equal(running.result(), calc_risk_metrics(inputs))
+
+
+class TestGetRiskMetrics:
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        risk._cache.clear()
+        yield
+        risk._cache.clear()
+
+    def test_adds_only_the_new_dates(self, inputs):
+        calls = []
+
+        def load_inputs(after):
+            calls.append(after)
+            return _inputs_after(inputs, after)
+
+        first_inputs = RiskInputs(
+            inputs.dates[:200],
+            inputs.tickers,
+            inputs.prices[:200],
+            inputs.portf_returns[:200],
+        )
+        as_of = _as_of(inputs, 199)
+        first = get_risk_metrics(
+            1, ('v1',), {'AAA': PriceVersion(1, 1, as_of)},
+            lambda after: first_inputs,
+        )
+        assert first.dates[-1] == inputs.dates[199]
+        metrics = get_risk_metrics(
+            1,
+            ('v1',),
+            {'AAA': PriceVersion(2, 1, _as_of(inputs, -1))},
+            load_inputs,
+        )
+        assert calls == [as_of]
+        _assert_metrics_equal(metrics, calc_risk_metrics(inputs))
+
+    def test_recomputes_on_new_data_or_rewritten_prices(self, inputs):
+        calls = []
+
+        def load_inputs(after):
+            calls.append(after)
+            return _inputs_after(inputs, after)
+
+        as_of = _as_of(inputs, -1)
+        versions = {'AAA': PriceVersion(1, 1, as_of)}
+        get_risk_metrics(1, ('v1',), versions, load_inputs)
+        get_risk_metrics(1, ('v2',), versions, load_inputs)
+        rewritten = {'AAA': PriceVersion(2, 2, as_of)}
+        get_risk_metrics(1, ('v2',), rewritten, load_inputs)
+        get_risk_metrics(1, ('v2',), rewritten, load_inputs)
+        assert calls == [None, None, None, as_of]
+
+    def test_evicts_least_recently_used(self, inputs, monkeypatch):
+        monkeypatch.setattr(risk, 'RISK_CACHE_SIZE', 2)
+        for watchlist_id in (1, 2, 1, 3):
+            get_risk_metrics(
+                watchlist_id, 'v', {}, lambda after: _inputs_after(inputs, after)
+            )
+        assert list(risk._cache) == [1, 3]
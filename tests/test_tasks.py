@@ -1,10 +1,13 @@
+import datetime as dt
+
 import numpy as np
 import pandas as pd
 import pytest
 
+from portfolio_builder.public.models import Price, Security
 from portfolio_builder.public.tasks import (
     EXCHANGES, CURRENCIES, COUNTRIES, ASSET_TYPES, 
-    get_securities_eodhd
+    get_securities_eodhd, load_bulk_prices
 )
 
 
@@ -59,3 +62,49 @@ class TestGetSecuritiesEodhd:
             # The 'isin' column is a string of length 12 
             # if the ticker has an ISIN, or 0 if it doesn't
             assert df['isin'].str.len().isin([12, 0]).all()
+
+
+class TestLoadBulkPrices:
+
+    DATE = dt.date(2023, 10, 20)
+
+    @pytest.fixture(scope='function')
+    def securities(self, db):
+        securities = {
+            (ticker, exchange): Security(
+                name=ticker, ticker=ticker, exchange=exchange,
+                delisted_date=delisted_date,
+            )
+            for ticker, exchange, delisted_date in [
+                ('DUAL', 'NASDAQ', None),
+                ('DUAL', 'NYSE', None),
+                ('MOVED', 'NYSE', dt.date(2023, 1, 2)),
+                ('MOVED', 'NASDAQ', None),
+            ]
+        }
+        db.session.add_all(securities.values())
+        db.session.commit()
+        yield securities
+        db.session.query(Price).delete()
+        db.session.query(Security).delete()
+        db.session.commit()
+
+    def test_prices_of_the_primary_listing(self, db, securities):
+        df_bulk = pd.DataFrame({
+            'ticker': ['DUAL', 'DUAL', 'MOVED', 'MOVED', 'OTHER'],
+            'exchange': ['NYSE', 'NASDAQ', 'NYSE', 'NASDAQ', 'NYSE'],
+            'date': self.DATE,
+            'close_price': [10.0, 11.0, 20.0, 21.0, 30.0],
+        })
+        failed = load_bulk_prices(
+            df_bulk, ['DUAL', 'MOVED', 'UNKNOWN'], self.DATE, self.DATE)
+        assert list(failed) == ['UNKNOWN']
+        stored = {
+            price.ticker_id: price.close_price
+            for price in db.session.query(Price)
+        }
+        # One price per ticker, from the file of its primary listing
+        assert stored == {
+            securities[('DUAL', 'NYSE')].id: 10.0,
+            securities[('MOVED', 'NASDAQ')].id: 21.0,
+        }
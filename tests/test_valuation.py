@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_builder.public.valuation import valuation_matrix
+from portfolio_builder.public.portfolio import calc_portf_valuations
+
+
+def _reference_valuations(df_portf_pos, df_prices):
+    # Outer merge + forward fill + pivot, kept as the reference behaviour
+    return (
+        pd
+        .merge(df_portf_pos, df_prices, on=['ticker', 'date'], how='outer')
+        .astype({'net_quantity': 'float64', 'price': 'float64'})
+        .sort_values(by=['ticker', 'date'])
+        .ffill()
+        .assign(market_val=lambda x: x['net_quantity'] * x['price'])
+        .round({'market_val': 3})
+        .pivot_table(index='date', columns='ticker', values='market_val')
+    )
+
+
+def _make_portfolio(n_tickers, n_dates, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2023-01-02', periods=n_dates)
+    tickers = [f'T{idx:03d}' for idx in range(n_tickers)]
+    df_prices = pd.DataFrame({
+        'ticker': np.repeat(tickers, n_dates),
+        'date': np.tile(dates, n_tickers),
+        'price': rng.uniform(10, 500, n_dates * n_tickers).round(2),
+    })
+    df_portf_pos = pd.concat([
+        pd.DataFrame({
+            'ticker': ticker,
+            # Every ticker is bought on the first date
+            'date': dates[np.sort(np.concatenate((
+                [0], rng.choice(np.arange(1, n_dates), 4, replace=False)
+            )))],
+            'net_quantity': rng.integers(0, 100, 5),
+            'realized_pnl': 0.0,
+        })
+        for ticker in tickers
+    ])
+    return df_portf_pos, df_prices
+
+
+class TestCalcPortfValuations:
+
+    @pytest.mark.parametrize('seed', range(3))
+    def test_matches_reference(self, seed):
+        df_portf_pos, df_prices = _make_portfolio(20, 60, seed)
+        pd.testing.assert_frame_equal(
+            calc_portf_valuations(df_portf_pos, df_prices),
+            _reference_valuations(df_portf_pos, df_prices),
+            check_exact=True,
+        )
+
+    def test_no_fill_across_tickers(self):
+        dates = pd.to_datetime(['2023-10-10', '2023-10-11', '2023-10-12'])
+        df_portf_pos = pd.DataFrame({
+            'ticker': ['AAPL', 'MSFT'],
+            'date': [dates[0], dates[2]],
+            'net_quantity': [10, 5],
+            'realized_pnl': [0.0, 0.0],
+        })
+        df_prices = pd.DataFrame({
+            'ticker': ['AAPL'] * 3 + ['MSFT'] * 3,
+            'date': list(dates) * 2,
+            'price': [175.0, 180.0, 170.0, 331.0, 334.0, 330.0],
+        })
+        df_portf_val = calc_portf_valuations(df_portf_pos, df_prices)
+        assert df_portf_val['AAPL'].tolist() == [1750.0, 1800.0, 1700.0]
+        assert df_portf_val['MSFT'].isna().tolist() == [True, True, False]
+        assert df_portf_val['MSFT'].iloc[-1] == 1650.0
+
+    def test_last_trade_of_the_day_is_used(self):
+        date = pd.Timestamp('2023-10-10')
+        valuation = valuation_matrix(
+            pd.DataFrame({
+                'ticker': ['AAPL', 'AAPL'],
+                'date': [date, date],
+                'net_quantity': [10, 15],
+                'realized_pnl': [0.0, 0.0],
+            }),
+            pd.DataFrame({'ticker': ['AAPL'], 'date': [date], 'price': [2.0]}),
+        )
+        assert valuation.market_val.tolist() == [[30.0]]
@@ -0,0 +1,183 @@
+import pandas as pd
+import pytest
+from flask import template_rendered
+
+from portfolio_builder.auth.models import User
+from portfolio_builder.public import covariance, risk
+from portfolio_builder.public.daily_values import (
+    mark_daily_values_stale, refresh_all_daily_values, refresh_daily_values
+)
+from portfolio_builder.public.models import (
+    PortfolioValue, Position, PositionLot, Price, PriceMgr, Security,
+    Watchlist, WatchlistItem
+)
+from portfolio_builder.public.positions import rebuild_positions
+from portfolio_builder.public.views import dashboard
+
+
+DATES = pd.bdate_range('2023-10-02', '2023-10-20').date
+TRADES = [
+    ('AAA', 'buy', 10, 100.0, DATES[0]),
+    ('BBB', 'buy', 5, 52.0, DATES[2]),
+    ('AAA', 'sell', 4, 106.0, DATES[6]),
+]
+# Last trade on 2023-10-10, last price on 2023-10-20
+LAST_VALUES = {'AAA': 6 * (100.0 + 14), 'BBB': 5 * (50.0 + 2 * 14)}
+
+
+@pytest.fixture(scope='function')
+def rendered(app):
+    templates = []
+
+    def record(sender, template, context, **extra):
+        templates.append((template.name, context))
+
+    template_rendered.connect(record, app)
+    yield templates
+    template_rendered.disconnect(record, app)
+
+
+@pytest.fixture(scope='function')
+def watchlist(db):
+    user = db.session.query(User).first()
+    securities = [
+        Security(name=ticker, ticker=ticker, exchange='NYSE')
+        for ticker in ('AAA', 'BBB')
+    ]
+    watchlist = Watchlist(name='Tech', user_id=user.id)
+    db.session.add_all(securities + [watchlist])
+    db.session.flush()
+    db.session.add_all([
+        Price(date=date, close_price=price, ticker_id=security.id)
+        for security, first_price, step in zip(securities, (100, 50), (1, 2))
+        for idx, date in enumerate(DATES)
+        for price in [first_price + step * idx]
+    ])
+    db.session.add_all([
+        WatchlistItem(
+            ticker=ticker, side=side, quantity=quantity, price=price,
+            trade_date=trade_date, watchlist_id=watchlist.id,
+        )
+        for ticker, side, quantity, price, trade_date in TRADES
+    ])
+    db.session.commit()
+    risk._cache.clear()
+    covariance._cache.clear()
+    yield watchlist
+    for model in (
+        PortfolioValue, PositionLot, Position, WatchlistItem, Watchlist,
+        Price, Security,
+    ):
+        db.session.query(model).delete()
+    db.session.commit()
+
+
+def _index_context(client, rendered):
+    response = client.get('/')
+    assert response.status_code == 200
+    (name, context), = rendered
+    assert name == 'public/dashboard.html'
+    return context
+
+
+@pytest.mark.usefixtures("login_required")
+class TestIndex:
+
+    def test_from_trades_runs_to_the_last_price(self, client, watchlist, rendered):
+        context = _index_context(client, rendered)
+        assert {
+            item.ticker: item.market_val for item in context['pie_chart']
+        } == LAST_VALUES
+        assert context['line_chart'][-1].date.date() == DATES[-1]
+        assert [item.ticker for item in context['risk_summary']] == [
+            'Portfolio', 'BBB', 'AAA'
+        ]
+        assert context['corr_tickers'] == ['AAA', 'BBB']
+
+    def test_stored_values_match_the_trades(self, client, watchlist, rendered):
+        context_trades = _index_context(client, rendered)
+        rebuild_positions([watchlist.id])
+        refresh_daily_values(watchlist.id)
+        rendered.clear()
+        context_stored = _index_context(client, rendered)
+        assert {
+            item.ticker: item.market_val for item in context_stored['pie_chart']
+        } == LAST_VALUES
+        for name in ('line_chart', 'risk_summary'):
+            pd.testing.assert_frame_equal(
+                pd.DataFrame(context_stored[name]),
+                pd.DataFrame(context_trades[name]),
+            )
+        assert context_stored['corr_rows'] == context_trades['corr_rows']
+
+    def test_stale_values_are_valued_from_trades(
+        self, client, watchlist, rendered, mocker
+    ):
+        rebuild_positions([watchlist.id])
+        refresh_daily_values(watchlist.id)
+        mark_daily_values_stale(watchlist.id, DATES[6])
+        calc_from_trades = mocker.spy(dashboard, '_calc_from_trades')
+        context = _index_context(client, rendered)
+        calc_from_trades.assert_called_once()
+        assert context['line_chart'][-1].date.date() == DATES[-1]
+
+    def test_risk_adds_new_dates_from_the_stored_values(
+        self, client, db, watchlist, rendered, mocker
+    ):
+        rebuild_positions([watchlist.id])
+        refresh_daily_values(watchlist.id)
+        _index_context(client, rendered)
+        next_date = (pd.Timestamp(DATES[-1]) + pd.offsets.BDay()).date()
+        PriceMgr.upsert_items(pd.DataFrame({
+            'ticker_id': [
+                security.id for security in db.session.query(Security)
+            ],
+            'date': next_date,
+            'close_price': 120.0,
+        }))
+        refresh_all_daily_values()
+        risk_inputs = mocker.spy(dashboard, '_risk_inputs')
+        rendered.clear()
+        context_added = _index_context(client, rendered)
+        assert [call.args[2] for call in risk_inputs.call_args_list] == [DATES[-1]]
+        risk._cache.clear()
+        rendered.clear()
+        context_built = _index_context(client, rendered)
+        pd.testing.assert_frame_equal(
+            pd.DataFrame(context_added['risk_summary']),
+            pd.DataFrame(context_built['risk_summary']),
+        )
+
+    def test_risk_follows_rewritten_prices(self, client, db, watchlist, rendered):
+        rebuild_positions([watchlist.id])
+        refresh_daily_values(watchlist.id)
+        context_before = _index_context(client, rendered)
+        security = db.session.query(Security).filter_by(ticker='AAA').one()
+        PriceMgr.upsert_items(pd.DataFrame({
+            'ticker_id': [security.id],
+            'date': [DATES[5]],
+            'close_price': [80.0],
+        }))
+        rendered.clear()
+        context_after = _index_context(client, rendered)
+        risk_before, risk_after = (
+            pd.DataFrame(context['risk_summary']).set_index('ticker')
+            for context in (context_before, context_after)
+        )
+        assert risk_after.loc['AAA', 'max_drawdown'] < risk_before.loc['AAA', 'max_drawdown']
+        assert risk_after.loc['BBB', 'max_drawdown'] == risk_before.loc['BBB', 'max_drawdown']
+
+
+@pytest.mark.usefixtures("login_required")
+class TestOverview:
+
+    def test_summarizes_every_watchlist(self, client, watchlist, rendered):
+        response = client.get('/overview')
+        assert response.status_code == 200
+        (name, context), = rendered
+        assert name == 'public/overview.html'
+        (row,) = context['overview']
+        assert (row.watchlist, row.date.date()) == ('Tech', DATES[-1])
+        assert row.market_val == sum(LAST_VALUES.values())
+        assert row.cash == 4 * 106.0
+        assert row.realized_pnl == 4 * 6.0
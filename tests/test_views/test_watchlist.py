@@ -4,7 +4,7 @@ import pytest
 from portfolio_builder.auth.models import User
 from portfolio_builder.public.models import (
     Watchlist, WatchlistItem, Security,
-    WatchlistItemMgr
+    WatchlistMgr, WatchlistItemMgr
 )
 from portfolio_builder.public.tasks import load_securities_csv
 
@@ -136,6 +136,11 @@ class TestDelete:
             Watchlist.name==watch_name, 
             WatchlistItem.ticker==ticker])
         ) == 0
+        # The daily values are left to the worker
+        watchlist = WatchlistMgr.get_first_item(
+            filters=[Watchlist.name == watch_name]
+        )
+        assert watchlist.values_stale_from == dt.date.today()
         with client.session_transaction() as session:
             messages = _get_messages(session)
             assert ticker in messages[0]
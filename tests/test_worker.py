@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+from portfolio_builder import scheduler
+from portfolio_builder.public.worker import register_jobs
+
+
+class TestWorker:
+
+    def test_web_app_skips_ingestion(self):
+        code = (
+            "import sys\n"
+            "from portfolio_builder import create_app, scheduler\n"
+            "create_app('testing')\n"
+            "assert not scheduler.running\n"
+            "assert 'tiingo' not in sys.modules\n"
+            "assert 'portfolio_builder.public.tasks' not in sys.modules\n"
+        )
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+    def test_registers_jobs(self, app):
+        register_jobs(app)
+        try:
+            assert {job.id for job in scheduler.get_jobs()} == {
+                'sync_securities', 'update_db_last_prices',
+                'process_backfill_queue', 'refresh_stale_daily_values',
+            }
+        finally:
+            scheduler.remove_all_jobs()